@@ -0,0 +1,59 @@
+"""Add stored_files metadata table
+
+Revision ID: a4c8e2f6b9d1
+Revises: f2b7d4a9c6e1
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c8e2f6b9d1'
+down_revision: Union[str, None] = 'f2b7d4a9c6e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stored_files',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('object_name', sa.String(length=500), nullable=False),
+        sa.Column('folder', sa.String(length=100), nullable=False, server_default=''),
+        sa.Column('file_name', sa.String(length=255), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('content_type', sa.String(length=255), nullable=True),
+        sa.Column('sha256', sa.String(length=64), nullable=True),
+        sa.Column('etag', sa.String(length=255), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('last_seen_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_stored_files_id', 'stored_files', ['id'])
+    op.create_index('ix_stored_files_owner_created_id', 'stored_files', ['owner_id', 'created_at', 'id'])
+    op.create_index('ix_stored_files_company_created_id', 'stored_files', ['company_id', 'created_at', 'id'])
+    op.create_index('ix_stored_files_folder_created_id', 'stored_files', ['folder', 'created_at', 'id'])
+    op.create_index(
+        'ix_stored_files_object_name_prefix',
+        'stored_files',
+        ['object_name'],
+        postgresql_ops={'object_name': 'varchar_pattern_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stored_files_object_name_prefix', table_name='stored_files')
+    op.drop_index('ix_stored_files_folder_created_id', table_name='stored_files')
+    op.drop_index('ix_stored_files_company_created_id', table_name='stored_files')
+    op.drop_index('ix_stored_files_owner_created_id', table_name='stored_files')
+    op.drop_index('ix_stored_files_id', table_name='stored_files')
+    op.drop_table('stored_files')
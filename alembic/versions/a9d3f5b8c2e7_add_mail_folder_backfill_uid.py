@@ -0,0 +1,27 @@
+"""Add backfill watermark to mail folder states
+
+Revision ID: a9d3f5b8c2e7
+Revises: e8a4c2f6b1d9
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3f5b8c2e7'
+down_revision: Union[str, None] = 'e8a4c2f6b1d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL - все письма папки уже в индексе (так и есть для уже синхронизированных папок)
+    op.add_column('mail_folder_states', sa.Column('backfill_uid', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('mail_folder_states', 'backfill_uid')
@@ -0,0 +1,26 @@
+"""Add derivatives column to stored_files
+
+Revision ID: b7e1d5c3a8f4
+Revises: a4c8e2f6b9d1
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e1d5c3a8f4'
+down_revision: Union[str, None] = 'a4c8e2f6b9d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('stored_files', sa.Column('derivatives', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('stored_files', 'derivatives')
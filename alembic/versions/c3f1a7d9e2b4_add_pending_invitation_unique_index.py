@@ -0,0 +1,47 @@
+"""Add partial unique index for pending invitations
+
+Revision ID: c3f1a7d9e2b4
+Revises: add_invitations
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f1a7d9e2b4'
+down_revision: Union[str, None] = 'add_invitations'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Оставляем только последнее активное приглашение на (email, company_id),
+    # остальные помечаем истекшими - иначе уникальный индекс не создастся
+    op.execute("""
+        UPDATE company_invitations
+        SET status = 'EXPIRED'
+        WHERE status = 'PENDING'
+          AND id NOT IN (
+              SELECT MAX(id)
+              FROM company_invitations
+              WHERE status = 'PENDING'
+              GROUP BY email, company_id
+          )
+    """)
+    
+    # Частичный уникальный индекс: не более одного активного приглашения
+    op.create_index(
+        'uq_company_invitations_pending_email_company',
+        'company_invitations',
+        ['email', 'company_id'],
+        unique=True,
+        postgresql_where=sa.text("status = 'PENDING'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_company_invitations_pending_email_company', table_name='company_invitations')
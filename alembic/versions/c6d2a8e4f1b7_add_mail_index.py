@@ -0,0 +1,69 @@
+"""Add local mailbox index tables
+
+Revision ID: c6d2a8e4f1b7
+Revises: b7e1d5c3a8f4
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6d2a8e4f1b7'
+down_revision: Union[str, None] = 'b7e1d5c3a8f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'mail_folder_states',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('folder', sa.String(length=255), nullable=False),
+        sa.Column('uidvalidity', sa.BigInteger(), nullable=False),
+        sa.Column('highest_uid', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('highest_modseq', sa.BigInteger(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_synced_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'folder', name='uq_mail_folder_states_user_folder')
+    )
+    op.create_index('ix_mail_folder_states_id', 'mail_folder_states', ['id'])
+
+    op.create_table(
+        'mail_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('folder', sa.String(length=255), nullable=False),
+        sa.Column('uid', sa.BigInteger(), nullable=False),
+        sa.Column('subject', sa.Text(), nullable=True),
+        sa.Column('from_addr', sa.Text(), nullable=True),
+        sa.Column('to_addr', sa.Text(), nullable=True),
+        sa.Column('date', sa.String(length=100), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('preview', sa.Text(), nullable=True),
+        sa.Column('has_attachments', sa.Boolean(), nullable=True),
+        sa.Column('is_read', sa.Boolean(), nullable=True),
+        sa.Column('flags', sa.JSON(), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'folder', 'uid', name='uq_mail_messages_user_folder_uid')
+    )
+    op.create_index('ix_mail_messages_id', 'mail_messages', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_mail_messages_id', table_name='mail_messages')
+    op.drop_table('mail_messages')
+    op.drop_index('ix_mail_folder_states_id', table_name='mail_folder_states')
+    op.drop_table('mail_folder_states')
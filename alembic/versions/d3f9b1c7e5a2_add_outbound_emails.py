@@ -0,0 +1,53 @@
+"""Add outbound email queue
+
+Revision ID: d3f9b1c7e5a2
+Revises: c6d2a8e4f1b7
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f9b1c7e5a2'
+down_revision: Union[str, None] = 'c6d2a8e4f1b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbound_emails',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('from_addr', sa.String(length=255), nullable=False),
+        sa.Column('to_addr', sa.Text(), nullable=False),
+        sa.Column('cc', sa.Text(), nullable=True),
+        sa.Column('bcc', sa.Text(), nullable=True),
+        sa.Column('subject', sa.Text(), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('is_html', sa.Boolean(), nullable=True),
+        sa.Column('status', sa.Enum('QUEUED', 'SENDING', 'SENT', 'FAILED', name='outboundemailstatus'), nullable=False, server_default='QUEUED'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbound_emails_id', 'outbound_emails', ['id'])
+    op.create_index('ix_outbound_emails_status_next_attempt', 'outbound_emails', ['status', 'next_attempt_at'])
+    op.create_index('ix_outbound_emails_user_created', 'outbound_emails', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbound_emails_user_created', table_name='outbound_emails')
+    op.drop_index('ix_outbound_emails_status_next_attempt', table_name='outbound_emails')
+    op.drop_index('ix_outbound_emails_id', table_name='outbound_emails')
+    op.drop_table('outbound_emails')
+    op.execute('DROP TYPE outboundemailstatus')
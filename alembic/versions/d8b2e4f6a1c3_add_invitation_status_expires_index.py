@@ -0,0 +1,31 @@
+"""Add (status, expires_at) index to company_invitations
+
+Revision ID: d8b2e4f6a1c3
+Revises: c3f1a7d9e2b4
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b2e4f6a1c3'
+down_revision: Union[str, None] = 'c3f1a7d9e2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс для фоновой пометки просроченных приглашений
+    op.create_index(
+        'ix_company_invitations_status_expires_at',
+        'company_invitations',
+        ['status', 'expires_at']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_company_invitations_status_expires_at', table_name='company_invitations')
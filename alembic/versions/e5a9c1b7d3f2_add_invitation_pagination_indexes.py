@@ -0,0 +1,38 @@
+"""Add keyset pagination indexes to company_invitations
+
+Revision ID: e5a9c1b7d3f2
+Revises: d8b2e4f6a1c3
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a9c1b7d3f2'
+down_revision: Union[str, None] = 'd8b2e4f6a1c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Список приглашений компании: WHERE company_id ORDER BY created_at DESC, id DESC
+    op.create_index(
+        'ix_company_invitations_company_created_id',
+        'company_invitations',
+        ['company_id', 'created_at', 'id']
+    )
+    # Приглашения пользователя: WHERE email AND status ORDER BY created_at DESC, id DESC
+    op.create_index(
+        'ix_company_invitations_email_status_created_id',
+        'company_invitations',
+        ['email', 'status', 'created_at', 'id']
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_company_invitations_email_status_created_id', table_name='company_invitations')
+    op.drop_index('ix_company_invitations_company_created_id', table_name='company_invitations')
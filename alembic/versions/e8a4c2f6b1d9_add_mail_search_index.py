@@ -0,0 +1,58 @@
+"""Add full-text search over the local mailbox index
+
+Revision ID: e8a4c2f6b1d9
+Revises: d3f9b1c7e5a2
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a4c2f6b1d9'
+down_revision: Union[str, None] = 'd3f9b1c7e5a2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# app.models.mail.MAIL_SEARCH_DOCUMENT на момент миграции
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(from_addr, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(to_addr, '')), 'C') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(body_text, '')), 'D')"
+)
+
+
+def upgrade() -> None:
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+
+    op.add_column('mail_messages', sa.Column('body_text', sa.Text(), nullable=True))
+    op.add_column(
+        'mail_messages',
+        sa.Column('search_vector', postgresql.TSVECTOR() if is_postgresql else sa.Text(), nullable=True)
+    )
+    op.create_index('ix_mail_messages_user_sent_at', 'mail_messages', ['user_id', 'sent_at'])
+
+    if is_postgresql:
+        # Уже синхронизированные письма ищутся по заголовкам; текст появится
+        # у писем, загруженных после миграции
+        op.execute(f"UPDATE mail_messages SET search_vector = {SEARCH_DOCUMENT}")
+        op.create_index(
+            'ix_mail_messages_search',
+            'mail_messages',
+            ['search_vector'],
+            postgresql_using='gin'
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_mail_messages_search', table_name='mail_messages')
+    op.drop_index('ix_mail_messages_user_sent_at', table_name='mail_messages')
+    op.drop_column('mail_messages', 'search_vector')
+    op.drop_column('mail_messages', 'body_text')
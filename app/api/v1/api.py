@@ -18,6 +18,7 @@ from app.api.v1.endpoints import (
     passwords,
     files,
     invitations,
+    diagnostics,
 )
 
 api_router = APIRouter()
@@ -37,3 +38,4 @@ api_router.include_router(mailbox.router, prefix="/mailbox", tags=["mailbox"])
 api_router.include_router(passwords.router, prefix="/passwords", tags=["passwords"])
 api_router.include_router(files.router, prefix="/files", tags=["files"])
 api_router.include_router(invitations.router, prefix="/invitations", tags=["invitations"])
+api_router.include_router(diagnostics.router, prefix="/diagnostics", tags=["diagnostics"])
@@ -11,7 +11,8 @@ from datetime import datetime
 
 from app.core.database import get_db
 from app.core.config import settings
-from app.models import User
+from app.models import User, UserRole
+from app.services.principal_cache import principal_cache
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
@@ -31,15 +32,14 @@ async def get_current_user_from_token(
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("user_id")
         if email is None:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
     
-    # Получаем пользователя из базы данных
-    from sqlalchemy import select
-    result = await db.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
+    # Получаем пользователя из кэша (при промахе - из базы данных)
+    user = await principal_cache.get_user(db, email, user_id)
     
     if user is None:
         raise credentials_exception
@@ -47,3 +47,15 @@ async def get_current_user_from_token(
     return user
 
 
+async def get_current_admin_user(
+    current_user: User = Depends(get_current_user_from_token)
+) -> User:
+    """
+    Текущий пользователь с ролью администратора (служебные endpoints)
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required"
+        )
+    return current_user
@@ -8,12 +8,13 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
-import bcrypt
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.config import settings
 from app.models import User, Employee
 from app.schemas.auth import Token, UserCreate, UserResponse, LoginRequest
+from app.services.principal_cache import principal_cache
+from app.services.password_hasher import password_hasher, HashingOverloadedError
 
 router = APIRouter()
 
@@ -21,14 +22,23 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Проверка пароля"""
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверка пароля (в пуле потоков, не блокирует event loop)"""
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-    """Хеширование пароля"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def get_password_hash(password: str) -> str:
+    """Хеширование пароля (в пуле потоков, не блокирует event loop)"""
+    return await password_hasher.hash(password)
+
+
+def hashing_overloaded_exception() -> HTTPException:
+    """Ответ при переполненной очереди хеширования"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Сервис перегружен, повторите попытку позже",
+        headers={"Retry-After": "1"},
+    )
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -56,8 +66,12 @@ async def authenticate_user(db: AsyncSession, email: str, password: str) -> Opti
     user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return None
+    
+    # Перехешируем пароль, если изменился cost factor (сохранится вместе с last_login)
+    if password_hasher.needs_rehash(user.hashed_password):
+        user.hashed_password = await get_password_hash(password)
     return user
 
 
@@ -67,7 +81,11 @@ async def login(
     db: AsyncSession = Depends(get_db)
 ):
     """Вход в систему"""
-    user = await authenticate_user(db, login_data.email, login_data.password)
+    try:
+        user = await authenticate_user(db, login_data.email, login_data.password)
+    except HashingOverloadedError:
+        raise hashing_overloaded_exception()
+    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -114,7 +132,10 @@ async def register(
         )
     
     # Создаем нового пользователя
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await get_password_hash(user_data.password)
+    except HashingOverloadedError:
+        raise hashing_overloaded_exception()
     db_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -147,7 +168,7 @@ async def register(
 
 async def get_current_user_from_token(
     token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> User:
     """Получение текущего пользователя из токена"""
     credentials_exception = HTTPException(
@@ -159,12 +180,13 @@ async def get_current_user_from_token(
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
         email: str = payload.get("sub")
+        user_id: Optional[int] = payload.get("user_id")
         if email is None:
             raise credentials_exception
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = await get_user_by_email(db, email)
+    user = await principal_cache.get_user(db, email, user_id)
     if user is None:
         raise credentials_exception
     
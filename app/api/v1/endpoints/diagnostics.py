@@ -0,0 +1,183 @@
+"""
+Диагностические endpoints (состояние пулов и сервисов, только для администраторов)
+"""
+
+from fastapi import APIRouter, Depends
+from datetime import datetime
+
+from app.core.database import get_db_pool_stats
+from app.api.v1.dependencies import get_current_admin_user
+from app.models import User
+from app.services.principal_cache import principal_cache
+from app.services.password_hasher import password_hasher
+from app.services.invitation_sweeper import invitation_sweeper
+from app.services.storage_service import storage_service
+from app.services.presigned_url_cache import presigned_url_cache
+from app.services.content_store import content_store
+from app.services.file_reconciler import file_reconciler
+from app.services.image_derivatives import avatar_derivatives
+from app.services.imap_pool import imap_pool
+from app.services.mail_sync import mailbox_sync
+from app.services.async_email_service import mail_executor
+from app.services.smtp_pool import smtp_pool
+from app.services.mail_outbox import mail_outbox
+from app.services.mail_idle import mail_idle
+from app.services.mail_search import mail_search
+
+router = APIRouter()
+
+
+@router.get("/db-pool")
+async def get_db_pool_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Метрики пулов соединений PostgreSQL (основная БД и реплика)"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **get_db_pool_stats(),
+    }
+
+
+@router.get("/principal-cache")
+async def get_principal_cache_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика кэша аутентифицированных пользователей"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **principal_cache.stats(),
+    }
+
+
+@router.get("/password-hasher")
+async def get_password_hasher_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Метрики очереди хеширования паролей"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **password_hasher.stats(),
+    }
+
+
+@router.get("/invitation-sweeper")
+async def get_invitation_sweeper_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика фоновой пометки просроченных приглашений"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **invitation_sweeper.stats(),
+    }
+
+
+@router.get("/storage")
+async def get_storage_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Метрики пула потоков MinIO и задержек операций хранилища"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **storage_service.stats(),
+        "content_addressed": content_store.stats(),
+    }
+
+
+@router.get("/presigned-url-cache")
+async def get_presigned_url_cache_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика кэша временных ссылок на файлы"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **presigned_url_cache.stats(),
+    }
+
+
+@router.get("/file-reconciler")
+async def get_file_reconciler_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика сверки stored_files с bucket"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **file_reconciler.stats(),
+    }
+
+
+@router.get("/avatar-derivatives")
+async def get_avatar_derivatives_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика очереди уменьшенных копий аватаров"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **avatar_derivatives.stats(),
+    }
+
+
+@router.get("/imap-pool")
+async def get_imap_pool_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика пула IMAP соединений"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **imap_pool.stats(),
+    }
+
+
+@router.get("/mailbox-sync")
+async def get_mailbox_sync_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Статистика синхронизации почтовых папок"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **mailbox_sync.stats(),
+    }
+
+
+@router.get("/mail-client")
+async def get_mail_client_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Пул потоков почтового клиента и задержки операций IMAP/SMTP"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **mail_executor.stats(),
+    }
+
+
+@router.get("/mail-outbox")
+async def get_mail_outbox_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Очередь исходящих писем и пул SMTP соединений"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **mail_outbox.stats(),
+        "smtp_pool": smtp_pool.stats(),
+    }
+
+
+@router.get("/mail-idle")
+async def get_mail_idle_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """IMAP IDLE соединения и push-события почты"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **mail_idle.stats(),
+    }
+
+
+@router.get("/mail-search")
+async def get_mail_search_diagnostics(
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Задержка поиска по локальному индексу почты"""
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **mail_search.stats(),
+    }
@@ -2,22 +2,201 @@
 API endpoints для работы с файлами через MinIO
 """
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File, status
 from fastapi.responses import StreamingResponse
-from typing import List
-from io import BytesIO
+from minio.error import S3Error
+from pydantic import BaseModel
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Callable, Dict, List, Optional, Tuple
+import jwt
 
-from app.services.minio_service import minio_service
+from app.services.storage_service import storage_service
+from app.services.presigned_url_cache import presigned_url_cache
+from app.services.minio_service import FileTooLargeError
+from app.services.content_store import content_store
+from app.services.image_derivatives import (
+    DERIVATIVE_FORMATS,
+    avatar_derivatives,
+    closest_size,
+    derivative_object_name,
+)
+from app.core.config import settings
+from app.core.database import get_db, get_read_db
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_datetime_id_cursor,
+    encode_datetime_id_cursor,
+    keyset_before,
+)
 from app.api.v1.dependencies import get_current_user_from_token
-from app.models import User
+from app.models import Employee, StoredFile, User
 
 router = APIRouter()
 
+# Заголовки, которые передаются между клиентом и MinIO при скачивании
+PASSTHROUGH_REQUEST_HEADERS = ("Range", "If-Range")
+PASSTHROUGH_RESPONSE_HEADERS = ("Content-Length", "Content-Range", "ETag", "Last-Modified")
+
+# Коды ошибок S3 для отсутствующего объекта
+NOT_FOUND_CODES = ("NoSuchKey", "NoSuchObject", "ResourceNotFound")
+
+
+# Папки, в которые разрешена прямая загрузка в MinIO
+DIRECT_UPLOAD_FOLDERS = ("avatars", "documents", "attachments", "knowledge-base")
+DIRECT_UPLOAD_METHODS = ("put", "post")
+UPLOAD_TOKEN_TYPE = "direct_upload"
+
+
+class DirectUploadRequest(BaseModel):
+    file_name: str
+    content_type: str = "application/octet-stream"
+    size: Optional[int] = None
+    folder: str = "documents"
+    method: str = "put"
+
+
+class DirectUploadComplete(BaseModel):
+    upload_token: str
+
+
+class FileUrlsRequest(BaseModel):
+    file_paths: List[str]
+
+
+class FileBatchRequest(BaseModel):
+    file_paths: List[str]
+
+
+def file_too_large_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds maximum size of {settings.MAX_FILE_SIZE} bytes"
+    )
+
+
+def _check_upload_size(file: UploadFile):
+    """Отклонить файл заранее, если его размер уже известен"""
+    if file.size is not None and file.size > settings.MAX_FILE_SIZE:
+        raise file_too_large_exception()
+
+
+async def _user_company_id(db: AsyncSession, user: User) -> Optional[int]:
+    """Компания пользователя (по карточке сотрудника)"""
+    result = await db.execute(select(Employee.company_id).where(Employee.user_id == user.id))
+    return result.scalars().first()
+
+
+async def _record_stored_file(
+    db: AsyncSession,
+    current_user: User,
+    object_name: str,
+    file_name: Optional[str],
+    size: int,
+    content_type: Optional[str],
+    sha256: Optional[str] = None,
+    etag: Optional[str] = None
+) -> StoredFile:
+    """Записать метаданные загруженного файла в stored_files"""
+    stored_file = StoredFile(
+        object_name=object_name,
+        folder=object_name.split("/", 1)[0] if "/" in object_name else "",
+        file_name=file_name,
+        size=size or 0,
+        content_type=content_type,
+        sha256=sha256,
+        etag=etag,
+        owner_id=current_user.id,
+        company_id=await _user_company_id(db, current_user),
+        last_seen_at=datetime.utcnow()
+    )
+    db.add(stored_file)
+    await db.commit()
+    return stored_file
+
+
+async def _claim_stored_file(
+    db: AsyncSession,
+    stored_file: StoredFile,
+    current_user: User,
+    file_name: Optional[str],
+    size: int,
+    content_type: Optional[str],
+    etag: Optional[str] = None
+) -> StoredFile:
+    """Закрепить за пользователем строку без владельца, добавленную сверкой с bucket"""
+    stored_file.file_name = file_name
+    stored_file.size = size or 0
+    stored_file.content_type = content_type
+    stored_file.etag = etag
+    stored_file.owner_id = current_user.id
+    stored_file.company_id = await _user_company_id(db, current_user)
+    stored_file.last_seen_at = datetime.utcnow()
+    await db.commit()
+    return stored_file
+
+
+async def _forget_stored_file(db: AsyncSession, object_name: str, owner_id: Optional[int] = None):
+    """
+    Удалить метаданные файла
+    
+    Для объекта по содержимому (owner_id задан) удаляется одна строка -
+    предпочтительно принадлежащая пользователю; иначе все строки пути.
+    """
+    if owner_id is None:
+        await db.execute(delete(StoredFile).where(StoredFile.object_name == object_name))
+    else:
+        result = await db.execute(
+            select(StoredFile.id)
+            .where(StoredFile.object_name == object_name)
+            .order_by((StoredFile.owner_id == owner_id).desc(), StoredFile.id)
+            .limit(1)
+        )
+        stored_file_id = result.scalar_one_or_none()
+        if stored_file_id is not None:
+            await db.execute(delete(StoredFile).where(StoredFile.id == stored_file_id))
+    await db.commit()
+
+
+async def _upload_file(
+    db: AsyncSession,
+    current_user: User,
+    file: UploadFile,
+    content_type: str,
+    upload: Callable
+) -> Tuple[Optional[str], Dict]:
+    """
+    Загрузить файл по содержимому (MINIO_CONTENT_ADDRESSED) или под уникальным именем
+    и записать его метаданные
+    
+    Returns:
+        (путь к файлу или None, дополнительные поля ответа)
+    """
+    if settings.MINIO_CONTENT_ADDRESSED:
+        blob = await content_store.store(db, file.file, file.filename, content_type, settings.MAX_FILE_SIZE)
+        if not blob:
+            return None, {}
+        object_name, size = blob["object_name"], blob["size"]
+        extra = {"sha256": blob["sha256"], "deduplicated": blob["deduplicated"]}
+    else:
+        object_name = await upload(file.file, file.filename, content_type)
+        if not object_name:
+            return None, {}
+        size = file.size if file.size is not None else file.file.tell()
+        extra = {}
+    
+    await _record_stored_file(
+        db, current_user, object_name, file.filename, size, content_type, sha256=extra.get("sha256")
+    )
+    return object_name, extra
+
 
 @router.post("/upload/avatar")
 async def upload_avatar(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user_from_token)
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Загрузить аватар пользователя"""
     try:
@@ -28,9 +207,14 @@ async def upload_avatar(
                 detail="Only image files are allowed"
             )
         
-        # Загрузка файла
-        file_data = BytesIO(await file.read())
-        object_name = minio_service.upload_avatar(file_data, file.filename)
+        # Потоковая загрузка файла (без чтения целиком в память)
+        _check_upload_size(file)
+        object_name = await storage_service.upload_avatar(file.file, file.filename)
+        if object_name:
+            size = file.size if file.size is not None else file.file.tell()
+            await _record_stored_file(db, current_user, object_name, file.filename, size, "image/jpeg")
+            if settings.AVATAR_DERIVATIVES_ENABLED:
+                avatar_derivatives.enqueue(object_name)
         
         if not object_name:
             raise HTTPException(
@@ -39,7 +223,7 @@ async def upload_avatar(
             )
         
         # Получение временной ссылки
-        url = minio_service.get_presigned_url(object_name)
+        url = await presigned_url_cache.get_url(object_name)
         
         return {
             "success": True,
@@ -47,6 +231,10 @@ async def upload_avatar(
             "file_path": object_name,
             "url": url
         }
+    except HTTPException:
+        raise
+    except FileTooLargeError:
+        raise file_too_large_exception()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -57,14 +245,15 @@ async def upload_avatar(
 @router.post("/upload/document")
 async def upload_document(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user_from_token)
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Загрузить документ"""
     try:
-        # Загрузка файла
-        file_data = BytesIO(await file.read())
+        # Потоковая загрузка файла (без чтения целиком в память)
+        _check_upload_size(file)
         content_type = file.content_type or "application/octet-stream"
-        object_name = minio_service.upload_document(file_data, file.filename, content_type)
+        object_name, blob_info = await _upload_file(db, current_user, file, content_type, storage_service.upload_document)
         
         if not object_name:
             raise HTTPException(
@@ -73,7 +262,7 @@ async def upload_document(
             )
         
         # Получение временной ссылки
-        url = minio_service.get_presigned_url(object_name)
+        url = await presigned_url_cache.get_url(object_name)
         
         return {
             "success": True,
@@ -81,8 +270,13 @@ async def upload_document(
             "file_path": object_name,
             "url": url,
             "file_name": file.filename,
-            "content_type": content_type
+            "content_type": content_type,
+            **blob_info
         }
+    except HTTPException:
+        raise
+    except FileTooLargeError:
+        raise file_too_large_exception()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -93,14 +287,15 @@ async def upload_document(
 @router.post("/upload/attachment")
 async def upload_attachment(
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user_from_token)
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Загрузить вложение (для задач, писем и т.д.)"""
     try:
-        # Загрузка файла
-        file_data = BytesIO(await file.read())
+        # Потоковая загрузка файла (без чтения целиком в память)
+        _check_upload_size(file)
         content_type = file.content_type or "application/octet-stream"
-        object_name = minio_service.upload_attachment(file_data, file.filename, content_type)
+        object_name, blob_info = await _upload_file(db, current_user, file, content_type, storage_service.upload_attachment)
         
         if not object_name:
             raise HTTPException(
@@ -109,7 +304,7 @@ async def upload_attachment(
             )
         
         # Получение временной ссылки
-        url = minio_service.get_presigned_url(object_name)
+        url = await presigned_url_cache.get_url(object_name)
         
         return {
             "success": True,
@@ -117,8 +312,13 @@ async def upload_attachment(
             "file_path": object_name,
             "url": url,
             "file_name": file.filename,
-            "content_type": content_type
+            "content_type": content_type,
+            **blob_info
         }
+    except HTTPException:
+        raise
+    except FileTooLargeError:
+        raise file_too_large_exception()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -129,34 +329,58 @@ async def upload_attachment(
 @router.get("/download/{file_path:path}")
 async def download_file(
     file_path: str,
+    request: Request,
     current_user: User = Depends(get_current_user_from_token)
 ):
-    """Скачать файл"""
+    """
+    Скачать файл
+    
+    Тело объекта отдается потоково из MinIO без буферизации в памяти.
+    Поддерживаются Range/If-Range (206 Partial Content).
+    """
     try:
-        # Проверка существования файла
-        if not minio_service.file_exists(file_path):
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="File not found"
-            )
+        # Range/If-Range обрабатывает сам MinIO - отдельный stat не нужен
+        request_headers = {
+            header: request.headers[header]
+            for header in PASSTHROUGH_REQUEST_HEADERS
+            if header in request.headers
+        }
         
-        # Скачивание файла
-        file_data = minio_service.download_file(file_path)
+        try:
+            obj = await storage_service.open_object(file_path, request_headers or None)
+        except S3Error as e:
+            if e.code in NOT_FOUND_CODES:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="File not found"
+                )
+            if e.code == "InvalidRange":
+                raise HTTPException(
+                    status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                    detail="Requested range not satisfiable"
+                )
+            raise
         
-        if not file_data:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to download file"
-            )
-        
-        # Возврат файла
-        return StreamingResponse(
-            BytesIO(file_data),
-            media_type="application/octet-stream",
-            headers={
+        # До передачи тела в StreamingResponse соединение закрывается здесь
+        try:
+            headers = {
+                "Accept-Ranges": "bytes",
                 "Content-Disposition": f"attachment; filename={file_path.split('/')[-1]}"
             }
-        )
+            for header in PASSTHROUGH_RESPONSE_HEADERS:
+                value = obj.headers.get(header)
+                if value is not None:
+                    headers[header] = value
+            
+            return StreamingResponse(
+                storage_service.iter_object(obj),
+                status_code=obj.status,
+                media_type=obj.headers.get("Content-Type") or "application/octet-stream",
+                headers=headers
+            )
+        except Exception:
+            storage_service.close_object(obj)
+            raise
     except HTTPException:
         raise
     except Exception as e:
@@ -169,19 +393,32 @@ async def download_file(
 @router.delete("/delete/{file_path:path}")
 async def delete_file(
     file_path: str,
-    current_user: User = Depends(get_current_user_from_token)
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Удалить файл"""
     try:
+        # Объект по содержимому удаляется только вместе с последней ссылкой
+        if content_store.is_blob(file_path):
+            deleted = await content_store.release(db, file_path)
+            if deleted is not None:
+                await _forget_stored_file(db, file_path, owner_id=current_user.id)
+                if deleted:
+                    await presigned_url_cache.invalidate(file_path)
+                return {
+                    "success": True,
+                    "message": "File deleted successfully" if deleted else "File reference removed"
+                }
+        
         # Проверка существования файла
-        if not minio_service.file_exists(file_path):
+        if not await storage_service.file_exists(file_path):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="File not found"
             )
         
         # Удаление файла
-        success = minio_service.delete_file(file_path)
+        success = await storage_service.delete_file(file_path)
         
         if not success:
             raise HTTPException(
@@ -189,6 +426,11 @@ async def delete_file(
                 detail="Failed to delete file"
             )
         
+        await _forget_stored_file(db, file_path)
+        await presigned_url_cache.invalidate(file_path)
+        if file_path.startswith("avatars/"):
+            await avatar_derivatives.delete_for(file_path)
+        
         return {
             "success": True,
             "message": "File deleted successfully"
@@ -202,20 +444,213 @@ async def delete_file(
         )
 
 
+def _check_batch_size(file_paths: List[str]):
+    """Ограничение числа ключей в пакетном запросе"""
+    if len(file_paths) > settings.FILE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files, maximum is {settings.FILE_BATCH_MAX_SIZE}"
+        )
+
+
+@router.post("/batch-delete")
+async def batch_delete_files(
+    request: FileBatchRequest,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Удалить несколько файлов одним запросом
+    
+    Обычные объекты (и уменьшенные копии аватаров) удаляются через
+    multi-object delete MinIO - по одному запросу на 1000 ключей, без
+    предварительной проверки существования. Объекты по содержимому
+    теряют одну ссылку, как при одиночном удалении.
+    """
+    try:
+        _check_batch_size(request.file_paths)
+        file_paths = list(dict.fromkeys(request.file_paths))
+        results: Dict[str, Dict] = {}
+        
+        # Объекты по содержимому: по одной ссылке на ключ
+        plain_paths = []
+        for file_path in file_paths:
+            if not content_store.is_blob(file_path):
+                plain_paths.append(file_path)
+                continue
+            try:
+                deleted = await content_store.release(db, file_path)
+            except Exception as e:
+                results[file_path] = {"success": False, "status": "error", "error": str(e)}
+                continue
+            if deleted is None:
+                plain_paths.append(file_path)
+                continue
+            await _forget_stored_file(db, file_path, owner_id=current_user.id)
+            results[file_path] = {
+                "success": True,
+                "status": "deleted" if deleted else "reference_removed",
+                "error": None
+            }
+        
+        if plain_paths:
+            # Готовые копии аватаров удаляются в том же пакете
+            derivative_paths = []
+            avatar_paths = [path for path in plain_paths if path.startswith("avatars/")]
+            if avatar_paths:
+                rows = await db.execute(
+                    select(StoredFile.object_name, StoredFile.derivatives)
+                    .where(StoredFile.object_name.in_(avatar_paths), StoredFile.derivatives.is_not(None))
+                )
+                for object_name, sizes in rows.all():
+                    derivative_paths.extend(
+                        derivative_object_name(object_name, size, image_format)
+                        for size in sizes
+                        for image_format in DERIVATIVE_FORMATS
+                    )
+            
+            errors = await storage_service.delete_files(plain_paths + derivative_paths)
+            deleted_paths = []
+            for file_path in plain_paths:
+                error = errors.get(file_path)
+                if error:
+                    results[file_path] = {"success": False, "status": "error", "error": error}
+                else:
+                    results[file_path] = {"success": True, "status": "deleted", "error": None}
+                    deleted_paths.append(file_path)
+            
+            if deleted_paths:
+                await db.execute(delete(StoredFile).where(StoredFile.object_name.in_(deleted_paths)))
+                await db.commit()
+        
+        deleted_paths = [path for path, result in results.items() if result["status"] == "deleted"]
+        if deleted_paths:
+            await presigned_url_cache.invalidate_many(deleted_paths)
+        
+        failed = sum(1 for result in results.values() if not result["success"])
+        return {
+            "success": failed == 0,
+            "deleted": len(file_paths) - failed,
+            "failed": failed,
+            "results": [{"file_path": file_path, **results[file_path]} for file_path in file_paths]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error deleting files: {str(e)}"
+        )
+
+
+@router.post("/batch-stat")
+async def batch_stat_files(
+    request: FileBatchRequest,
+    current_user: User = Depends(get_current_user_from_token)
+):
+    """Метаданные нескольких файлов (параллельные HEAD запросы к MinIO)"""
+    try:
+        _check_batch_size(request.file_paths)
+        file_paths = list(dict.fromkeys(request.file_paths))
+        stats = await storage_service.stat_files(file_paths, settings.FILE_BATCH_STAT_CONCURRENCY)
+        
+        results = []
+        for file_path in file_paths:
+            stat = stats[file_path]
+            if stat is None:
+                results.append({"file_path": file_path, "exists": False})
+                continue
+            results.append({
+                "file_path": file_path,
+                "exists": True,
+                "size": stat.size,
+                "etag": stat.etag,
+                "content_type": stat.content_type,
+                "last_modified": stat.last_modified
+            })
+        
+        return {
+            "success": True,
+            "found": sum(1 for result in results if result["exists"]),
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting file metadata: {str(e)}"
+        )
+
+
 @router.get("/list")
 async def list_files(
+    response: Response,
     prefix: str = "",
-    current_user: User = Depends(get_current_user_from_token)
+    folder: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    company_id: Optional[int] = None,
+    content_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.FILE_PAGE_SIZE, ge=1, le=settings.FILE_MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Список файлов"""
+    """
+    Список файлов (постранично, из таблицы stored_files)
+    
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
     try:
-        files = minio_service.list_files(prefix)
+        query = select(StoredFile)
+        if prefix:
+            query = query.where(StoredFile.object_name.startswith(prefix, autoescape=True))
+        if folder is not None:
+            query = query.where(StoredFile.folder == folder)
+        if owner_id is not None:
+            query = query.where(StoredFile.owner_id == owner_id)
+        if company_id is not None:
+            query = query.where(StoredFile.company_id == company_id)
+        if content_type is not None:
+            query = query.where(StoredFile.content_type == content_type)
+        
+        position = decode_datetime_id_cursor(cursor)
+        if position:
+            query = query.where(keyset_before(StoredFile.created_at, StoredFile.id, position))
+        query = query.order_by(StoredFile.created_at.desc(), StoredFile.id.desc()).limit(limit + 1)
+        
+        stored_files = (await db.execute(query)).scalars().all()
+        if len(stored_files) > limit:
+            stored_files = stored_files[:limit]
+            response.headers[NEXT_CURSOR_HEADER] = encode_datetime_id_cursor(
+                stored_files[-1].created_at,
+                stored_files[-1].id
+            )
+        
+        files = [
+            {
+                "id": stored_file.id,
+                "name": stored_file.object_name,
+                "file_name": stored_file.file_name,
+                "folder": stored_file.folder,
+                "size": stored_file.size,
+                "content_type": stored_file.content_type,
+                "sha256": stored_file.sha256,
+                "etag": stored_file.etag,
+                "owner_id": stored_file.owner_id,
+                "company_id": stored_file.company_id,
+                "last_modified": stored_file.updated_at or stored_file.created_at,
+            }
+            for stored_file in stored_files
+        ]
         
         return {
             "success": True,
             "files": files,
             "count": len(files)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -230,33 +665,309 @@ async def get_file_url(
 ):
     """Получить временную ссылку на файл"""
     try:
-        # Проверка существования файла
-        if not minio_service.file_exists(file_path):
+        # Существование файла проверяется только при промахе кэша ссылок
+        url = await presigned_url_cache.get_url(file_path, verify_exists=True)
+        
+        if not url:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="File not found"
             )
         
-        # Получение временной ссылки
-        url = minio_service.get_presigned_url(file_path)
+        return {
+            "success": True,
+            "url": url,
+            "file_path": file_path
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating URL: {str(e)}"
+        )
+
+
+@router.get("/avatar/{file_path:path}")
+async def get_avatar_url(
+    file_path: str,
+    size: int = Query(128, ge=1),
+    format: str = "webp",
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Получить ссылку на уменьшенную копию аватара ближайшего размера
+    
+    Пока копии не готовы, возвращается ссылка на оригинал, а аватар
+    ставится в очередь обработки.
+    """
+    try:
+        if format not in DERIVATIVE_FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format, allowed: {', '.join(DERIVATIVE_FORMATS)}"
+            )
         
-        if not url:
+        result = await db.execute(
+            select(StoredFile.derivatives).where(StoredFile.object_name == file_path).limit(1)
+        )
+        row = result.first()
+        if row is None:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate URL"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="File not found"
             )
         
+        selected_size = closest_size(row.derivatives or [], size)
+        if selected_size is None:
+            if settings.AVATAR_DERIVATIVES_ENABLED:
+                avatar_derivatives.enqueue(file_path)
+            url = await presigned_url_cache.get_url(file_path)
+            return {
+                "success": True,
+                "url": url,
+                "file_path": file_path,
+                "size": None,
+                "original": True
+            }
+        
+        derivative_path = derivative_object_name(file_path, selected_size, format)
+        url = await presigned_url_cache.get_url(derivative_path)
+        
         return {
             "success": True,
             "url": url,
-            "file_path": file_path
+            "file_path": derivative_path,
+            "size": selected_size,
+            "format": format,
+            "original": False
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error generating URL: {str(e)}"
+            detail=f"Error generating avatar URL: {str(e)}"
+        )
+
+
+@router.post("/urls")
+async def get_file_urls(
+    request: FileUrlsRequest,
+    current_user: User = Depends(get_current_user_from_token)
+):
+    """
+    Получить временные ссылки на несколько файлов одним запросом
+    
+    Существование файлов не проверяется (только подпись).
+    """
+    try:
+        if len(request.file_paths) > settings.PRESIGNED_URL_BATCH_MAX_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Too many files, maximum is {settings.PRESIGNED_URL_BATCH_MAX_SIZE}"
+            )
+        
+        urls = await presigned_url_cache.get_urls(request.file_paths)
+        
+        return {
+            "success": True,
+            "urls": urls,
+            "count": len(urls)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating URLs: {str(e)}"
+        )
+
+
+@router.post("/direct-upload")
+async def create_direct_upload(
+    upload: DirectUploadRequest,
+    current_user: User = Depends(get_current_user_from_token)
+):
+    """
+    Начать прямую загрузку файла в MinIO (минуя API)
+    
+    Возвращает presigned PUT URL или POST policy и upload_token.
+    После загрузки клиент вызывает /direct-upload/complete с этим токеном.
+    """
+    try:
+        if upload.folder not in DIRECT_UPLOAD_FOLDERS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Folder must be one of: {', '.join(DIRECT_UPLOAD_FOLDERS)}"
+            )
+        if upload.method not in DIRECT_UPLOAD_METHODS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Method must be one of: {', '.join(DIRECT_UPLOAD_METHODS)}"
+            )
+        if upload.folder == "avatars" and not upload.content_type.startswith("image/"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Only image files are allowed"
+            )
+        if upload.size is not None and upload.size > settings.MAX_FILE_SIZE:
+            raise file_too_large_exception()
+        
+        object_name = storage_service.make_object_name(upload.file_name, upload.folder)
+        expires = timedelta(seconds=settings.MINIO_DIRECT_UPLOAD_EXPIRE_SECONDS)
+        
+        response = {
+            "success": True,
+            "method": upload.method.upper(),
+            "file_path": object_name,
+            "expires_in": settings.MINIO_DIRECT_UPLOAD_EXPIRE_SECONDS,
+        }
+        
+        if upload.method == "put":
+            url = await storage_service.get_presigned_put_url(object_name, expires)
+            if not url:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to generate upload URL"
+                )
+            response["url"] = url
+            response["headers"] = {"Content-Type": upload.content_type}
+        else:
+            form = await storage_service.get_presigned_post_form(
+                object_name, upload.content_type, settings.MAX_FILE_SIZE, expires
+            )
+            if not form:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to generate upload policy"
+                )
+            response.update(form)
+        
+        # Подписанный тикет загрузки: finalize проверяет объект по нему, без состояния на сервере
+        response["upload_token"] = jwt.encode(
+            {
+                "type": UPLOAD_TOKEN_TYPE,
+                "user_id": current_user.id,
+                "object_name": object_name,
+                "file_name": upload.file_name,
+                "content_type": upload.content_type,
+                "max_size": settings.MAX_FILE_SIZE,
+                # Запас на время загрузки после истечения ссылки
+                "exp": datetime.utcnow() + expires * 2,
+            },
+            settings.SECRET_KEY,
+            algorithm=settings.ALGORITHM
+        )
+        
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating direct upload: {str(e)}"
         )
 
 
+async def _direct_upload_result(
+    object_name: str,
+    file_name: Optional[str],
+    content_type: Optional[str],
+    size: int,
+    etag: Optional[str]
+) -> Dict:
+    """Ответ /direct-upload/complete"""
+    return {
+        "success": True,
+        "message": "File uploaded successfully",
+        "file_path": object_name,
+        "url": await presigned_url_cache.get_url(object_name),
+        "file_name": file_name,
+        "content_type": content_type,
+        "size": size,
+        "etag": etag
+    }
+
+
+@router.post("/direct-upload/complete")
+async def complete_direct_upload(
+    upload: DirectUploadComplete,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Завершить прямую загрузку: проверить объект в MinIO через stat_object"""
+    try:
+        try:
+            ticket = jwt.decode(upload.upload_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except jwt.PyJWTError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid or expired upload token"
+            )
+        if ticket.get("type") != UPLOAD_TOKEN_TYPE or ticket.get("user_id") != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Upload token does not belong to current user"
+            )
+        
+        object_name = ticket["object_name"]
+        
+        # Повторное завершение (ретрай клиента) не создает вторую строку
+        result = await db.execute(
+            select(StoredFile)
+            .where(StoredFile.object_name == object_name)
+            .order_by(StoredFile.id)
+            .limit(1)
+        )
+        stored_file = result.scalar_one_or_none()
+        if stored_file is not None and stored_file.owner_id is not None:
+            if stored_file.owner_id != current_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="File is already registered"
+                )
+            return await _direct_upload_result(
+                object_name, stored_file.file_name, stored_file.content_type, stored_file.size, stored_file.etag
+            )
+        
+        stat = await storage_service.stat_file(object_name)
+        if stat is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Uploaded file not found"
+            )
+        
+        # PUT ссылка не ограничивает размер и тип - проверяем фактический объект
+        if stat.size > ticket["max_size"]:
+            await storage_service.delete_file(object_name)
+            raise file_too_large_exception()
+        if (stat.content_type or "").split(";")[0] != ticket["content_type"]:
+            await storage_service.delete_file(object_name)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Uploaded content type does not match the requested one"
+            )
+        
+        if stored_file is None:
+            await _record_stored_file(
+                db, current_user, object_name, ticket["file_name"], stat.size, stat.content_type, etag=stat.etag
+            )
+        else:
+            await _claim_stored_file(
+                db, stored_file, current_user, ticket["file_name"], stat.size, stat.content_type, etag=stat.etag
+            )
+        if settings.AVATAR_DERIVATIVES_ENABLED and object_name.startswith("avatars/"):
+            avatar_derivatives.enqueue(object_name)
+        
+        return await _direct_upload_result(
+            object_name, ticket["file_name"], stat.content_type, stat.size, stat.etag
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error completing direct upload: {str(e)}"
+        )
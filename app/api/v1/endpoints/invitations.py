@@ -2,15 +2,28 @@
 API endpoints для управления приглашениями в компанию
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
-from typing import List
-from pydantic import BaseModel, EmailStr
+from sqlalchemy import select, insert, and_, or_, literal, String, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, EmailStr, ValidationError
 from datetime import datetime, timedelta
+import codecs
+import csv
 import secrets
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, get_read_db
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_datetime_id_cursor,
+    encode_datetime_id_cursor,
+    keyset_before,
+)
 from app.models import User, Company, Department, Employee, CompanyInvitation, InvitationStatus
 from app.api.v1.dependencies import get_current_user_from_token
 
@@ -48,6 +61,122 @@ class InvitationAccept(BaseModel):
     invitation_token: str
 
 
+class BulkInvitationCreate(BaseModel):
+    # Строки проверяются по одной, чтобы ошибка в одной не отклоняла весь запрос
+    invitations: List[Dict[str, Any]]
+
+
+# Частичный уникальный индекс: одно активное приглашение на email в компании
+PENDING_INVITATION_INDEX = "uq_company_invitations_pending_email_company"
+
+
+def _integrity_constraint(error: IntegrityError) -> Optional[str]:
+    """Имя нарушенного ограничения из ошибки драйвера (asyncpg, psycopg2)"""
+    for candidate in (error.orig, getattr(error.orig, "__cause__", None)):
+        name = getattr(candidate, "constraint_name", None)
+        if name:
+            return name
+        diag = getattr(candidate, "diag", None)
+        if diag is not None and getattr(diag, "constraint_name", None):
+            return diag.constraint_name
+    return None
+
+
+def _is_pending_invitation_conflict(error: IntegrityError) -> bool:
+    """Ошибка вызвана дубликатом активного приглашения (а не FK, токеном и т.п.)"""
+    constraint = _integrity_constraint(error)
+    if constraint is not None:
+        return constraint == PENDING_INVITATION_INDEX
+    # SQLite не сообщает имя индекса - только столбцы
+    message = str(error.orig)
+    return PENDING_INVITATION_INDEX in message or message.endswith(
+        "company_invitations.email, company_invitations.company_id"
+    )
+
+
+def _invitation_check_query(invitation_data: InvitationCreate, user_id: int):
+    """
+    Один запрос, возвращающий все данные для валидации приглашения:
+    компанию, права приглашающего, отдел, активное приглашение и сотрудника.
+    Если компании нет - строк не будет.
+    """
+    company_id = invitation_data.company_id
+    
+    is_admin = select(Employee.id).where(
+        and_(
+            Employee.user_id == user_id,
+            Employee.company_id == company_id,
+            Employee.role == "admin"
+        )
+    ).exists()
+    
+    if invitation_data.department_id:
+        department_name = select(Department.name).where(
+            and_(
+                Department.id == invitation_data.department_id,
+                Department.company_id == company_id
+            )
+        ).scalar_subquery()
+    else:
+        department_name = literal(None, String)
+    
+    has_pending_invitation = select(CompanyInvitation.id).where(
+        and_(
+            CompanyInvitation.email == invitation_data.email,
+            CompanyInvitation.company_id == company_id,
+            CompanyInvitation.status == InvitationStatus.PENDING
+        )
+    ).exists()
+    
+    is_employee = select(Employee.id).where(
+        and_(
+            Employee.email == invitation_data.email,
+            Employee.company_id == company_id
+        )
+    ).exists()
+    
+    return select(
+        Company.name.label("company_name"),
+        (Company.owner_id == user_id).label("is_owner"),
+        is_admin.label("is_admin"),
+        department_name.label("department_name"),
+        has_pending_invitation.label("has_pending_invitation"),
+        is_employee.label("is_employee"),
+    ).where(Company.id == company_id)
+
+
+def _invitation_rejections(check, invitation_data: InvitationCreate) -> List[HTTPException]:
+    """Все причины отказа по результату _invitation_check_query (в порядке приоритета)"""
+    if check is None:
+        return [HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Company not found"
+        )]
+    
+    rejections = []
+    if not (check.is_owner or check.is_admin):
+        rejections.append(HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only company owner or admin can invite users"
+        ))
+    if invitation_data.department_id and check.department_name is None:
+        rejections.append(HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Department not found"
+        ))
+    if check.has_pending_invitation:
+        rejections.append(HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Active invitation already exists for this email"
+        ))
+    if check.is_employee:
+        rejections.append(HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User is already an employee of this company"
+        ))
+    return rejections
+
+
 @router.post("/create", response_model=InvitationResponse)
 async def create_invitation(
     invitation_data: InvitationCreate,
@@ -59,129 +188,64 @@ async def create_invitation(
     Только владелец компании или админ может приглашать
     """
     try:
-        # Проверяем, что компания существует
-        result = await db.execute(
-            select(Company).where(Company.id == invitation_data.company_id)
-        )
-        company = result.scalar_one_or_none()
-        
-        if not company:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Company not found"
-            )
-        
-        # Проверяем права доступа (владелец или админ компании)
-        if company.owner_id != current_user.id:
-            # Проверяем, является ли пользователь админом компании
-            result = await db.execute(
-                select(Employee).where(
-                    and_(
-                        Employee.user_id == current_user.id,
-                        Employee.company_id == invitation_data.company_id,
-                        Employee.role == "admin"
-                    )
-                )
-            )
-            employee = result.scalar_one_or_none()
-            
-            if not employee:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="Only company owner or admin can invite users"
-                )
-        
-        # Проверяем, что отдел существует (если указан)
-        department = None
-        if invitation_data.department_id:
-            result = await db.execute(
-                select(Department).where(
-                    and_(
-                        Department.id == invitation_data.department_id,
-                        Department.company_id == invitation_data.company_id
-                    )
-                )
-            )
-            department = result.scalar_one_or_none()
-            
-            if not department:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Department not found"
-                )
-        
-        # Проверяем, нет ли уже активного приглашения для этого email
-        result = await db.execute(
-            select(CompanyInvitation).where(
-                and_(
-                    CompanyInvitation.email == invitation_data.email,
-                    CompanyInvitation.company_id == invitation_data.company_id,
-                    CompanyInvitation.status == InvitationStatus.PENDING
-                )
-            )
-        )
-        existing_invitation = result.scalar_one_or_none()
+        # Все проверки одним запросом
+        result = await db.execute(_invitation_check_query(invitation_data, current_user.id))
+        check = result.one_or_none()
         
-        if existing_invitation:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Active invitation already exists for this email"
-            )
-        
-        # Проверяем, не является ли пользователь уже сотрудником
-        result = await db.execute(
-            select(Employee).where(
-                and_(
-                    Employee.email == invitation_data.email,
-                    Employee.company_id == invitation_data.company_id
-                )
-            )
-        )
-        existing_employee = result.scalar_one_or_none()
-        
-        if existing_employee:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User is already an employee of this company"
-            )
+        rejections = _invitation_rejections(check, invitation_data)
+        if rejections:
+            raise rejections[0]
         
         # Создаем приглашение
         invitation_token = secrets.token_urlsafe(32)
         expires_at = datetime.utcnow() + timedelta(days=7)  # Приглашение действует 7 дней
         
-        invitation = CompanyInvitation(
+        # INSERT ... RETURNING без отдельного refresh.
+        # Дубликат активного приглашения отсекает частичный уникальный индекс
+        result = await db.execute(
+            insert(CompanyInvitation).values(
+                email=invitation_data.email,
+                company_id=invitation_data.company_id,
+                department_id=invitation_data.department_id,
+                invited_by_id=current_user.id,
+                role=invitation_data.role,
+                position=invitation_data.position,
+                invitation_token=invitation_token,
+                expires_at=expires_at,
+                status=InvitationStatus.PENDING
+            ).returning(CompanyInvitation.id, CompanyInvitation.created_at)
+        )
+        invitation_id, created_at = result.one()
+        await db.commit()
+        
+        return InvitationResponse(
+            id=invitation_id,
             email=invitation_data.email,
             company_id=invitation_data.company_id,
+            company_name=check.company_name,
             department_id=invitation_data.department_id,
-            invited_by_id=current_user.id,
+            department_name=check.department_name,
             role=invitation_data.role,
             position=invitation_data.position,
+            status=InvitationStatus.PENDING.value,
             invitation_token=invitation_token,
             expires_at=expires_at,
-            status=InvitationStatus.PENDING
-        )
-        
-        db.add(invitation)
-        await db.commit()
-        await db.refresh(invitation)
-        
-        return InvitationResponse(
-            id=invitation.id,
-            email=invitation.email,
-            company_id=invitation.company_id,
-            company_name=company.name,
-            department_id=invitation.department_id,
-            department_name=department.name if department else None,
-            role=invitation.role,
-            position=invitation.position,
-            status=invitation.status.value,
-            invitation_token=invitation.invitation_token,
-            expires_at=invitation.expires_at,
-            created_at=invitation.created_at
+            created_at=created_at
         )
     
     except HTTPException:
         raise
+    except IntegrityError as e:
+        await db.rollback()
+        if _is_pending_invitation_conflict(e):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Active invitation already exists for this email"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating invitation: {str(e.orig)}"
+        )
     except Exception as e:
         await db.rollback()
         raise HTTPException(
@@ -190,28 +254,62 @@ async def create_invitation(
         )
 
 
+def _paginate_invitations(query, cursor: Optional[str], limit: int):
+    """Keyset-пагинация по (created_at DESC, id DESC), выбирается limit + 1 строк"""
+    position = decode_datetime_id_cursor(cursor)
+    if position:
+        query = query.where(keyset_before(CompanyInvitation.created_at, CompanyInvitation.id, position))
+    return query.order_by(
+        CompanyInvitation.created_at.desc(),
+        CompanyInvitation.id.desc()
+    ).limit(limit + 1)
+
+
+def _set_next_cursor(response: Response, rows: list, limit: int) -> list:
+    """Отрезать лишнюю строку и выставить курсор следующей страницы"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_invitation = rows[-1][0]
+        response.headers[NEXT_CURSOR_HEADER] = encode_datetime_id_cursor(
+            last_invitation.created_at,
+            last_invitation.id
+        )
+    return rows
+
+
 @router.get("/my-invitations", response_model=List[InvitationResponse])
 async def get_my_invitations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.INVITATION_PAGE_SIZE, ge=1, le=settings.INVITATION_MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user_from_token),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получить все приглашения для текущего пользователя"""
+    """
+    Получить приглашения для текущего пользователя (постранично).
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
     try:
         result = await db.execute(
-            select(CompanyInvitation, Company, Department).
-            join(Company, CompanyInvitation.company_id == Company.id).
-            outerjoin(Department, CompanyInvitation.department_id == Department.id).
-            where(
-                and_(
-                    CompanyInvitation.email == current_user.email,
-                    CompanyInvitation.status == InvitationStatus.PENDING,
-                    CompanyInvitation.expires_at > datetime.utcnow()
-                )
+            _paginate_invitations(
+                select(CompanyInvitation, Company, Department).
+                join(Company, CompanyInvitation.company_id == Company.id).
+                outerjoin(Department, CompanyInvitation.department_id == Department.id).
+                where(
+                    and_(
+                        CompanyInvitation.email == current_user.email,
+                        CompanyInvitation.status == InvitationStatus.PENDING,
+                        CompanyInvitation.expires_at > datetime.utcnow()
+                    )
+                ),
+                cursor,
+                limit
             )
         )
+        rows = _set_next_cursor(response, result.all(), limit)
         
         invitations = []
-        for invitation, company, department in result:
+        for invitation, company, department in rows:
             invitations.append(InvitationResponse(
                 id=invitation.id,
                 email=invitation.email,
@@ -229,6 +327,8 @@ async def get_my_invitations(
         
         return invitations
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -383,10 +483,16 @@ async def decline_invitation(
 @router.get("/company/{company_id}/invitations", response_model=List[InvitationResponse])
 async def get_company_invitations(
     company_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.INVITATION_PAGE_SIZE, ge=1, le=settings.INVITATION_MAX_PAGE_SIZE),
     current_user: User = Depends(get_current_user_from_token),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получить все приглашения компании (только для владельца/админа)"""
+    """
+    Получить приглашения компании постранично (только для владельца/админа).
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    """
     try:
         # Проверяем права доступа
         result = await db.execute(
@@ -421,14 +527,18 @@ async def get_company_invitations(
         
         # Получаем приглашения
         result = await db.execute(
-            select(CompanyInvitation, Department).
-            outerjoin(Department, CompanyInvitation.department_id == Department.id).
-            where(CompanyInvitation.company_id == company_id).
-            order_by(CompanyInvitation.created_at.desc())
+            _paginate_invitations(
+                select(CompanyInvitation, Department).
+                outerjoin(Department, CompanyInvitation.department_id == Department.id).
+                where(CompanyInvitation.company_id == company_id),
+                cursor,
+                limit
+            )
         )
+        rows = _set_next_cursor(response, result.all(), limit)
         
         invitations = []
-        for invitation, department in result:
+        for invitation, department in rows:
             invitations.append(InvitationResponse(
                 id=invitation.id,
                 email=invitation.email,
@@ -455,3 +565,433 @@ async def get_company_invitations(
         )
 
 
+# ============================================
+# Массовое создание приглашений
+# ============================================
+
+BULK_CSV_COLUMNS = ("email", "company_id", "department_id", "role", "position")
+
+
+def _pending_invitation_insert(dialect_name: str):
+    """INSERT, пропускающий строки, конфликтующие с частичным уникальным индексом"""
+    index_where = text("status = 'PENDING'")
+    if dialect_name == "postgresql":
+        return postgresql.insert(CompanyInvitation).on_conflict_do_nothing(
+            index_elements=["email", "company_id"],
+            index_where=index_where
+        )
+    if dialect_name == "sqlite":
+        return sqlite.insert(CompanyInvitation).on_conflict_do_nothing(
+            index_elements=["email", "company_id"],
+            index_where=index_where
+        )
+    return insert(CompanyInvitation)
+
+
+async def _insert_invitations(
+    db: AsyncSession,
+    to_insert: List[Tuple[int, InvitationCreate, str]],
+    current_user: User,
+    expires_at: datetime
+) -> Dict[Tuple[str, int], int]:
+    """Вставить приглашения одним INSERT ... RETURNING и зафиксировать: {(email, company_id): id}"""
+    statement = _pending_invitation_insert(db.bind.dialect.name).returning(
+        CompanyInvitation.id,
+        CompanyInvitation.email,
+        CompanyInvitation.company_id
+    )
+    result = await db.execute(
+        statement,
+        [
+            {
+                "email": row.email,
+                "company_id": row.company_id,
+                "department_id": row.department_id,
+                "invited_by_id": current_user.id,
+                "role": row.role,
+                "position": row.position,
+                "invitation_token": token,
+                "expires_at": expires_at,
+                "status": InvitationStatus.PENDING,
+            }
+            for _, row, token in to_insert
+        ]
+    )
+    inserted = {(email, company_id): invitation_id for invitation_id, email, company_id in result}
+    await db.commit()
+    return inserted
+
+
+async def _process_invitation_batch(
+    db: AsyncSession,
+    rows: List[Tuple[int, InvitationCreate]],
+    current_user: User,
+    seen: set
+) -> List[Dict]:
+    """
+    Проверить и вставить пачку приглашений.
+    Все проверки выполняются множественными запросами на всю пачку,
+    вставка - одним INSERT ... RETURNING.
+    """
+    results: Dict[int, Dict] = {}
+    company_ids = {row.company_id for _, row in rows}
+    department_ids = {row.department_id for _, row in rows if row.department_id}
+    emails = {row.email for _, row in rows}
+    
+    # Компании, в которые текущий пользователь может приглашать
+    admin_company_ids = select(Employee.company_id).where(
+        and_(
+            Employee.user_id == current_user.id,
+            Employee.role == "admin"
+        )
+    )
+    result = await db.execute(
+        select(Company.id, Company.name).where(
+            and_(
+                Company.id.in_(company_ids),
+                or_(
+                    Company.owner_id == current_user.id,
+                    Company.id.in_(admin_company_ids)
+                )
+            )
+        )
+    )
+    allowed_companies = {company_id: name for company_id, name in result}
+    
+    result = await db.execute(
+        select(Company.id).where(Company.id.in_(company_ids))
+    )
+    existing_companies = set(result.scalars())
+    
+    departments: Dict[int, Tuple[int, str]] = {}
+    if department_ids:
+        result = await db.execute(
+            select(Department.id, Department.company_id, Department.name).
+            where(Department.id.in_(department_ids))
+        )
+        departments = {dep_id: (company_id, name) for dep_id, company_id, name in result}
+    
+    result = await db.execute(
+        select(CompanyInvitation.email, CompanyInvitation.company_id).where(
+            and_(
+                CompanyInvitation.email.in_(emails),
+                CompanyInvitation.company_id.in_(company_ids),
+                CompanyInvitation.status == InvitationStatus.PENDING
+            )
+        )
+    )
+    pending = set(result.all())
+    
+    result = await db.execute(
+        select(Employee.email, Employee.company_id).where(
+            and_(
+                Employee.email.in_(emails),
+                Employee.company_id.in_(company_ids)
+            )
+        )
+    )
+    employees = set(result.all())
+    
+    expires_at = datetime.utcnow() + timedelta(days=7)
+    to_insert = []
+    for row_number, row in rows:
+        key = (row.email, row.company_id)
+        error = None
+        if row.company_id not in existing_companies:
+            error = "Company not found"
+        elif row.company_id not in allowed_companies:
+            error = "Only company owner or admin can invite users"
+        elif row.department_id and departments.get(row.department_id, (None,))[0] != row.company_id:
+            error = "Department not found"
+        elif key in pending or key in seen:
+            error = "Active invitation already exists for this email"
+        elif key in employees:
+            error = "User is already an employee of this company"
+        
+        if error:
+            results[row_number] = {"row": row_number, "email": row.email, "status": "error", "error": error}
+            continue
+        
+        seen.add(key)
+        to_insert.append((row_number, row, secrets.token_urlsafe(32)))
+    
+    if to_insert:
+        failures: Dict[int, str] = {}
+        try:
+            inserted = await _insert_invitations(db, to_insert, current_user, expires_at)
+        except IntegrityError:
+            # Нарушение вне ON CONFLICT (внешний ключ, токен, СУБД без ON CONFLICT):
+            # строки пачки вставляются по одной, чтобы ошибка досталась своей строке
+            await db.rollback()
+            inserted = {}
+            for item in to_insert:
+                try:
+                    inserted.update(await _insert_invitations(db, [item], current_user, expires_at))
+                except IntegrityError as e:
+                    await db.rollback()
+                    failures[item[0]] = (
+                        "Active invitation already exists for this email"
+                        if _is_pending_invitation_conflict(e)
+                        else f"Could not create invitation: {str(e.orig)}"
+                    )
+        
+        for row_number, row, token in to_insert:
+            invitation_id = inserted.get((row.email, row.company_id))
+            if row_number in failures:
+                results[row_number] = {
+                    "row": row_number,
+                    "email": row.email,
+                    "status": "error",
+                    "error": failures[row_number]
+                }
+            elif invitation_id is None:
+                # Строку отсек уникальный индекс (параллельное приглашение)
+                results[row_number] = {
+                    "row": row_number,
+                    "email": row.email,
+                    "status": "error",
+                    "error": "Active invitation already exists for this email"
+                }
+            else:
+                results[row_number] = {
+                    "row": row_number,
+                    "email": row.email,
+                    "status": "created",
+                    "id": invitation_id,
+                    "company_id": row.company_id,
+                    "company_name": allowed_companies[row.company_id],
+                    "invitation_token": token,
+                    "expires_at": expires_at,
+                }
+    
+    return [results[row_number] for row_number, _ in rows]
+
+
+class _BulkInvitationProcessor:
+    """
+    Накопление строк и обработка их пачками фиксированного размера.
+    Каждая пачка фиксируется отдельно: при сбое или превышении лимита
+    строк обработка останавливается, а итог содержит результаты уже
+    зафиксированных пачек.
+    """
+    
+    def __init__(self, db: AsyncSession, current_user: User):
+        self.db = db
+        self.current_user = current_user
+        self.batch: List[Tuple[int, InvitationCreate]] = []
+        self.results: List[Dict] = []
+        self.seen: set = set()
+        self.total = 0
+        self.truncated = False
+        self.error: Optional[str] = None
+    
+    @property
+    def stopped(self) -> bool:
+        return self.truncated or self.error is not None
+    
+    async def add(self, row_number: int, data: Dict) -> bool:
+        """Добавить строку; False - обработка остановлена (лимит строк или сбой пачки)"""
+        if self.stopped:
+            return False
+        if self.total >= settings.INVITATION_BULK_MAX_ROWS:
+            self.truncated = True
+            return False
+        self.total += 1
+        try:
+            row = InvitationCreate(**data)
+        except ValidationError as e:
+            self.results.append({
+                "row": row_number,
+                "email": data.get("email"),
+                "status": "error",
+                "error": "; ".join(error["msg"] for error in e.errors())
+            })
+            return True
+        
+        self.batch.append((row_number, row))
+        if len(self.batch) >= settings.INVITATION_BULK_BATCH_SIZE:
+            await self.flush()
+        return not self.stopped
+    
+    async def flush(self):
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        try:
+            results = await _process_invitation_batch(self.db, batch, self.current_user, self.seen)
+        except Exception as e:
+            # Предыдущие пачки уже зафиксированы - их результаты остаются в итоге
+            await self.db.rollback()
+            self.error = f"Error creating invitations: {str(e)}"
+            results = [
+                {"row": row_number, "email": row.email, "status": "error", "error": self.error}
+                for row_number, row in batch
+            ]
+        self.results.extend(results)
+    
+    def summary(self) -> Dict:
+        self.results.sort(key=lambda item: item["row"])
+        created = sum(1 for item in self.results if item["status"] == "created")
+        summary = {
+            "success": self.error is None,
+            "total": len(self.results),
+            "created": created,
+            "failed": len(self.results) - created,
+            "truncated": self.truncated,
+            "results": self.results,
+        }
+        if self.error is not None:
+            summary["detail"] = self.error
+        elif self.truncated:
+            summary["detail"] = (
+                f"Too many invitations, maximum is {settings.INVITATION_BULK_MAX_ROWS}; "
+                f"rows after the limit were not processed"
+            )
+        return summary
+    
+    def response(self):
+        """Итог обработки; сбой пачки - 500 с результатами зафиксированных строк"""
+        summary = self.summary()
+        if self.error is not None:
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content=jsonable_encoder(summary)
+            )
+        return summary
+
+
+class _CsvRecordSplitter:
+    """
+    Инкрементальное разбиение текста на записи CSV.
+    Перевод строки внутри поля в кавычках запись не завершает,
+    поэтому многострочные поля доходят до csv.reader целиком.
+    """
+    
+    def __init__(self):
+        self.tail = ""
+        self.record = ""
+        self.quoted = False
+    
+    def feed(self, text: str) -> List[str]:
+        lines = (self.tail + text).split("\n")
+        self.tail = lines.pop()
+        records = []
+        for line in lines:
+            self.record += line + "\n"
+            # Экранированная кавычка ("") не меняет четность
+            if line.count('"') % 2:
+                self.quoted = not self.quoted
+            if not self.quoted:
+                records.append(self.record)
+                self.record = ""
+        return records
+    
+    def close(self) -> List[str]:
+        rest = self.record + self.tail
+        self.tail, self.record, self.quoted = "", "", False
+        return [rest] if rest else []
+
+
+@router.post("/bulk")
+async def create_invitations_bulk(
+    bulk_data: BulkInvitationCreate,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Массовое создание приглашений (JSON)
+    Возвращает результат по каждой строке
+    """
+    if len(bulk_data.invitations) > settings.INVITATION_BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Too many invitations, maximum is {settings.INVITATION_BULK_MAX_ROWS}"
+        )
+    
+    processor = _BulkInvitationProcessor(db, current_user)
+    try:
+        for row_number, invitation_data in enumerate(bulk_data.invitations, start=1):
+            if not await processor.add(row_number, invitation_data):
+                break
+        await processor.flush()
+        return processor.response()
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating invitations: {str(e)}"
+        )
+
+
+@router.post("/bulk/csv")
+async def create_invitations_bulk_csv(
+    request: Request,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Массовое создание приглашений из CSV (тело запроса text/csv).
+    Первая строка - заголовок: email,company_id,department_id,role,position.
+    Тело читается потоково, строки обрабатываются пачками; строки сверх
+    INVITATION_BULK_MAX_ROWS не обрабатываются (truncated в ответе).
+    """
+    processor = _BulkInvitationProcessor(db, current_user)
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    splitter = _CsvRecordSplitter()
+    header: Optional[List[str]] = None
+    row_number = 0
+    
+    async def handle_records(records: List[str]) -> bool:
+        nonlocal header, row_number
+        for values in csv.reader(records):
+            if not values or not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [value.strip().lower() for value in values]
+                missing = {"email", "company_id"} - set(header)
+                if missing:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"CSV header must contain: {', '.join(sorted(missing))}"
+                    )
+                continue
+            row_number += 1
+            data = {
+                column: value.strip() or None
+                for column, value in zip(header, values)
+                if column in BULK_CSV_COLUMNS
+            }
+            if data.get("role") is None:
+                data.pop("role", None)
+            if not await processor.add(row_number, data):
+                return False
+        return True
+    
+    try:
+        proceed = True
+        async for chunk in request.stream():
+            proceed = await handle_records(splitter.feed(decoder.decode(chunk)))
+            if not proceed:
+                break
+        if proceed:
+            await handle_records(splitter.feed(decoder.decode(b"", final=True)) + splitter.close())
+        
+        await processor.flush()
+        return processor.response()
+    
+    except HTTPException:
+        raise
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="CSV must be UTF-8 encoded"
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating invitations: {str(e)}"
+        )
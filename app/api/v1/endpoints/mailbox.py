@@ -2,20 +2,32 @@
 API endpoints для работы с почтовыми ящиками через Mailcow
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from urllib.parse import quote
 from pydantic import BaseModel
+import asyncio
 import httpx
+import json
 import os
 from datetime import datetime
 
 from app.core.database import get_db
 from app.core.config import settings
-from app.models import User, Employee
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.models import User, Employee, OutboundEmailStatus
 from app.api.v1.dependencies import get_current_user_from_token
 from app.schemas.auth import UserResponse
-from app.services.email_service import EmailService
+from app.services.async_email_service import AsyncEmailService, MailTimeoutError, mail_executor
+from app.services.email_service import SECTION_RE, mailbox_passwords
+from app.services.imap_pool import imap_pool
+from app.services.mail_sync import mailbox_sync
+from app.services.mail_outbox import mail_outbox
+from app.services.mail_search import mail_search
+from app.services.mail_idle import mail_idle
+from app.services.smtp_pool import smtp_pool
 
 router = APIRouter()
 
@@ -31,6 +43,13 @@ MAILCOW_API_URL = "https://mail.anyatis.com/api/v1"
 MAILCOW_API_KEY = os.getenv("MAILCOW_API_KEY", "your-mailcow-api-key")
 MAILCOW_DOMAIN = os.getenv("MAILCOW_DOMAIN", "anyatis.com")
 
+async def _close_mail_sessions(email: str):
+    """Закрыть IMAP и SMTP сессии ящика со старым паролем"""
+    await mail_executor.run("close_user", imap_pool.close_user, email)
+    await mail_executor.run("close_user", smtp_pool.close_user, email)
+    mail_idle.reconnect_user(email)
+
+
 async def create_mailcow_mailbox(email: str, password: str, name: str) -> dict:
     """Создание почтового ящика в Mailcow"""
     try:
@@ -243,6 +262,8 @@ async def update_mailbox_password(
         )
         
         if result["success"]:
+            # Сессии со старым паролем больше не нужны
+            await _close_mail_sessions(current_user.email)
             return {
                 "success": True,
                 "message": "Mailbox password updated successfully"
@@ -302,8 +323,8 @@ class MailboxPasswordRequest(BaseModel):
     password: str
 
 
-# Хранилище паролей почтовых ящиков (в продакшене использовать Redis или БД)
-_mailbox_passwords = {}
+# Хранилище паролей почтовых ящиков (общее с очередью отправки)
+_mailbox_passwords = mailbox_passwords
 
 
 @router.post("/set-password")
@@ -315,6 +336,7 @@ async def set_mailbox_password(
     try:
         # В продакшене нужно шифровать пароль перед сохранением
         _mailbox_passwords[current_user.email] = request.password
+        await _close_mail_sessions(current_user.email)
         
         return {
             "success": True,
@@ -327,33 +349,94 @@ async def set_mailbox_password(
         )
 
 
+def _mailbox_service(current_user: User) -> AsyncEmailService:
+    """Почтовый клиент текущего пользователя (401, если пароль ящика не задан)"""
+    password = _mailbox_passwords.get(current_user.email)
+    if not password:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Mailbox password not set. Please set your mailbox password first."
+        )
+    return AsyncEmailService(current_user.email, password)
+
+
+def _mail_timeout(e: MailTimeoutError) -> HTTPException:
+    """Ответ на операцию, не уложившуюся в MAIL_OPERATION_TIMEOUT"""
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=str(e)
+    )
+
+
+def _decode_uid_cursor(cursor: Optional[str]) -> Optional[int]:
+    """UID, с которого продолжается список (курсор X-Next-Cursor)"""
+    if not cursor:
+        return None
+    try:
+        return int(decode_cursor(cursor)["u"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
 @router.get("/emails")
 async def get_emails(
+    response: Response,
     folder: str = "INBOX",
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
     offset: int = 0,
-    current_user: User = Depends(get_current_user_from_token)
+    cursor: Optional[str] = None,
+    refresh: bool = False,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Получение списка писем из папки"""
+    """
+    Получение списка писем из папки (из локального индекса)
+    
+    При первом открытии папки сразу загружается только запрошенная
+    страница самых новых писем, при refresh=true - одна пачка изменений;
+    остальное догружается в фоне. Устаревший индекс тоже обновляется в
+    фоне, а ответ отдается сразу. Курсор следующей страницы - в заголовке
+    X-Next-Cursor.
+    """
     try:
-        password = _mailbox_passwords.get(current_user.email)
-        if not password:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Mailbox password not set. Please set your mailbox password first."
-            )
+        email_service = _mailbox_service(current_user)
         
-        email_service = EmailService(current_user.email, password)
-        emails = email_service.get_emails(folder, limit, offset)
+        # Соединение db не занимается, пока идет обмен с IMAP: состояние
+        # читается отдельной короткой сессией, db нужна только для списка
+        state = await mailbox_sync.load_state(current_user.id, folder)
+        if state is None or refresh:
+            batch_size = min(limit + offset, mailbox_sync.batch_size) if state is None else None
+            await mailbox_sync.sync_first_batch(current_user.id, email_service, folder, batch_size=batch_size)
+            state = await mailbox_sync.load_state(current_user.id, folder)
+        elif state.backfill_uid is not None or (
+            # Наблюдаемая через IDLE папка обновляется по событиям сервера
+            mailbox_sync.is_stale(state) and not mail_idle.is_watching(current_user.email, folder)
+        ):
+            mailbox_sync.schedule(current_user.id, email_service, folder)
+        
+        messages = await mailbox_sync.list_messages(
+            db, current_user.id, folder, limit, before_uid=_decode_uid_cursor(cursor), offset=offset
+        )
+        if len(messages) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"u": messages[-1].uid})
+        
+        emails = [mailbox_sync.to_email_item(message) for message in messages]
         
         return {
             "success": True,
             "emails": emails,
             "total": len(emails),
+            "folder_total": state.message_count if state else 0,
+            "synced_at": state.last_synced_at if state else None,
             "folder": folder
         }
     except HTTPException:
         raise
+    except MailTimeoutError as e:
+        raise _mail_timeout(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -361,23 +444,139 @@ async def get_emails(
         )
 
 
+@router.get("/search")
+async def search_emails(
+    q: str = Query(..., min_length=1, max_length=500),
+    folder: Optional[str] = None,
+    sender: Optional[str] = Query(None, alias="from"),
+    subject: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    facets: bool = False,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Поиск по синхронизированным письмам (заголовки и начало текста)
+    
+    Ищет в локальном индексе без обращения к IMAP серверу, поэтому
+    находит только письма папок, уже открывавшихся в клиенте.
+    Фильтры: folder, from, subject, date_from/date_to; facets=true
+    добавляет число найденных писем по папкам, отправителям, темам и месяцам.
+    """
+    try:
+        result = await mail_search.search(
+            db,
+            current_user.id,
+            q,
+            folder=folder,
+            sender=sender,
+            subject=subject,
+            date_from=date_from,
+            date_to=date_to,
+            limit=limit,
+            offset=offset,
+            with_facets=facets,
+        )
+        
+        return {"success": True, **result}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching emails: {str(e)}"
+        )
+
+
+@router.post("/sync")
+async def sync_mailbox_folder(
+    folder: str = "INBOX",
+    current_user: User = Depends(get_current_user_from_token)
+):
+    """
+    Синхронизировать папку с IMAP сервером
+    
+    В запросе выполняется одна пачка (MAIL_SYNC_FETCH_BATCH_SIZE писем);
+    complete=false - остаток догружается в фоне.
+    """
+    try:
+        email_service = _mailbox_service(current_user)
+        result = await mailbox_sync.sync_first_batch(current_user.id, email_service, folder)
+        
+        return {
+            "success": True,
+            **result
+        }
+    except HTTPException:
+        raise
+    except MailTimeoutError as e:
+        raise _mail_timeout(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error syncing folder: {str(e)}"
+        )
+
+
+@router.get("/events")
+async def mailbox_events(
+    request: Request,
+    folder: str = "INBOX",
+    current_user: User = Depends(get_current_user_from_token)
+):
+    """
+    Поток событий почтового ящика (Server-Sent Events)
+    
+    Пока поток открыт, сервер держит IMAP IDLE соединение и при новых
+    письмах или изменении флагов синхронизирует папку и отправляет
+    событие mailbox с числом добавленных, удаленных и измененных писем.
+    Событие stopped означает, что push для ящика недоступен - клиенту
+    следует вернуться к периодическому запросу /emails.
+    """
+    _mailbox_service(current_user)
+    if not settings.IMAP_IDLE_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Mail push notifications are disabled"
+        )
+    
+    async def stream():
+        # Подписка в генераторе: если поток так и не начнется (клиент ушел
+        # до отправки ответа), подписка не создается и не остается висеть
+        queue = mail_idle.subscribe(current_user.id, current_user.email, folder)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.MAIL_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if event is None:
+                    break
+                yield f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            mail_idle.unsubscribe(current_user.email, folder, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/emails/{email_id}")
 async def get_email_detail(
     email_id: str,
     folder: str = "INBOX",
-    current_user: User = Depends(get_current_user_from_token)
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Получение полного содержимого письма"""
     try:
-        password = _mailbox_passwords.get(current_user.email)
-        if not password:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Mailbox password not set"
-            )
-        
-        email_service = EmailService(current_user.email, password)
-        email_data = email_service.get_email_by_id(email_id, folder)
+        email_service = _mailbox_service(current_user)
+        email_data = await email_service.get_email_by_id(email_id, folder)
         
         if not email_data:
             raise HTTPException(
@@ -386,7 +585,9 @@ async def get_email_detail(
             )
         
         # Пометить как прочитанное
-        email_service.mark_as_read(email_id, folder)
+        await email_service.mark_as_read(email_id, folder)
+        if email_id.isdigit():
+            await mailbox_sync.mark_read(db, current_user.id, folder, int(email_id))
         
         return {
             "success": True,
@@ -394,6 +595,8 @@ async def get_email_detail(
         }
     except HTTPException:
         raise
+    except MailTimeoutError as e:
+        raise _mail_timeout(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -401,22 +604,75 @@ async def get_email_detail(
         )
 
 
-@router.post("/emails/send")
-async def send_email(
-    request: EmailSendRequest,
+@router.get("/emails/{email_id}/attachments/{section}")
+async def download_attachment(
+    email_id: str,
+    section: str,
+    folder: str = "INBOX",
     current_user: User = Depends(get_current_user_from_token)
 ):
-    """Отправка письма"""
+    """
+    Скачать вложение письма
+    
+    MIME часть читается с IMAP сервера блоками и декодируется на лету,
+    поэтому вложение целиком в памяти не находится. section - номер
+    части из списка attachments письма.
+    """
     try:
-        password = _mailbox_passwords.get(current_user.email)
-        if not password:
+        email_service = _mailbox_service(current_user)
+        
+        if not email_id.isdigit() or not SECTION_RE.match(section):
             raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Mailbox password not set"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid email id or attachment section"
             )
         
-        email_service = EmailService(current_user.email, password)
-        success = email_service.send_email(
+        part = await email_service.get_part(email_id, section, folder)
+        if part is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Attachment not found"
+            )
+        
+        filename = part["filename"] or f"part-{section}"
+        return StreamingResponse(
+            email_service.iter_part(email_id, part, folder),
+            media_type=part["content_type"],
+            headers={
+                "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"
+            }
+        )
+    except HTTPException:
+        raise
+    except MailTimeoutError as e:
+        raise _mail_timeout(e)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error downloading attachment: {str(e)}"
+        )
+
+
+@router.post("/emails/send", status_code=status.HTTP_202_ACCEPTED)
+async def send_email(
+    request: EmailSendRequest,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Отправка письма
+    
+    Письмо ставится в очередь и отправляется в фоне; статус доступен
+    через GET /outbox/{message_id}.
+    """
+    try:
+        # Пароль нужен очереди для входа на SMTP сервер
+        _mailbox_service(current_user)
+        
+        message = await mail_outbox.enqueue(
+            db,
+            user_id=current_user.id,
+            from_addr=current_user.email,
             to=request.to,
             subject=request.subject,
             body=request.body,
@@ -425,22 +681,68 @@ async def send_email(
             is_html=request.is_html
         )
         
-        if success:
-            return {
-                "success": True,
-                "message": "Email sent successfully"
-            }
-        else:
+        return {
+            "success": True,
+            "message": "Email queued for delivery",
+            "id": message.id,
+            "status": message.status.value
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error sending email: {str(e)}"
+        )
+
+
+@router.get("/outbox")
+async def get_outbox(
+    limit: int = Query(50, ge=1, le=200),
+    status_filter: Optional[OutboundEmailStatus] = Query(None, alias="status"),
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Последние отправленные письма и статус их доставки"""
+    try:
+        messages = await mail_outbox.list_for_user(db, current_user.id, limit, status_filter)
+        
+        return {
+            "success": True,
+            "emails": [mail_outbox.to_item(message) for message in messages]
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error fetching outbox: {str(e)}"
+        )
+
+
+@router.get("/outbox/{message_id}")
+async def get_outbox_email(
+    message_id: int,
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
+):
+    """Статус доставки письма"""
+    try:
+        message = await mail_outbox.get(db, current_user.id, message_id)
+        if message is None:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send email"
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Email not found"
             )
+        
+        return {
+            "success": True,
+            "email": mail_outbox.to_item(message)
+        }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error sending email: {str(e)}"
+            detail=f"Error fetching email status: {str(e)}"
         )
 
 
@@ -448,21 +750,17 @@ async def send_email(
 async def delete_email(
     email_id: str,
     folder: str = "INBOX",
-    current_user: User = Depends(get_current_user_from_token)
+    current_user: User = Depends(get_current_user_from_token),
+    db: AsyncSession = Depends(get_db)
 ):
     """Удаление письма"""
     try:
-        password = _mailbox_passwords.get(current_user.email)
-        if not password:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Mailbox password not set"
-            )
-        
-        email_service = EmailService(current_user.email, password)
-        success = email_service.delete_email(email_id, folder)
+        email_service = _mailbox_service(current_user)
+        success = await email_service.delete_email(email_id, folder)
         
         if success:
+            if email_id.isdigit():
+                await mailbox_sync.forget_message(db, current_user.id, folder, int(email_id))
             return {
                 "success": True,
                 "message": "Email deleted successfully"
@@ -474,6 +772,8 @@ async def delete_email(
             )
     except HTTPException:
         raise
+    except MailTimeoutError as e:
+        raise _mail_timeout(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -487,15 +787,8 @@ async def get_folders(
 ):
     """Получение списка папок почтового ящика"""
     try:
-        password = _mailbox_passwords.get(current_user.email)
-        if not password:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Mailbox password not set"
-            )
-        
-        email_service = EmailService(current_user.email, password)
-        folders = email_service.get_folders()
+        email_service = _mailbox_service(current_user)
+        folders = await email_service.get_folders()
         
         return {
             "success": True,
@@ -503,6 +796,8 @@ async def get_folders(
         }
     except HTTPException:
         raise
+    except MailTimeoutError as e:
+        raise _mail_timeout(e)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
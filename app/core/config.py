@@ -19,8 +19,14 @@ class Settings(BaseSettings):
     # API настройки
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str = "your-secret-key-change-in-production"
+    ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 дней
     
+    # Хеширование паролей (bcrypt в отдельном пуле потоков)
+    BCRYPT_ROUNDS: int = 12  # Cost factor; при изменении пароли перехешируются при входе
+    PASSWORD_HASH_MAX_WORKERS: int = 4  # Параллельных операций bcrypt на воркер
+    PASSWORD_HASH_MAX_QUEUE: int = 256  # Максимум ожидающих операций, сверх - 503
+    
     # CORS настройки
     ALLOWED_HOSTS: List[str] = [
         "http://localhost:3000",
@@ -42,6 +48,18 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "postgresql://alisherbilalov@localhost:5432/business_platform"
     DATABASE_URL_ASYNC: str = "postgresql+asyncpg://alisherbilalov@localhost:5432/business_platform"
     
+    # Реплика только для чтения (async URL). Если не задана - чтение из основной БД
+    DATABASE_URL_REPLICA: Optional[str] = None
+    REPLICA_READ_YOUR_WRITES_SECONDS: int = 5  # Чтения из основной БД после записи клиента
+    
+    # Пул соединений PostgreSQL
+    DB_POOL_SIZE: int = 10  # Постоянные соединения в пуле
+    DB_MAX_OVERFLOW: int = 20  # Дополнительные соединения сверх DB_POOL_SIZE
+    DB_POOL_TIMEOUT: float = 30.0  # Ожидание свободного соединения, секунд
+    DB_POOL_PRE_PING: bool = True  # Проверять соединение перед выдачей
+    DB_POOL_RECYCLE: int = 1800  # Пересоздавать соединения старше N секунд
+    DB_STATEMENT_CACHE_SIZE: int = 100  # Кэш prepared statements asyncpg (0 для pgbouncer)
+    
     # Redis - Caching and Session Storage
     REDIS_URL: str = "redis://localhost:6379/0"
     REDIS_PASSWORD: Optional[str] = None
@@ -49,6 +67,11 @@ class Settings(BaseSettings):
     REDIS_CACHE_TTL: int = 3600  # 1 hour default cache TTL
     REDIS_SESSION_TTL: int = 86400  # 24 hours session TTL
     
+    # Кэш аутентифицированных пользователей (principal cache)
+    PRINCIPAL_CACHE_TTL: int = 300  # TTL в Redis, секунд
+    PRINCIPAL_CACHE_LOCAL_TTL: int = 30  # TTL в памяти процесса, секунд
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000  # Максимум пользователей в памяти процесса
+    
     # MinIO - S3-compatible File Storage
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: str = "minioadmin"
@@ -56,11 +79,76 @@ class Settings(BaseSettings):
     MINIO_SECURE: bool = False
     MINIO_BUCKET_NAME: str = "business-platform"
     MINIO_REGION: str = "us-east-1"
+    MINIO_MAX_WORKERS: int = 16  # Потоков для вызовов синхронного клиента minio
+    MINIO_HTTP_POOL_SIZE: int = 32  # HTTP соединений к MinIO (не меньше MINIO_MAX_WORKERS)
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 300.0
+    MINIO_STREAM_CHUNK_SIZE: int = 1024 * 1024  # Размер блока при потоковой отдаче файлов
+    MINIO_UPLOAD_PART_SIZE: int = 5 * 1024 * 1024  # Размер части multipart загрузки (минимум 5MB)
+    MINIO_DIRECT_UPLOAD_EXPIRE_SECONDS: int = 900  # Время жизни ссылок прямой загрузки в MinIO
+    MINIO_CONTENT_ADDRESSED: bool = False  # Хранить загрузки по sha256 содержимого (дедупликация)
+    
+    # Кэш временных ссылок на файлы (presigned GET)
+    PRESIGNED_URL_EXPIRE_SECONDS: int = 3600  # Время жизни ссылки
+    PRESIGNED_URL_BUCKET_SECONDS: int = 600  # Ссылки подписываются от начала окна - одна ссылка на окно
+    PRESIGNED_URL_MIN_REMAINING_SECONDS: int = 300  # Не отдавать из кэша ссылки, живущие меньше (BUCKET + MIN_REMAINING < EXPIRE)
+    PRESIGNED_URL_CACHE_MAX_SIZE: int = 10000  # Максимум ссылок в памяти процесса
+    PRESIGNED_URL_BATCH_MAX_SIZE: int = 500  # Максимум файлов в пакетном запросе ссылок
     
     # Mailcow Configuration
     MAILCOW_API_KEY: Optional[str] = None
     MAILCOW_DOMAIN: Optional[str] = None
     MAILCOW_API_URL: Optional[str] = None
+    MAILCOW_IMAP_SERVER: str = "mail.anyatis.com"
+    MAILCOW_IMAP_PORT: int = 993
+    MAILCOW_IMAP_SSL: bool = True  # False - IMAP без TLS (локальный тестовый сервер)
+    MAILCOW_SMTP_SERVER: str = "mail.anyatis.com"
+    MAILCOW_SMTP_PORT: int = 587
+    MAILCOW_SMTP_STARTTLS: bool = True
+    MAILCOW_SMTP_TIMEOUT: float = 30.0  # Таймаут подключения и операций SMTP
+    
+    # Асинхронный доступ к почте (IMAP/SMTP в отдельном пуле потоков)
+    MAIL_MAX_WORKERS: int = 32  # Потоков для операций с почтовым сервером
+    MAIL_OPERATION_TIMEOUT: float = 30.0  # Максимальное время операции для API
+    MAIL_ABORT_GRACE_SECONDS: float = 2.0  # Ожидание потока после прерывания операции по таймауту
+    
+    # Пул IMAP соединений
+    IMAP_POOL_MAX_PER_USER: int = 3  # Одновременных IMAP сессий на ящик
+    IMAP_POOL_MAX_PER_SERVER: int = 200  # Всего IMAP сессий на сервер
+    IMAP_POOL_IDLE_TIMEOUT: int = 300  # Закрывать соединения, простаивающие дольше (сек)
+    IMAP_POOL_HEALTH_CHECK_INTERVAL: int = 30  # NOOP перед выдачей после такого простоя (сек)
+    IMAP_POOL_ACQUIRE_TIMEOUT: float = 10.0  # Ожидание свободного соединения
+    IMAP_CONNECT_TIMEOUT: float = 10.0  # Таймаут подключения и операций IMAP
+    EMAIL_PREVIEW_BYTES: int = 1024  # Байт начала текста письма для превью в списке
+    MAIL_ATTACHMENT_CHUNK_SIZE: int = 256 * 1024  # Байт в одном FETCH при скачивании вложения
+    MAIL_SYNC_MIN_INTERVAL_SECONDS: int = 60  # Не чаще синхронизировать папку при открытии списка
+    MAIL_SYNC_FETCH_BATCH_SIZE: int = 500  # Писем в одной пачке синхронизации (один вызов IMAP и одна транзакция)
+    MAIL_SEARCH_BODY_BYTES: int = 8192  # Байт начала текста письма в поисковом индексе
+    MAIL_SEARCH_FACET_SIZE: int = 10  # Значений в каждом фасете результатов поиска
+    
+    # Push-уведомления о почте (IMAP IDLE)
+    IMAP_IDLE_ENABLED: bool = True
+    IMAP_IDLE_MAX_CONNECTIONS: int = 200  # Одновременных IDLE соединений (сверх лимита - вытеснение LRU)
+    IMAP_IDLE_RENEW_SECONDS: int = 1500  # Перезапуск IDLE (серверы обрывают его через ~30 минут)
+    IMAP_IDLE_CHECK_INTERVAL: float = 5.0  # Ожидание ответа сервера в IDLE за один шаг (сек)
+    IMAP_IDLE_LINGER_SECONDS: int = 300  # Держать IDLE после ухода последнего подписчика (сек)
+    MAIL_EVENTS_QUEUE_SIZE: int = 100  # Неотправленных событий на одного подписчика
+    MAIL_EVENTS_HEARTBEAT_SECONDS: int = 20  # Комментарий-пинг в потоке SSE без событий
+    
+    # Пул SMTP соединений и очередь исходящих писем
+    SMTP_POOL_MAX_PER_USER: int = 2  # Одновременных SMTP сессий на ящик
+    SMTP_POOL_MAX_PER_SERVER: int = 50  # Всего SMTP сессий на сервер
+    SMTP_POOL_IDLE_TIMEOUT: int = 120  # Закрывать соединения, простаивающие дольше (сек)
+    SMTP_POOL_HEALTH_CHECK_INTERVAL: int = 15  # NOOP перед выдачей после такого простоя (сек)
+    SMTP_POOL_ACQUIRE_TIMEOUT: float = 10.0  # Ожидание свободного соединения
+    SMTP_POOL_MAX_MESSAGES_PER_CONNECTION: int = 100  # Переподключаться после стольких писем
+    MAIL_OUTBOX_CONCURRENCY: int = 8  # Одновременных отправок из очереди
+    MAIL_OUTBOX_BATCH_SIZE: int = 50  # Писем, забираемых из очереди за раз
+    MAIL_OUTBOX_POLL_INTERVAL: float = 5.0  # Проверка очереди без новых писем (сек)
+    MAIL_OUTBOX_MAX_ATTEMPTS: int = 6  # Попыток отправки до статуса failed
+    MAIL_OUTBOX_RETRY_BASE_SECONDS: int = 30  # Первая пауза перед повтором, дальше удваивается
+    MAIL_OUTBOX_RETRY_MAX_SECONDS: int = 3600  # Максимальная пауза перед повтором
+    MAIL_OUTBOX_SENDING_LEASE_SECONDS: int = 600  # Письмо в статусе sending дольше - снова в очередь
     
     # Админ панель
     ADMIN_USERNAME: str = "admin"
@@ -71,6 +159,31 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: List[str] = ["image/jpeg", "image/png", "image/gif", "application/pdf"]
+    FILE_PAGE_SIZE: int = 50  # Размер страницы списка файлов по умолчанию
+    FILE_MAX_PAGE_SIZE: int = 200  # Максимальный размер страницы списка файлов
+    FILE_RECONCILE_ENABLED: bool = True  # Фоновая сверка stored_files с bucket
+    FILE_RECONCILE_INTERVAL_SECONDS: int = 21600  # Период сверки
+    FILE_RECONCILE_PAGE_SIZE: int = 1000  # Объектов bucket за один шаг сверки
+    FILE_RECONCILE_MARGIN_SECONDS: int = 300  # Запас сверх срока тикета прямой загрузки до добавления объекта
+    FILE_BATCH_MAX_SIZE: int = 5000  # Максимум ключей в пакетном удалении/stat
+    FILE_BATCH_STAT_CONCURRENCY: int = 32  # Параллельных HEAD запросов в пакетном stat
+    
+    # Уменьшенные копии аватаров
+    AVATAR_DERIVATIVES_ENABLED: bool = True
+    AVATAR_DERIVATIVE_SIZES: List[int] = [64, 128, 512]  # Стороны квадратных копий, px
+    AVATAR_DERIVATIVE_QUALITY: int = 82  # Качество WebP/JPEG
+    AVATAR_DERIVATIVE_PROCESS_WORKERS: int = 2  # Процессов для обработки изображений
+    AVATAR_DERIVATIVE_CONCURRENCY: int = 2  # Одновременно обрабатываемых аватаров
+    AVATAR_DERIVATIVE_MAX_QUEUE: int = 1000  # Максимум аватаров в очереди
+    
+    # Приглашения
+    INVITATION_BULK_MAX_ROWS: int = 10000  # Максимум строк в одном массовом запросе
+    INVITATION_BULK_BATCH_SIZE: int = 1000  # Строк на одну пачку проверки и вставки
+    INVITATION_PAGE_SIZE: int = 50  # Размер страницы списков приглашений по умолчанию
+    INVITATION_MAX_PAGE_SIZE: int = 200
+    INVITATION_SWEEP_ENABLED: bool = True  # Фоновая пометка просроченных приглашений
+    INVITATION_SWEEP_INTERVAL_SECONDS: int = 300
+    INVITATION_SWEEP_BATCH_SIZE: int = 500
     
     # Email настройки (опционально)
     SMTP_TLS: bool = True
@@ -2,13 +2,24 @@
 Конфигурация базы данных
 """
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import hashlib
+import time
+from typing import Dict, Optional
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.core.config import settings
+from app.core.db_pool import PoolMetrics, create_pooled_engine, get_pool_stats
+from app.services.redis_service import redis_service
+
+# Метрики пула основного движка
+pool_metrics = PoolMetrics()
 
 # Создание асинхронного движка базы данных
-engine = create_async_engine(
+engine = create_pooled_engine(
     settings.DATABASE_URL_ASYNC,
+    pool_metrics,
     echo=settings.DEBUG,
     future=True,
 )
@@ -20,21 +31,160 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False,
 )
 
+# Движок только для чтения (реплика). Без DATABASE_URL_REPLICA чтение идет в основную БД
+replica_pool_metrics = PoolMetrics()
+
+if settings.DATABASE_URL_REPLICA:
+    read_engine = create_pooled_engine(
+        settings.DATABASE_URL_REPLICA,
+        replica_pool_metrics,
+        echo=settings.DEBUG,
+        future=True,
+    )
+    ReadSessionLocal = async_sessionmaker(
+        read_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+else:
+    read_engine = engine
+    ReadSessionLocal = AsyncSessionLocal
+
+# Read-your-writes: после записи чтения клиента идут в основную БД.
+# Браузеры получают cookie, остальные клиенты - заголовок с тем же
+# значением (его можно отправлять обратно); кроме того, на время окна
+# за токеном клиента закрепляется основная БД на стороне сервера.
+READ_YOUR_WRITES_COOKIE = "bp_primary_until"
+READ_YOUR_WRITES_HEADER = "X-Primary-Until"
+READ_YOUR_WRITES_PIN_PREFIX = "primary_pin:"
+
+# Закрепления этого процесса: ключ клиента -> время окончания
+_primary_pins: Dict[str, float] = {}
+
 
 class Base(DeclarativeBase):
     """Базовый класс для всех моделей"""
     pass
 
 
-async def get_db() -> AsyncSession:
+def _client_pin_key(request: Request) -> Optional[str]:
+    """Ключ закрепления клиента - хеш его токена (без токена закрепления нет)"""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return READ_YOUR_WRITES_PIN_PREFIX + hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+
+def _mark_primary_reads(request: Request):
+    """Включить read-your-writes для запроса (cookie и закрепление - в apply_read_your_writes)"""
+    request.state.read_from_primary = True
+    request.state.primary_until = int(time.time()) + settings.REPLICA_READ_YOUR_WRITES_SECONDS
+
+
+def _not_expired(primary_until) -> bool:
+    try:
+        return float(primary_until) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+async def _should_read_from_primary(request: Request) -> bool:
+    """Нужно ли читать из основной БД вместо реплики"""
+    if read_engine is engine:
+        return True
+    if getattr(request.state, "read_from_primary", False):
+        return True
+    if _not_expired(request.cookies.get(READ_YOUR_WRITES_COOKIE)):
+        return True
+    if _not_expired(request.headers.get(READ_YOUR_WRITES_HEADER)):
+        return True
+    
+    key = _client_pin_key(request)
+    if key is None:
+        return False
+    if _not_expired(_primary_pins.get(key)):
+        return True
+    # Запись могла пройти через другой процесс
+    return _not_expired(await redis_service.get(key))
+
+
+async def apply_read_your_writes(request: Request, response: Response):
+    """
+    Передать клиенту окно read-your-writes после записи в запросе
+    
+    Вызывается middleware для любого ответа, в том числе возвращенного
+    обработчиком напрямую (заголовки dependency в него не попадают).
+    """
+    primary_until = getattr(request.state, "primary_until", None)
+    if primary_until is None:
+        return
+    
+    window = settings.REPLICA_READ_YOUR_WRITES_SECONDS
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        str(primary_until),
+        max_age=window,
+        httponly=True,
+        samesite="lax",
+    )
+    response.headers[READ_YOUR_WRITES_HEADER] = str(primary_until)
+    
+    key = _client_pin_key(request)
+    if key is not None:
+        now = time.time()
+        for pinned_key in [pinned for pinned, until in _primary_pins.items() if until <= now]:
+            del _primary_pins[pinned_key]
+        _primary_pins[key] = primary_until
+        await redis_service.set(key, primary_until, ttl=window)
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """HTTP middleware: окно read-your-writes для ответа на запрос с записью"""
+    response = await call_next(request)
+    await apply_read_your_writes(request, response)
+    return response
+
+
+async def get_db(request: Request) -> AsyncSession:
     """Dependency для получения сессии базы данных"""
     async with AsyncSessionLocal() as session:
+        if read_engine is not engine:
+            event.listen(
+                session.sync_session,
+                "after_commit",
+                lambda _session: _mark_primary_reads(request),
+            )
         try:
             yield session
         finally:
             await session.close()
 
 
+async def get_read_db(request: Request) -> AsyncSession:
+    """
+    Dependency для сессии только на чтение
+    
+    Запросы идут в реплику, кроме случаев, когда клиент недавно
+    записывал данные (read-your-writes: cookie, заголовок X-Primary-Until
+    или закрепление за токеном) - тогда используется основная БД.
+    """
+    session_factory = AsyncSessionLocal if await _should_read_from_primary(request) else ReadSessionLocal
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def get_db_pool_stats() -> dict:
+    """Метрики пулов соединений основной БД и реплики"""
+    return {
+        "primary": get_pool_stats(engine, pool_metrics),
+        "replica": get_pool_stats(read_engine, replica_pool_metrics) if read_engine is not engine else None,
+    }
+
+
 async def init_db():
     """Инициализация базы данных"""
     # Создание всех таблиц
@@ -0,0 +1,101 @@
+"""
+Пул соединений базы данных с метриками
+"""
+
+import time
+from typing import Dict, Optional
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.metrics import LatencyHistogram
+
+
+class PoolMetrics(LatencyHistogram):
+    """Гистограмма времени ожидания соединения из пула и счетчик таймаутов"""
+
+    def _reset_values(self):
+        """Обнулить гистограмму и счетчик таймаутов (под блокировкой)"""
+        super()._reset_values()
+        self._timeouts = 0
+
+    def observe_wait(self, seconds: float):
+        """Зафиксировать время ожидания соединения"""
+        self.observe(seconds)
+
+    def observe_timeout(self):
+        """Зафиксировать таймаут ожидания соединения"""
+        with self._lock:
+            self._timeouts += 1
+
+    def snapshot(self) -> Dict:
+        """Текущее состояние гистограммы и число таймаутов"""
+        snapshot = super().snapshot()
+        with self._lock:
+            snapshot["timeouts"] = self._timeouts
+        return snapshot
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool, измеряющий время получения соединения"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.observe_timeout()
+            raise
+        if self.metrics is not None:
+            self.metrics.observe_wait(time.perf_counter() - start)
+        return connection
+
+
+def create_pooled_engine(url: str, metrics: PoolMetrics, **kwargs) -> AsyncEngine:
+    """
+    Создать асинхронный движок с настроенным и инструментированным пулом
+
+    Args:
+        url: URL базы данных
+        metrics: Объект для сбора метрик пула
+        **kwargs: Дополнительные параметры create_async_engine
+
+    Returns:
+        AsyncEngine
+    """
+    pool_class = type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"metrics": metrics})
+
+    connect_args = kwargs.pop("connect_args", {})
+    if url.startswith("postgresql+asyncpg"):
+        connect_args.setdefault("statement_cache_size", settings.DB_STATEMENT_CACHE_SIZE)
+
+    return create_async_engine(
+        url,
+        poolclass=pool_class,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        connect_args=connect_args,
+        **kwargs,
+    )
+
+
+def get_pool_stats(engine: AsyncEngine, metrics: PoolMetrics) -> Dict:
+    """Живые показатели пула движка вместе с гистограммой ожидания"""
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "timeout_seconds": settings.DB_POOL_TIMEOUT,
+        "wait_time": metrics.snapshot(),
+    }
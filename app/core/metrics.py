@@ -0,0 +1,62 @@
+"""
+Простые метрики в памяти процесса (гистограммы задержек)
+"""
+
+import threading
+from typing import Dict, List
+
+
+# Границы корзин гистограммы по умолчанию (секунды)
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с количеством, суммой и максимумом"""
+
+    def __init__(self, buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Сбросить накопленные значения"""
+        with self._lock:
+            self._reset_values()
+
+    def _reset_values(self):
+        """Обнулить значения (вызывается под блокировкой)"""
+        self._bucket_counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, seconds: float):
+        """Зафиксировать одно значение"""
+        with self._lock:
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    index = i
+                    break
+            self._bucket_counts[index] += 1
+            self._count += 1
+            self._sum += seconds
+            self._max = max(self._max, seconds)
+
+    def snapshot(self) -> Dict:
+        """Текущее состояние гистограммы (кумулятивные корзины, как в Prometheus)"""
+        with self._lock:
+            histogram: List[Dict] = []
+            cumulative = 0
+            for bound, count in zip(self.buckets, self._bucket_counts):
+                cumulative += count
+                histogram.append({"le": bound, "count": cumulative})
+            histogram.append({"le": "+Inf", "count": self._count})
+
+            return {
+                "count": self._count,
+                "sum_seconds": round(self._sum, 6),
+                "avg_seconds": round(self._sum / self._count, 6) if self._count else 0.0,
+                "max_seconds": round(self._max, 6),
+                "histogram": histogram,
+            }
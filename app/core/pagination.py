@@ -0,0 +1,64 @@
+"""
+Keyset (cursor) пагинация
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Упаковать значения ключа сортировки в непрозрачный токен"""
+    payload = json.dumps(values, default=lambda value: value.isoformat(), separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Распаковать токен курсора"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, dict):
+            raise ValueError("cursor must be an object")
+        return values
+    except (ValueError, UnicodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def encode_datetime_id_cursor(created_at: datetime, row_id: int) -> str:
+    """Курсор для сортировки (created_at DESC, id DESC)"""
+    return encode_cursor({"c": created_at, "i": row_id})
+
+
+def decode_datetime_id_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """Распаковать курсор (created_at, id)"""
+    if not cursor:
+        return None
+    values = decode_cursor(cursor)
+    try:
+        return datetime.fromisoformat(values["c"]), int(values["i"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def keyset_before(created_at_column, id_column, position: Tuple[datetime, int]):
+    """Условие "строго после позиции" для сортировки (created_at DESC, id DESC)"""
+    created_at, row_id = position
+    return or_(
+        created_at_column < created_at,
+        and_(created_at_column == created_at, id_column < row_id)
+    )
@@ -20,11 +20,23 @@ import os
 from pathlib import Path
 
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import init_db, read_your_writes_middleware
 from app.api.v1.api import api_router
 from app.admin.admin import setup_admin
 from app.services.redis_service import redis_service
 from app.services.minio_service import minio_service
+from app.services.storage_service import storage_service
+from app.services.password_hasher import password_hasher
+from app.services.principal_cache import principal_cache
+from app.services.invitation_sweeper import invitation_sweeper
+from app.services.file_reconciler import file_reconciler
+from app.services.image_derivatives import avatar_derivatives
+from app.services.imap_pool import imap_pool
+from app.services.mail_sync import mailbox_sync
+from app.services.async_email_service import mail_executor
+from app.services.smtp_pool import smtp_pool
+from app.services.mail_outbox import mail_outbox
+from app.services.mail_idle import mail_idle
 
 
 @asynccontextmanager
@@ -42,11 +54,28 @@ async def lifespan(app: FastAPI):
     # Initialize Redis
     print("🔴 Initializing Redis (Cache & Sessions)...")
     await redis_service.connect()
+    principal_cache.start()
     
     # Initialize MinIO
     print("📦 Initializing MinIO (S3-compatible file storage)...")
     minio_service.connect()
     
+    # Background jobs
+    if settings.INVITATION_SWEEP_ENABLED:
+        print("🧹 Starting invitation expiration sweeper...")
+        invitation_sweeper.start()
+    if settings.FILE_RECONCILE_ENABLED:
+        print("🗂️ Starting stored files reconciler...")
+        file_reconciler.start()
+    if settings.AVATAR_DERIVATIVES_ENABLED:
+        print("🖼️ Starting avatar derivative pipeline...")
+        avatar_derivatives.start()
+    imap_pool.start()
+    smtp_pool.start()
+    mail_outbox.start()
+    if settings.IMAP_IDLE_ENABLED:
+        mail_idle.start()
+    
     # await setup_admin(app)  # Temporarily disabled due to relationship issues
     # print("✅ Admin panel configured")
     
@@ -61,7 +90,19 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🛑 Shutting down Business Platform FastAPI Backend...")
+    await invitation_sweeper.stop()
+    await file_reconciler.stop()
+    await avatar_derivatives.stop()
+    await mail_outbox.stop()
+    await mail_idle.stop()
+    await mailbox_sync.stop()
+    await imap_pool.stop()
+    await smtp_pool.stop()
+    await principal_cache.stop()
     await redis_service.disconnect()
+    password_hasher.shutdown()
+    storage_service.shutdown()
+    mail_executor.shutdown()
     print("✅ Services disconnected")
 
 
@@ -104,6 +145,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Primary-Until"],  # Курсор keyset-пагинации, окно read-your-writes
 )
 
 # Trusted hosts - using wildcard to allow all hosts in development
@@ -112,6 +154,17 @@ app.add_middleware(
     allowed_hosts=["*"],  # Allow all hosts in development
 )
 
+# Read-your-writes для реплики: cookie, заголовок и закрепление после записи
+app.middleware("http")(read_your_writes_middleware)
+
+
+@app.middleware("http")
+async def principal_invalidation_middleware(request: Request, call_next):
+    """Сброс кэша пользователя (Redis и другие воркеры) завершается до ответа"""
+    response = await call_next(request)
+    await principal_cache.wait_pending()
+    return response
+
 # Статические файлы для админ панели
 static_path = Path(__file__).parent / "static"
 static_path.mkdir(exist_ok=True)
@@ -440,3 +440,9 @@ class Lesson(Base):
 
 # Импорт модели приглашений
 from app.models.invitation import CompanyInvitation, InvitationStatus
+
+# Импорт моделей файлов
+from app.models.file import FileBlob, StoredFile
+
+# Импорт моделей почтового индекса
+from app.models.mail import MailFolderState, MailMessage, OutboundEmail, OutboundEmailStatus
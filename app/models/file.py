@@ -0,0 +1,66 @@
+"""
+Модели файлов в объектном хранилище
+"""
+
+from sqlalchemy import Column, Integer, String, BigInteger, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class FileBlob(Base):
+    """
+    Объект, сохраненный по содержимому (sha256/<prefix>/<hash>)
+    
+    ref_count - число загрузок, ссылающихся на объект. Объект удаляется
+    из MinIO, только когда уходит последняя ссылка.
+    """
+    __tablename__ = "file_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    object_name = Column(String(255), nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String(255))
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class StoredFile(Base):
+    """
+    Метаданные файла в MinIO
+    
+    Пишутся при загрузке и удалении через API и сверяются с bucket
+    фоновой задачей. Листинг файлов читает эту таблицу, а не bucket.
+    """
+    __tablename__ = "stored_files"
+    __table_args__ = (
+        # Листинги по владельцу, компании и папке: ORDER BY created_at DESC, id DESC
+        Index("ix_stored_files_owner_created_id", "owner_id", "created_at", "id"),
+        Index("ix_stored_files_company_created_id", "company_id", "created_at", "id"),
+        Index("ix_stored_files_folder_created_id", "folder", "created_at", "id"),
+        # Фильтр по префиксу пути: object_name LIKE 'prefix%'
+        Index(
+            "ix_stored_files_object_name_prefix",
+            "object_name",
+            postgresql_ops={"object_name": "varchar_pattern_ops"},
+        ),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    object_name = Column(String(500), nullable=False)
+    folder = Column(String(100), nullable=False, default="")
+    file_name = Column(String(255))
+    size = Column(BigInteger, nullable=False, default=0)
+    content_type = Column(String(255))
+    sha256 = Column(String(64))
+    etag = Column(String(255))
+    derivatives = Column(JSON)  # Размеры готовых уменьшенных копий (для изображений)
+    
+    # Внешние ключи (пустые у файлов, найденных сверкой с bucket)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="SET NULL"))
+    
+    # Время последней сверки, на которой объект был найден в bucket
+    last_seen_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
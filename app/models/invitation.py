@@ -2,7 +2,7 @@
 Модель приглашений в компанию
 """
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, text, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
@@ -20,6 +20,22 @@ class InvitationStatus(PyEnum):
 class CompanyInvitation(Base):
     """Модель приглашения пользователя в компанию"""
     __tablename__ = "company_invitations"
+    __table_args__ = (
+        # Не более одного активного приглашения на email в компании
+        Index(
+            "uq_company_invitations_pending_email_company",
+            "email",
+            "company_id",
+            unique=True,
+            postgresql_where=text("status = 'PENDING'"),
+            sqlite_where=text("status = 'PENDING'"),
+        ),
+        # Поиск просроченных приглашений фоновой задачей
+        Index("ix_company_invitations_status_expires_at", "status", "expires_at"),
+        # Keyset-пагинация списков приглашений
+        Index("ix_company_invitations_company_created_id", "company_id", "created_at", "id"),
+        Index("ix_company_invitations_email_status_created_id", "email", "status", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), nullable=False, index=True)
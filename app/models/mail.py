@@ -0,0 +1,124 @@
+"""
+Локальный индекс почтовых ящиков (синхронизация с IMAP) и очередь исходящих писем
+"""
+
+from sqlalchemy import Column, Integer, String, Text, Boolean, BigInteger, DateTime, ForeignKey, Index, UniqueConstraint, JSON, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
+from sqlalchemy.sql import func
+from enum import Enum as PyEnum
+from app.core.database import Base
+
+
+class MailFolderState(Base):
+    """
+    Состояние синхронизации папки
+    
+    uidvalidity - при смене значения сервером индекс папки строится заново;
+    highest_uid - наибольший UID в индексе, более новые письма загружаются
+    по возрастанию UID;
+    backfill_uid - письма с меньшими UID еще догружаются (первая
+    синхронизация начинается с самых новых писем), NULL - все в индексе;
+    highest_modseq - HIGHESTMODSEQ (CONDSTORE) на момент последней синхронизации.
+    """
+    __tablename__ = "mail_folder_states"
+    __table_args__ = (
+        UniqueConstraint("user_id", "folder", name="uq_mail_folder_states_user_folder"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    folder = Column(String(255), nullable=False)
+    uidvalidity = Column(BigInteger, nullable=False)
+    highest_uid = Column(BigInteger, nullable=False, default=0)
+    highest_modseq = Column(BigInteger)
+    backfill_uid = Column(BigInteger)
+    message_count = Column(Integer, nullable=False, default=0)
+    last_synced_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+# Документ полнотекстового поиска (PostgreSQL): тема важнее отправителя,
+# отправитель важнее получателей и текста
+MAIL_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(from_addr, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(to_addr, '')), 'C') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(body_text, '')), 'D')"
+)
+
+
+class MailMessage(Base):
+    """Заголовки, флаги и начало текста письма в локальном индексе"""
+    __tablename__ = "mail_messages"
+    __table_args__ = (
+        # Листинг папки: ORDER BY uid DESC
+        UniqueConstraint("user_id", "folder", "uid", name="uq_mail_messages_user_folder_uid"),
+        # Поиск по всем папкам пользователя с фильтром по дате
+        Index("ix_mail_messages_user_sent_at", "user_id", "sent_at"),
+        # Полнотекстовый поиск (только PostgreSQL)
+        Index("ix_mail_messages_search", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    folder = Column(String(255), nullable=False)
+    uid = Column(BigInteger, nullable=False)
+    subject = Column(Text)
+    from_addr = Column(Text)
+    to_addr = Column(Text)
+    date = Column(String(100))  # Дата из ENVELOPE (RFC 2822)
+    sent_at = Column(DateTime(timezone=True))
+    preview = Column(Text)
+    # Только для поиска - не загружаются вместе со строкой списка писем
+    body_text = deferred(Column(Text))  # Начало текста письма (MAIL_SEARCH_BODY_BYTES)
+    search_vector = deferred(Column(Text().with_variant(TSVECTOR(), "postgresql")))  # MAIL_SEARCH_DOCUMENT
+    has_attachments = Column(Boolean, default=False)
+    is_read = Column(Boolean, default=False)
+    flags = Column(JSON)  # Список флагов IMAP
+    size = Column(Integer)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class OutboundEmailStatus(PyEnum):
+    """Статусы исходящего письма"""
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboundEmail(Base):
+    """
+    Письмо в очереди отправки
+    
+    next_attempt_at - когда письмо можно забрать из очереди: для QUEUED это
+    время следующей попытки, для SENDING - окончание аренды воркером (после
+    него письмо снова доступно, если процесс упал во время отправки).
+    """
+    __tablename__ = "outbound_emails"
+    __table_args__ = (
+        # Выборка готовых к отправке писем
+        Index("ix_outbound_emails_status_next_attempt", "status", "next_attempt_at"),
+        # Список отправленных пользователем писем
+        Index("ix_outbound_emails_user_created", "user_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    from_addr = Column(String(255), nullable=False)
+    to_addr = Column(Text, nullable=False)
+    cc = Column(Text)
+    bcc = Column(Text)
+    subject = Column(Text, nullable=False)
+    body = Column(Text, nullable=False)
+    is_html = Column(Boolean, default=False)
+    status = Column(SQLEnum(OutboundEmailStatus), nullable=False, default=OutboundEmailStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False)
+    last_error = Column(Text)
+    sent_at = Column(DateTime(timezone=True))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
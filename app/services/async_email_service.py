@@ -0,0 +1,266 @@
+"""
+Асинхронный фасад над EmailService
+
+imaplib/smtplib блокируют поток на все время сетевого обмена, поэтому
+операции с почтовым сервером выполняются в отдельном ограниченном пуле
+потоков, а обработчики API ждут их с таймаутом. Медленный почтовый
+сервер занимает только потоки этого пула, а не event loop.
+
+Ограничение: одновременно выполняется не больше MAIL_MAX_WORKERS
+операций на процесс. Все ящики обслуживает один сервер Mailcow, и если
+он отвечает медленно, его операции занимают весь пул - операции
+остальных ящиков ждут в очереди и снимаются по таймауту.
+
+По таймауту операция, еще не начатая в пуле, снимается, а у начатой
+закрывается сокет соединения (см. mail_call): поток сразу получает
+ошибку, соединение не возвращается в пул, повтор не выполняется.
+Затем MailExecutor ждет поток до MAIL_ABORT_GRACE_SECONDS: если
+операция успела завершиться, возвращается ее результат, а не таймаут.
+Отключение клиента операцию не прерывает - она завершится в пуле.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import LatencyHistogram
+from app.services.email_service import EmailService
+from app.services.mail_call import MailCall
+
+
+class MailTimeoutError(Exception):
+    """
+    Почтовый сервер не ответил за MAIL_OPERATION_TIMEOUT; операция прервана
+
+    started - операция успела начаться в пуле; если ее поток завершился
+    после прерывания, его ошибка доступна в __cause__.
+    """
+
+    def __init__(self, message: str, started: bool = True):
+        super().__init__(message)
+        self.started = started
+
+
+class MailOperationMetrics:
+    """Метрики одной почтовой операции"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.timeouts = 0
+        self.completed_after_timeout = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "completed_after_timeout": self.completed_after_timeout,
+            **self.latency.snapshot(),
+        }
+
+
+class MailExecutor:
+    """Пул потоков для блокирующих операций IMAP/SMTP"""
+
+    def __init__(self, max_workers: int, timeout: float, abort_grace: float):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.abort_grace = abort_grace
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._metrics: Dict[str, MailOperationMetrics] = {}
+        self._in_flight = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="mail",
+            )
+        return self._executor
+
+    async def run(
+        self,
+        operation: str,
+        func,
+        *args,
+        timeout: Optional[float] = None,
+        call: Optional[MailCall] = None
+    ):
+        """
+        Выполнить синхронный вызов в пуле потоков почты
+
+        Args:
+            operation: Имя операции для метрик
+            func: Синхронная функция
+            timeout: Таймаут ожидания (по умолчанию MAIL_OPERATION_TIMEOUT)
+            call: Операция, которой принадлежит вызов (несколько вызовов
+                на одном соединении, например чтение вложения блоками)
+        """
+        metrics = self._metrics.setdefault(operation, MailOperationMetrics())
+        call = call or MailCall()
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        self._in_flight += 1
+        try:
+            call.future = self._get_executor().submit(call.run, func, *args)
+            done = asyncio.wrap_future(call.future)
+            # Результат забирается и тогда, когда ожидающий обработчик отменен
+            done.add_done_callback(lambda future: future.cancelled() or future.exception())
+            try:
+                return await asyncio.wait_for(asyncio.shield(done), timeout=timeout)
+            except asyncio.TimeoutError:
+                if not await self.abort(call):
+                    metrics.timeouts += 1
+                    future = call.future
+                    started = not future.cancelled()
+                    raise MailTimeoutError(
+                        f"Mail server did not respond within {timeout}s ({operation}); the operation was aborted",
+                        started=started,
+                    ) from (future.exception() if started and future.done() else None)
+                metrics.completed_after_timeout += 1
+                return call.future.result()
+        except MailTimeoutError:
+            raise
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            metrics.latency.observe(time.perf_counter() - start)
+
+    async def abort(self, call: MailCall) -> bool:
+        """
+        Прервать операцию: не начатая снимается с очереди пула, у начатой
+        закрываются сокеты. Поток ждется не дольше abort_grace.
+
+        Returns:
+            True - операция все же завершилась успешно
+        """
+        future = call.future
+        if future is None or future.cancel():
+            return False
+        call.abort()
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=self.abort_grace)
+        except Exception:
+            return False
+        return True
+
+    def stats(self) -> Dict:
+        """Метрики пула потоков и задержек операций"""
+        return {
+            "max_workers": self.max_workers,
+            "timeout_seconds": self.timeout,
+            "abort_grace_seconds": self.abort_grace,
+            "in_flight": self._in_flight,
+            "operations": {
+                operation: metrics.snapshot()
+                for operation, metrics in self._metrics.items()
+            },
+        }
+
+    def shutdown(self):
+        """Остановить пул потоков"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class AsyncEmailService:
+    """Асинхронный интерфейс EmailService для обработчиков API"""
+
+    def __init__(self, email_address: str, password: str, executor: Optional[MailExecutor] = None):
+        self.service = EmailService(email_address, password)
+        self.executor = executor or mail_executor
+
+    async def get_folders(self) -> List[Dict[str, str]]:
+        """Получение списка папок"""
+        return await self.executor.run("get_folders", self.service.get_folders)
+
+    async def get_emails(self, folder: str = "INBOX", limit: int = 50, offset: int = 0) -> List[Dict]:
+        """Получение списка писем из папки (напрямую с сервера)"""
+        return await self.executor.run("get_emails", self.service.get_emails, folder, limit, offset)
+
+    async def get_email_by_id(self, email_id: str, folder: str = "INBOX") -> Optional[Dict]:
+        """Получение полного содержимого письма по UID"""
+        return await self.executor.run("get_email_by_id", self.service.get_email_by_id, email_id, folder)
+
+    async def get_part(self, email_id: str, section: str, folder: str = "INBOX") -> Optional[Dict]:
+        """Описание MIME части письма (для скачивания вложения)"""
+        return await self.executor.run("get_part", self.service.get_part, email_id, section, folder)
+
+    async def iter_part(self, email_id: str, part: Dict, folder: str = "INBOX") -> AsyncIterator[bytes]:
+        """
+        Читать декодированную MIME часть блоками в пуле потоков почты
+
+        Все блоки читаются через одно IMAP соединение одной операцией
+        (MailCall). Генератор нельзя закрыть, пока в потоке идет next():
+        при обрыве клиентом чтение сначала прерывается закрытием сокета,
+        и соединение не возвращается в пул.
+        """
+        chunks = self.service.iter_part(email_id, part, folder)
+        call = MailCall()
+        try:
+            while True:
+                chunk = await self.executor.run("iter_part", next, chunks, None, call=call)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            if call.future is not None and not call.future.done():
+                await self.executor.abort(call)
+            if call.future is None or call.future.done():
+                # Отдельная операция: прерванная call не выполняет новых вызовов
+                await self.executor.run("iter_part_close", chunks.close)
+
+    async def send_email(
+        self,
+        to: str,
+        subject: str,
+        body: str,
+        cc: Optional[str] = None,
+        bcc: Optional[str] = None,
+        is_html: bool = False
+    ) -> bool:
+        """Отправка письма через SMTP"""
+        return await self.executor.run(
+            "send_email", self.service.send_email, to, subject, body, cc, bcc, is_html
+        )
+
+    async def delete_email(self, email_id: str, folder: str = "INBOX") -> bool:
+        """Удаление письма"""
+        return await self.executor.run("delete_email", self.service.delete_email, email_id, folder)
+
+    async def mark_as_read(self, email_id: str, folder: str = "INBOX") -> bool:
+        """Пометка письма как прочитанного"""
+        return await self.executor.run("mark_as_read", self.service.mark_as_read, email_id, folder)
+
+    async def sync_folder_changes(
+        self,
+        folder: str,
+        uidvalidity: Optional[int],
+        highest_uid: int,
+        highest_modseq: Optional[int],
+        known_count: int,
+        batch_size: int,
+        backfill_uid: Optional[int] = None,
+        check_existing: bool = True
+    ) -> Dict:
+        """Одна пачка изменений папки относительно локального индекса (см. EmailService.sync_folder_changes)"""
+        # Пачка писем с текстом для поиска может загружаться дольше обычной операции
+        return await self.executor.run(
+            "sync_folder_changes",
+            self.service.sync_folder_changes,
+            folder, uidvalidity, highest_uid, highest_modseq, known_count, batch_size, backfill_uid, check_existing,
+            timeout=self.executor.timeout * 10,
+        )
+
+
+# Глобальный пул потоков почты
+mail_executor = MailExecutor(
+    max_workers=settings.MAIL_MAX_WORKERS,
+    timeout=settings.MAIL_OPERATION_TIMEOUT,
+    abort_grace=settings.MAIL_ABORT_GRACE_SECONDS,
+)
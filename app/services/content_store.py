@@ -0,0 +1,200 @@
+"""
+Хранение файлов по содержимому (content-addressed storage)
+
+Объект сохраняется под ключом sha256/<prefix>/<hash>, поэтому одинаковые
+файлы хранятся в MinIO один раз. Число ссылок на объект ведется в
+таблице file_blobs; объект удаляется вместе с последней ссылкой.
+"""
+
+import hashlib
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import FileBlob
+from app.services.minio_service import FileTooLargeError
+from app.services.storage_service import AsyncStorageService, storage_service
+
+
+BLOB_PREFIX = "sha256/"
+
+
+def _hash_stream(stream: BinaryIO, max_size: Optional[int], chunk_size: int) -> Tuple[str, int]:
+    """Посчитать sha256 и размер потока, затем вернуть его в начало"""
+    digest = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise FileTooLargeError(f"File exceeds maximum size of {max_size} bytes")
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest(), size
+
+
+def _blob_upsert(dialect_name: str):
+    """INSERT новой ссылки на объект или увеличение ref_count существующей"""
+    if dialect_name == "postgresql":
+        statement = postgresql.insert(FileBlob)
+    elif dialect_name == "sqlite":
+        statement = sqlite.insert(FileBlob)
+    else:
+        return None
+    return statement.on_conflict_do_update(
+        index_elements=["sha256"],
+        set_={"ref_count": FileBlob.ref_count + 1}
+    ).returning(FileBlob.ref_count)
+
+
+class ContentAddressedStore:
+    """Дедуплицирующее хранилище поверх AsyncStorageService"""
+
+    def __init__(self, storage: AsyncStorageService):
+        self.storage = storage
+        self.deduplicated = 0
+        self.stored = 0
+
+    @staticmethod
+    def blob_object_name(sha256: str) -> str:
+        """Ключ объекта для хеша содержимого"""
+        return f"{BLOB_PREFIX}{sha256[:2]}/{sha256}"
+
+    @staticmethod
+    def is_blob(object_name: str) -> bool:
+        """Лежит ли объект в content-addressed пространстве"""
+        return object_name.startswith(BLOB_PREFIX)
+
+    async def _add_reference(self, db: AsyncSession, sha256: str, size: int, content_type: str) -> int:
+        """Добавить ссылку на объект, вернуть новое значение ref_count"""
+        values = {
+            "sha256": sha256,
+            "object_name": self.blob_object_name(sha256),
+            "size": size,
+            "content_type": content_type,
+            "ref_count": 1,
+        }
+        statement = _blob_upsert(db.bind.dialect.name)
+        if statement is not None:
+            ref_count = (await db.execute(statement, values)).scalar_one()
+        else:
+            result = await db.execute(
+                update(FileBlob)
+                .where(FileBlob.sha256 == sha256)
+                .values(ref_count=FileBlob.ref_count + 1)
+                .returning(FileBlob.ref_count)
+            )
+            ref_count = result.scalar_one_or_none()
+            if ref_count is None:
+                await db.execute(insert(FileBlob).values(**values))
+                ref_count = 1
+        await db.commit()
+        return ref_count
+
+    async def store(
+        self,
+        db: AsyncSession,
+        stream: BinaryIO,
+        file_name: str,
+        content_type: str,
+        max_size: Optional[int] = None
+    ) -> Optional[Dict]:
+        """
+        Сохранить файл по содержимому
+
+        Ссылка регистрируется до загрузки: пока она есть, параллельное
+        удаление не уберет объект. Если ссылка не первая, достаточно
+        одного HEAD запроса, чтобы убедиться, что объект уже загружен.
+
+        Returns:
+            {"object_name", "sha256", "size", "deduplicated"} или None при ошибке
+        """
+        sha256, size = await self.storage.run(
+            "hash_stream", _hash_stream, stream, max_size, settings.MINIO_STREAM_CHUNK_SIZE
+        )
+        object_name = self.blob_object_name(sha256)
+
+        ref_count = await self._add_reference(db, sha256, size, content_type)
+        if ref_count > 1 and await self.storage.file_exists(object_name):
+            self.deduplicated += 1
+            return {"object_name": object_name, "sha256": sha256, "size": size, "deduplicated": True}
+
+        try:
+            uploaded = await self.storage.upload_stream(
+                stream, file_name, content_type, max_size=max_size, object_name=object_name
+            )
+        except Exception:
+            await self.release_reference(db, sha256)
+            raise
+        if not uploaded:
+            await self.release_reference(db, sha256)
+            return None
+
+        self.stored += 1
+        return {"object_name": object_name, "sha256": sha256, "size": size, "deduplicated": False}
+
+    async def release_reference(self, db: AsyncSession, sha256: str):
+        """Убрать ссылку, не трогая объект (откат неудачной загрузки)"""
+        await db.execute(
+            update(FileBlob)
+            .where(FileBlob.sha256 == sha256)
+            .values(ref_count=FileBlob.ref_count - 1)
+        )
+        await db.execute(delete(FileBlob).where(FileBlob.sha256 == sha256, FileBlob.ref_count <= 0))
+        await db.commit()
+
+    async def release(self, db: AsyncSession, object_name: str) -> Optional[bool]:
+        """
+        Удалить одну ссылку на объект
+
+        Объект удаляется из MinIO вместе с последней ссылкой. Строка
+        file_blobs остается заблокированной до удаления объекта, поэтому
+        параллельная загрузка того же содержимого дождется его и загрузит
+        объект заново.
+
+        Returns:
+            True - объект удален, False - остались другие ссылки,
+            None - объект не учтен в file_blobs
+        """
+        sha256 = object_name.rsplit("/", 1)[-1]
+        result = await db.execute(
+            update(FileBlob)
+            .where(FileBlob.sha256 == sha256)
+            .values(ref_count=FileBlob.ref_count - 1)
+            .returning(FileBlob.ref_count)
+        )
+        ref_count = result.scalar_one_or_none()
+        if ref_count is None:
+            await db.rollback()
+            return None
+        if ref_count > 0:
+            await db.commit()
+            return False
+
+        await db.execute(delete(FileBlob).where(FileBlob.sha256 == sha256))
+        try:
+            if not await self.storage.delete_file(object_name):
+                raise RuntimeError(f"Failed to delete blob {object_name}")
+        except Exception:
+            await db.rollback()
+            raise
+        await db.commit()
+        return True
+
+    def stats(self) -> Dict:
+        """Счетчики загрузок"""
+        return {
+            "enabled": settings.MINIO_CONTENT_ADDRESSED,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+        }
+
+
+# Глобальный экземпляр сервиса
+content_store = ContentAddressedStore(storage_service)
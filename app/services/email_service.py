@@ -2,17 +2,234 @@
 Email service для работы с IMAP/SMTP
 """
 
+import binascii
+import html
 import imaplib
+import quopri
 import smtplib
 import email
+import email.message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import decode_header
-from typing import List, Dict, Optional
+from email.utils import format_datetime
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, TypeVar
 from datetime import datetime
-import os
 import re
 
+from imapclient.response_parser import parse_fetch_response
+
+from app.core.config import settings
+from app.services.imap_pool import CONNECTION_ERRORS, imap_pool, is_connection_dropped
+from app.services.mail_call import current_mail_call
+from app.services.smtp_pool import SmtpPoolExhaustedError, is_connection_error, smtp_pool
+
+
+T = TypeVar("T")
+
+class MailDeliveryUnknownError(Exception):
+    """Письмо передано SMTP серверу, но ответа нет: оно могло быть принято"""
+    pass
+
+
+def _is_timeout(error: BaseException) -> bool:
+    """Есть ли таймаут сокета в цепочке исключений"""
+    cause: Optional[BaseException] = error
+    while cause is not None:
+        if isinstance(cause, TimeoutError):
+            return True
+        cause = cause.__cause__ or cause.__context__
+    return False
+
+
+# Пароли почтовых ящиков пользователей для IMAP/SMTP (в памяти процесса;
+# в продакшене использовать Redis или БД)
+mailbox_passwords: Dict[str, str] = {}
+
+
+def _uid_set(uids: List[int]) -> str:
+    """Компактный набор UID для команды: 1:5,7,9:10"""
+    ranges = []
+    for uid in sorted(uids):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+_STATUS_ITEM_RE = re.compile(rb"(MESSAGES|UIDNEXT|UIDVALIDITY|HIGHESTMODSEQ) (\d+)")
+
+# Номер MIME части для BODY[...]: 1, 2.1, 2.1.3
+SECTION_RE = re.compile(r"^\d+(\.\d+)*$")
+
+
+def _bytes_to_str(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="ignore")
+    return str(value)
+
+
+_HTML_HIDDEN_RE = re.compile(r"<(script|style|head)\b.*?(</\1\s*>|$)", re.IGNORECASE | re.DOTALL)
+_HTML_TAG_RE = re.compile(r"<[^>]*>?")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _html_to_text(value: str) -> str:
+    """Видимый текст HTML (в том числе обрезанного): без тегов, стилей и скриптов"""
+    value = _HTML_HIDDEN_RE.sub(" ", value)
+    return html.unescape(_HTML_TAG_RE.sub(" ", value))
+
+
+def _compact_text(value: str) -> str:
+    """Текст одной строкой: пробельные символы схлопываются"""
+    return _WHITESPACE_RE.sub(" ", value).strip()
+
+
+def _structure_params(params) -> Dict[str, str]:
+    """Параметры части из BODYSTRUCTURE: ("CHARSET" "utf-8" ...) -> dict"""
+    if not params:
+        return {}
+    values = [_bytes_to_str(value) for value in params]
+    return {values[i].lower(): values[i + 1] for i in range(0, len(values) - 1, 2)}
+
+
+def _structure_disposition(structure) -> Tuple[Optional[str], Dict[str, str]]:
+    """Content-Disposition листовой части из BODYSTRUCTURE: (тип, параметры)"""
+    # Положение disposition зависит от типа части - ищем по форме (тип, параметры)
+    for field in list(structure)[7:]:
+        if (
+            isinstance(field, tuple)
+            and len(field) == 2
+            and isinstance(field[0], bytes)
+            and (field[1] is None or isinstance(field[1], tuple))
+        ):
+            return field[0].decode().lower(), _structure_params(field[1])
+    return None, {}
+
+
+def _structure_has_attachments(structure) -> bool:
+    """Есть ли в BODYSTRUCTURE часть с Content-Disposition: attachment"""
+    if structure is None:
+        return False
+    if structure.is_multipart:
+        return any(_structure_has_attachments(part) for part in structure[0])
+    return _structure_disposition(structure)[0] == "attachment"
+
+
+def _quote_param(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _structure_part(structure, section: str) -> Dict:
+    """Описание листовой части: секция IMAP, тип, кодировка, размер, имя файла"""
+    main_type = _bytes_to_str(structure[0]).lower()
+    subtype = _bytes_to_str(structure[1]).lower()
+    params = _structure_params(structure[2])
+    disposition, disposition_params = _structure_disposition(structure)
+    encoding = (_bytes_to_str(structure[5]) or "7bit").lower()
+    size = structure[6] or 0
+    
+    # Имя файла (RFC 2231, продолжения, name из Content-Type) разбирает email
+    headers = email.message.Message()
+    headers["Content-Type"] = f"{main_type}/{subtype}" + "".join(
+        f'; {key}="{_quote_param(value)}"' for key, value in params.items()
+    )
+    if disposition:
+        headers["Content-Disposition"] = disposition + "".join(
+            f'; {key}="{_quote_param(value)}"' for key, value in disposition_params.items()
+        )
+    filename = headers.get_filename()
+    
+    return {
+        "section": section,
+        "content_type": f"{main_type}/{subtype}",
+        "charset": params.get("charset"),
+        "encoding": encoding,
+        "encoded_size": size,
+        # BODYSTRUCTURE содержит размер в закодированном виде
+        "size": size * 57 // 78 if encoding == "base64" else size,
+        "disposition": disposition,
+        "filename": filename,
+    }
+
+
+def _structure_parts(structure, prefix: str = "") -> List[Dict]:
+    """Листовые части письма из BODYSTRUCTURE с номерами секций для BODY[...]"""
+    if structure.is_multipart:
+        parts = []
+        for index, part in enumerate(structure[0], 1):
+            parts.extend(_structure_parts(part, f"{prefix}.{index}" if prefix else str(index)))
+        return parts
+    return [_structure_part(structure, prefix or "1")]
+
+
+def _is_attachment(part: Dict) -> bool:
+    """Часть - вложение, а не тело письма"""
+    if part["disposition"] == "attachment":
+        return True
+    return bool(part["filename"]) and part["disposition"] != "inline"
+
+
+class _TransferDecoder:
+    """Инкрементальное декодирование Content-Transfer-Encoding по блокам"""
+    
+    def __init__(self, encoding: str):
+        self.encoding = encoding.lower()
+        self._pending = b""
+    
+    def feed(self, data: bytes) -> bytes:
+        if self.encoding == "base64":
+            # Декодируются только полные группы по 4 символа
+            data = self._pending + data.translate(None, b" \t\r\n")
+            cut = len(data) - len(data) % 4
+            self._pending = data[cut:]
+            return binascii.a2b_base64(data[:cut]) if cut else b""
+        if self.encoding == "quoted-printable":
+            # Мягкий перенос или =XX могут оказаться на границе блока
+            data = self._pending + data
+            cut = data.rfind(b"\n") + 1
+            self._pending = data[cut:]
+            return quopri.decodestring(data[:cut]) if cut else b""
+        return data
+    
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b""
+        if not pending:
+            return b""
+        if self.encoding == "base64":
+            try:
+                return binascii.a2b_base64(pending + b"=" * (-len(pending) % 4))
+            except binascii.Error:
+                return b""
+        if self.encoding == "quoted-printable":
+            return quopri.decodestring(pending)
+        return pending
+    
+    @classmethod
+    def decode(cls, encoding: str, data: bytes) -> bytes:
+        decoder = cls(encoding)
+        return decoder.feed(data) + decoder.flush()
+
+
+def _structure_headers(structure) -> bytes:
+    """Заголовки MIME верхнего уровня письма, восстановленные по BODYSTRUCTURE"""
+    if structure.is_multipart:
+        params = _structure_params(structure[2] if len(structure) > 2 else None)
+        subtype = _bytes_to_str(structure[1]).lower()
+        boundary = params.get("boundary", "")
+        return f'Content-Type: multipart/{subtype}; boundary="{boundary}"\r\n\r\n'.encode()
+    main_type = _bytes_to_str(structure[0]).lower()
+    subtype = _bytes_to_str(structure[1]).lower()
+    charset = _structure_params(structure[2]).get("charset", "utf-8")
+    encoding = _bytes_to_str(structure[5]) or "7bit"
+    return (
+        f'Content-Type: {main_type}/{subtype}; charset="{charset}"\r\n'
+        f"Content-Transfer-Encoding: {encoding}\r\n\r\n"
+    ).encode()
+
 
 class EmailService:
     """Сервис для работы с почтой через IMAP/SMTP"""
@@ -20,10 +237,10 @@ class EmailService:
     def __init__(self, email_address: str, password: str):
         self.email_address = email_address
         self.password = password
-        self.imap_server = os.getenv("MAILCOW_IMAP_SERVER", "mail.anyatis.com")
-        self.smtp_server = os.getenv("MAILCOW_SMTP_SERVER", "mail.anyatis.com")
-        self.imap_port = int(os.getenv("MAILCOW_IMAP_PORT", "993"))
-        self.smtp_port = int(os.getenv("MAILCOW_SMTP_PORT", "587"))
+        self.imap_server = settings.MAILCOW_IMAP_SERVER
+        self.smtp_server = settings.MAILCOW_SMTP_SERVER
+        self.imap_port = settings.MAILCOW_IMAP_PORT
+        self.smtp_port = settings.MAILCOW_SMTP_PORT
     
     def _decode_header_value(self, value: str) -> str:
         """Декодирование заголовка письма"""
@@ -54,21 +271,27 @@ class EmailService:
             return match.group(1)
         return email_str.strip()
     
-    def connect_imap(self) -> imaplib.IMAP4_SSL:
-        """Подключение к IMAP серверу"""
-        try:
-            mail = imaplib.IMAP4_SSL(self.imap_server, self.imap_port)
-            mail.login(self.email_address, self.password)
-            return mail
-        except Exception as e:
-            raise Exception(f"Failed to connect to IMAP: {str(e)}")
+    def _run_imap(self, operation: Callable[[imaplib.IMAP4], T]) -> T:
+        """
+        Выполнить операцию на IMAP соединении из пула
+        
+        Если сервер закрыл соединение, операция один раз повторяется
+        на новом. После таймаута не повторяется: команда могла выполниться.
+        """
+        for attempt in range(2):
+            try:
+                with imap_pool.connection(
+                    self.imap_server, self.imap_port, self.email_address, self.password
+                ) as mail:
+                    return operation(mail)
+            except CONNECTION_ERRORS as e:
+                if attempt or not is_connection_dropped(e):
+                    raise
     
     def get_folders(self) -> List[Dict[str, str]]:
         """Получение списка папок"""
         try:
-            mail = self.connect_imap()
-            status, folders = mail.list()
-            mail.logout()
+            status, folders = self._run_imap(lambda mail: mail.list())
             
             folder_list = []
             if status == 'OK':
@@ -93,89 +316,276 @@ class EmailService:
         limit: int = 50,
         offset: int = 0
     ) -> List[Dict]:
-        """Получение списка писем из папки"""
+        """
+        Получение списка писем из папки
+        
+        Страница загружается одним UID FETCH: ENVELOPE, FLAGS, размер,
+        BODYSTRUCTURE и первые EMAIL_PREVIEW_BYTES байт текста - без
+        скачивания писем целиком.
+        """
         try:
-            mail = self.connect_imap()
-            mail.select(folder, readonly=True)
-            
-            # Поиск всех писем
-            status, messages = mail.search(None, 'ALL')
-            
-            if status != 'OK':
-                mail.logout()
-                return []
-            
-            email_ids = messages[0].split()
-            email_ids.reverse()  # Новые письма сначала
-            
-            # Применяем пагинацию
-            start = offset
-            end = min(offset + limit, len(email_ids))
-            email_ids = email_ids[start:end]
+            fetched = self._run_imap(lambda mail: self._fetch_messages(mail, folder, limit, offset))
             
             emails = []
             
-            for email_id in email_ids:
+            for uid, data in fetched:
                 try:
-                    status, msg_data = mail.fetch(email_id, '(RFC822)')
-                    
-                    if status != 'OK':
-                        continue
-                    
-                    for response_part in msg_data:
-                        if isinstance(response_part, tuple):
-                            msg = email.message_from_bytes(response_part[1])
-                            
-                            # Извлечение заголовков
-                            subject = self._decode_header_value(msg.get('Subject', ''))
-                            from_addr = self._decode_header_value(msg.get('From', ''))
-                            to_addr = self._decode_header_value(msg.get('To', ''))
-                            date_str = msg.get('Date', '')
-                            
-                            # Извлечение тела письма
-                            body = ""
-                            if msg.is_multipart():
-                                for part in msg.walk():
-                                    content_type = part.get_content_type()
-                                    if content_type == "text/plain":
-                                        try:
-                                            body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                            break
-                                        except:
-                                            pass
-                                    elif content_type == "text/html" and not body:
-                                        try:
-                                            body = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                        except:
-                                            pass
-                            else:
-                                try:
-                                    body = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                except:
-                                    body = str(msg.get_payload())
-                            
-                            # Ограничение длины превью
-                            preview = body[:200] + "..." if len(body) > 200 else body
-                            
-                            emails.append({
-                                "id": email_id.decode(),
-                                "subject": subject,
-                                "from": from_addr,
-                                "to": to_addr,
-                                "date": date_str,
-                                "preview": preview,
-                                "has_attachments": self._has_attachments(msg)
-                            })
+                    emails.append(self._listing_item(uid, data))
                 except Exception as e:
-                    print(f"Error processing email {email_id}: {str(e)}")
+                    print(f"Error processing email {uid}: {str(e)}")
                     continue
             
-            mail.logout()
             return emails
             
         except Exception as e:
             raise Exception(f"Failed to get emails: {str(e)}")
     
+    def _fetch_messages(self, mail: imaplib.IMAP4, folder: str, limit: int, offset: int) -> List:
+        """Получение страницы писем одним UID FETCH: [(uid, данные FETCH)]"""
+        mail.select(folder, readonly=True)
+        
+        # Поиск всех писем
+        status, messages = mail.uid('SEARCH', None, 'ALL')
+        
+        if status != 'OK':
+            return []
+        
+        uids = [int(uid) for uid in messages[0].split()]
+        uids.reverse()  # Новые письма сначала
+        
+        # Применяем пагинацию
+        uids = uids[offset:offset + limit]
+        if not uids:
+            return []
+        
+        return self._fetch_listing(mail, uids)
+    
+    def _fetch_listing(self, mail: imaplib.IMAP4, uids: List[int], text_bytes: Optional[int] = None) -> List:
+        """Данные для списка писем по UID одним запросом: [(uid, данные FETCH)]"""
+        text_bytes = text_bytes or settings.EMAIL_PREVIEW_BYTES
+        status, data = mail.uid(
+            'FETCH',
+            _uid_set(uids),
+            f'(UID FLAGS RFC822.SIZE ENVELOPE BODYSTRUCTURE BODY.PEEK[TEXT]<0.{text_bytes}>)'
+        )
+        if status != 'OK':
+            return []
+        
+        parsed = parse_fetch_response([item for item in data if item is not None], normalise_times=False)
+        return [(uid, parsed[uid]) for uid in uids if uid in parsed]
+    
+    def _listing_item(self, uid: int, data: Dict, with_text: bool = False) -> Dict:
+        """Элемент списка писем из данных FETCH (with_text - с текстом для поиска)"""
+        envelope = data.get(b'ENVELOPE')
+        structure = data.get(b'BODYSTRUCTURE')
+        flags = data.get(b'FLAGS') or ()
+        partial = data.get(b'BODY[TEXT]<0>')
+        
+        body = self._preview_from_partial(structure, partial)
+        
+        # Ограничение длины превью
+        preview = body[:200] + "..." if len(body) > 200 else body
+        
+        item = {
+            "id": str(uid),
+            "subject": self._decode_header_value(_bytes_to_str(envelope.subject)) if envelope else "",
+            "from": self._format_addresses(envelope.from_) if envelope else "",
+            "to": self._format_addresses(envelope.to) if envelope else "",
+            "date": format_datetime(envelope.date) if envelope and envelope.date else "",
+            "sent_at": envelope.date if envelope else None,
+            "preview": preview,
+            "has_attachments": _structure_has_attachments(structure),
+            "is_read": b'\\Seen' in flags,
+            "flags": [_bytes_to_str(flag) for flag in flags],
+            "size": data.get(b'RFC822.SIZE')
+        }
+        if with_text:
+            item["body_text"] = _compact_text(body)
+        return item
+    
+    def sync_folder_changes(
+        self,
+        folder: str,
+        uidvalidity: Optional[int],
+        highest_uid: int,
+        highest_modseq: Optional[int],
+        known_count: int,
+        batch_size: int,
+        backfill_uid: Optional[int] = None,
+        check_existing: bool = True
+    ) -> Dict:
+        """
+        Одна пачка изменений папки относительно локального индекса
+        
+        STATUS дает UIDVALIDITY, UIDNEXT, число писем и HIGHESTMODSEQ
+        (если сервер поддерживает CONDSTORE). За вызов загружается не
+        больше batch_size писем, поэтому время вызова и память не зависят
+        от размера папки:
+        - при первой синхронизации (и смене UIDVALIDITY) - самые новые
+          письма; письма с UID меньше backfill_uid догружаются следующими
+          вызовами, от новых к старым;
+        - письма с UID больше highest_uid - по возрастанию UID.
+        check_existing - проверить и уже загруженные письма (один раз за
+        синхронизацию):
+        - флаги писем, измененных после highest_modseq (CHANGEDSINCE),
+          без CONDSTORE - флаги всех известных писем;
+        - полный список UID, только если число писем не сходится
+          (значит, часть писем удалена).
+        more - на сервере остались письма для следующего вызова.
+        
+        Для новых писем загружается MAIL_SEARCH_BODY_BYTES байт текста -
+        они попадают в поисковый индекс.
+        """
+        text_bytes = max(settings.EMAIL_PREVIEW_BYTES, settings.MAIL_SEARCH_BODY_BYTES)
+        
+        def search(mail: imaplib.IMAP4, criteria: str) -> List[int]:
+            status, found = mail.uid('SEARCH', None, criteria)
+            return [int(value) for value in found[0].split()] if status == 'OK' else []
+        
+        def fetch(mail: imaplib.IMAP4, uids: List[int]) -> List[Dict]:
+            items = []
+            for uid, data in self._fetch_listing(mail, uids, text_bytes):
+                try:
+                    items.append(self._listing_item(uid, data, with_text=True))
+                except Exception as e:
+                    print(f"Error processing email {uid}: {str(e)}")
+            return items
+        
+        def sync(mail: imaplib.IMAP4) -> Dict:
+            condstore = 'CONDSTORE' in mail.capabilities
+            items = '(MESSAGES UIDNEXT UIDVALIDITY HIGHESTMODSEQ)' if condstore else '(MESSAGES UIDNEXT UIDVALIDITY)'
+            status, data = mail.status(folder, items)
+            if status != 'OK':
+                raise Exception(f"STATUS failed for {folder}")
+            values = {
+                name.decode(): int(value)
+                for name, value in _STATUS_ITEM_RE.findall(b" ".join(item for item in data if isinstance(item, bytes)))
+            }
+            
+            server_uidvalidity = values["UIDVALIDITY"]
+            server_modseq = values.get("HIGHESTMODSEQ")
+            reset = uidvalidity is not None and uidvalidity != server_uidvalidity
+            initial = reset or uidvalidity is None
+            last_uid = 0 if initial else highest_uid
+            last_modseq = None if reset else highest_modseq
+            
+            result = {
+                "uidvalidity": server_uidvalidity,
+                # Без проверки флагов HIGHESTMODSEQ не сдвигается - иначе
+                # изменения между пачками потерялись бы
+                "highest_modseq": server_modseq if check_existing or initial else highest_modseq,
+                "messages": values.get("MESSAGES", 0),
+                "reset": reset,
+                "new": [],
+                "flags": {},
+                "all_uids": None,
+                "backfill_uid": None if initial else backfill_uid,
+                "more": False,
+            }
+            
+            has_new = values.get("UIDNEXT", 0) - 1 > last_uid
+            flags_changed = check_existing and last_uid > 0 and (
+                server_modseq is None or last_modseq is None or server_modseq > last_modseq
+            )
+            count_changed = check_existing and result["messages"] != known_count
+            if not has_new and not flags_changed and not count_changed and result["backfill_uid"] is None:
+                return result
+            
+            mail.select(folder, readonly=True)
+            
+            new_uids: List[int] = []
+            if has_new:
+                # Диапазон n:* всегда включает последнее письмо, даже если его UID меньше n
+                new_uids = sorted(uid for uid in search(mail, f'UID {last_uid + 1}:*') if uid > last_uid)
+                if initial:
+                    # Сначала самые новые письма - первая страница списка
+                    batch = new_uids[-batch_size:]
+                    if len(new_uids) > len(batch):
+                        result["backfill_uid"] = batch[0]
+                else:
+                    batch = new_uids[:batch_size]
+                result["new"] = fetch(mail, batch)
+                result["more"] = len(new_uids) > len(batch)
+            
+            if not result["new"] and not result["more"] and result["backfill_uid"] is not None:
+                # Новых писем нет - догрузка старых, от новых к старым
+                floor = result["backfill_uid"]
+                older = sorted(uid for uid in search(mail, f'UID 1:{floor - 1}') if uid < floor) if floor > 1 else []
+                batch = older[-batch_size:]
+                result["new"] = fetch(mail, batch)
+                result["backfill_uid"] = batch[0] if len(older) > len(batch) else None
+            result["more"] = result["more"] or result["backfill_uid"] is not None
+            
+            if flags_changed:
+                if condstore and last_modseq is not None:
+                    command = f'(UID FLAGS) (CHANGEDSINCE {last_modseq})'
+                else:
+                    command = '(UID FLAGS)'
+                status, data = mail.uid('FETCH', f'1:{last_uid}', command)
+                if status == 'OK':
+                    parsed = parse_fetch_response([item for item in data if item is not None], normalise_times=False)
+                    result["flags"] = {
+                        uid: [_bytes_to_str(flag) for flag in fields.get(b'FLAGS') or ()]
+                        for uid, fields in parsed.items()
+                        if uid <= last_uid
+                    }
+            
+            # Все новые письма (в том числе оставленные на следующие вызовы) уже
+            # учтены в MESSAGES; расхождение - значит, часть писем удалена
+            if check_existing and not initial and result["messages"] != known_count + len(new_uids):
+                result["all_uids"] = search(mail, 'ALL')
+            
+            return result
+        
+        try:
+            return self._run_imap(sync)
+        except Exception as e:
+            raise Exception(f"Failed to sync folder: {str(e)}")
+    
+    def _format_addresses(self, addresses) -> str:
+        """Адреса из ENVELOPE в виде 'Имя <user@host>, ...'"""
+        result = []
+        for address in addresses or ():
+            mailbox = _bytes_to_str(address.mailbox)
+            host = _bytes_to_str(address.host)
+            email_address = f"{mailbox}@{host}" if host else mailbox
+            name = self._decode_header_value(_bytes_to_str(address.name))
+            result.append(f"{name} <{email_address}>" if name else email_address)
+        return ", ".join(result)
+    
+    def _preview_from_partial(self, structure, partial: Optional[bytes]) -> str:
+        """
+        Текст превью из начала тела письма
+        
+        Начало тела разбирается как MIME сообщение с заголовками,
+        восстановленными по BODYSTRUCTURE; берется первая text/plain
+        (или видимый текст text/html) часть, даже если она обрезана.
+        """
+        if not partial or structure is None:
+            return ""
+        
+        try:
+            msg = email.message_from_bytes(_structure_headers(structure) + partial)
+        except Exception:
+            return ""
+        
+        body = ""
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            if content_type not in ("text/plain", "text/html"):
+                continue
+            try:
+                payload = part.get_payload(decode=True) or b""
+                charset = part.get_content_charset() or "utf-8"
+                text = payload.decode(charset, errors="ignore")
+            except Exception:
+                continue
+            if content_type == "text/plain":
+                return text
+            if not body:
+                body = _compact_text(_html_to_text(text))
+        return body
+    
     def _has_attachments(self, msg) -> bool:
         """Проверка наличия вложений"""
         if msg.is_multipart():
@@ -185,81 +595,146 @@ class EmailService:
         return False
     
     def get_email_by_id(self, email_id: str, folder: str = "INBOX") -> Optional[Dict]:
-        """Получение полного содержимого письма по ID"""
-        try:
-            mail = self.connect_imap()
+        """
+        Получение содержимого письма по UID
+        
+        Структура письма берется из BODYSTRUCTURE: с сервера загружаются
+        только заголовки и текстовые части, вложения - лишь их описание
+        (скачиваются отдельно через iter_part).
+        """
+        if not email_id.isdigit():
+            return None
+        uid = int(email_id)
+        
+        def fetch(mail: imaplib.IMAP4):
             mail.select(folder, readonly=True)
+            status, data = mail.uid('FETCH', email_id, '(UID BODYSTRUCTURE BODY.PEEK[HEADER])')
+            if status != 'OK':
+                return None
+            item = parse_fetch_response([part for part in data if part is not None], normalise_times=False).get(uid)
+            if not item or b'BODYSTRUCTURE' not in item:
+                return None
             
-            status, msg_data = mail.fetch(email_id.encode(), '(RFC822)')
+            parts = _structure_parts(item[b'BODYSTRUCTURE'])
+            text_parts = {}
+            for part in parts:
+                if part["content_type"] in ("text/plain", "text/html") and not _is_attachment(part):
+                    text_parts.setdefault(part["content_type"], part)
             
-            if status != 'OK':
-                mail.logout()
+            bodies = {}
+            if text_parts:
+                sections = " ".join(f"BODY.PEEK[{part['section']}]" for part in text_parts.values())
+                status, data = mail.uid('FETCH', email_id, f'(UID {sections})')
+                if status == 'OK':
+                    fetched = parse_fetch_response([part for part in data if part is not None], normalise_times=False).get(uid, {})
+                    for content_type, part in text_parts.items():
+                        bodies[content_type] = fetched.get(f"BODY[{part['section']}]".encode())
+            
+            return item.get(b'BODY[HEADER]') or b"", parts, text_parts, bodies
+        
+        try:
+            result = self._run_imap(fetch)
+            if result is None:
                 return None
+            header, parts, text_parts, bodies = result
             
-            for response_part in msg_data:
-                if isinstance(response_part, tuple):
-                    msg = email.message_from_bytes(response_part[1])
-                    
-                    # Извлечение заголовков
-                    subject = self._decode_header_value(msg.get('Subject', ''))
-                    from_addr = self._decode_header_value(msg.get('From', ''))
-                    to_addr = self._decode_header_value(msg.get('To', ''))
-                    cc_addr = self._decode_header_value(msg.get('Cc', ''))
-                    date_str = msg.get('Date', '')
-                    
-                    # Извлечение тела письма
-                    body_plain = ""
-                    body_html = ""
-                    attachments = []
-                    
-                    if msg.is_multipart():
-                        for part in msg.walk():
-                            content_type = part.get_content_type()
-                            content_disposition = part.get_content_disposition()
-                            
-                            if content_disposition == 'attachment':
-                                filename = part.get_filename()
-                                if filename:
-                                    attachments.append({
-                                        "filename": self._decode_header_value(filename),
-                                        "size": len(part.get_payload(decode=True) or b'')
-                                    })
-                            elif content_type == "text/plain":
-                                try:
-                                    body_plain = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                except:
-                                    pass
-                            elif content_type == "text/html":
-                                try:
-                                    body_html = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                                except:
-                                    pass
-                    else:
-                        try:
-                            body_plain = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-                        except:
-                            body_plain = str(msg.get_payload())
-                    
-                    mail.logout()
-                    
-                    return {
-                        "id": email_id,
-                        "subject": subject,
-                        "from": from_addr,
-                        "to": to_addr,
-                        "cc": cc_addr,
-                        "date": date_str,
-                        "body_plain": body_plain,
-                        "body_html": body_html,
-                        "attachments": attachments
-                    }
+            # Извлечение заголовков
+            msg = email.message_from_bytes(header)
             
-            mail.logout()
-            return None
+            # Текстовые части в кодировке из BODYSTRUCTURE
+            texts = {}
+            for content_type, part in text_parts.items():
+                payload = _TransferDecoder.decode(part["encoding"], bodies.get(content_type) or b"")
+                try:
+                    texts[content_type] = payload.decode(part["charset"] or "utf-8", errors="ignore")
+                except LookupError:
+                    texts[content_type] = payload.decode("utf-8", errors="ignore")
+            
+            attachments = [
+                {
+                    "section": part["section"],
+                    "filename": self._decode_header_value(part["filename"] or f"part-{part['section']}"),
+                    "content_type": part["content_type"],
+                    "size": part["size"]
+                }
+                for part in parts
+                if _is_attachment(part)
+            ]
+            
+            return {
+                "id": email_id,
+                "subject": self._decode_header_value(msg.get('Subject', '')),
+                "from": self._decode_header_value(msg.get('From', '')),
+                "to": self._decode_header_value(msg.get('To', '')),
+                "cc": self._decode_header_value(msg.get('Cc', '')),
+                "date": msg.get('Date', ''),
+                "body_plain": texts.get("text/plain", ""),
+                "body_html": texts.get("text/html", ""),
+                "attachments": attachments
+            }
             
         except Exception as e:
             raise Exception(f"Failed to get email: {str(e)}")
     
+    def get_part(self, email_id: str, section: str, folder: str = "INBOX") -> Optional[Dict]:
+        """Описание MIME части письма из BODYSTRUCTURE (None, если части нет)"""
+        if not email_id.isdigit() or not SECTION_RE.match(section):
+            return None
+        
+        def fetch(mail: imaplib.IMAP4):
+            mail.select(folder, readonly=True)
+            status, data = mail.uid('FETCH', email_id, '(UID BODYSTRUCTURE)')
+            if status != 'OK':
+                return None
+            return parse_fetch_response([part for part in data if part is not None], normalise_times=False).get(int(email_id))
+        
+        try:
+            item = self._run_imap(fetch)
+            if not item or b'BODYSTRUCTURE' not in item:
+                return None
+            for part in _structure_parts(item[b'BODYSTRUCTURE']):
+                if part["section"] == section:
+                    if part["filename"]:
+                        part["filename"] = self._decode_header_value(part["filename"])
+                    return part
+            return None
+        
+        except Exception as e:
+            raise Exception(f"Failed to get email part: {str(e)}")
+    
+    def iter_part(self, email_id: str, part: Dict, folder: str = "INBOX", chunk_size: int = settings.MAIL_ATTACHMENT_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Декодированное содержимое MIME части блоками
+        
+        Часть читается частичными FETCH BODY.PEEK[section]<offset.size> и
+        декодируется по мере поступления, поэтому в памяти находится не
+        больше одного блока. Соединение занято до конца чтения.
+        """
+        section = part["section"]
+        decoder = _TransferDecoder(part["encoding"])
+        
+        with imap_pool.connection(self.imap_server, self.imap_port, self.email_address, self.password) as mail:
+            mail.select(folder, readonly=True)
+            offset = 0
+            while True:
+                status, data = mail.uid('FETCH', email_id, f'(UID BODY.PEEK[{section}]<{offset}.{chunk_size}>)')
+                if status != 'OK':
+                    raise Exception(f"Failed to fetch part {section}")
+                item = parse_fetch_response([response for response in data if response is not None], normalise_times=False).get(int(email_id), {})
+                chunk = item.get(f"BODY[{section}]<{offset}>".encode())
+                if not chunk:
+                    break
+                decoded = decoder.feed(chunk)
+                if decoded:
+                    yield decoded
+                if len(chunk) < chunk_size:
+                    break
+                offset += len(chunk)
+        
+        tail = decoder.flush()
+        if tail:
+            yield tail
+    
     def send_email(
         self,
         to: str,
@@ -287,37 +762,58 @@ class EmailService:
             else:
                 msg.attach(MIMEText(body, 'plain'))
             
-            # Подключение к SMTP и отправка
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_address, self.password)
-                
-                recipients = [to]
-                if cc:
-                    recipients.extend([addr.strip() for addr in cc.split(',')])
-                if bcc:
-                    recipients.extend([addr.strip() for addr in bcc.split(',')])
-                
-                server.sendmail(self.email_address, recipients, msg.as_string())
+            recipients = [to]
+            if cc:
+                recipients.extend([addr.strip() for addr in cc.split(',')])
+            if bcc:
+                recipients.extend([addr.strip() for addr in bcc.split(',')])
+            
+            # Отправка через соединение из пула (STARTTLS и AUTH уже выполнены).
+            # Сервер мог закрыть простаивавшую сессию - одна повторная попытка.
+            # После таймаута или прерывания во время sendmail не повторяем:
+            # сервер мог принять письмо, а ответ не дошел
+            for attempt in range(2):
+                sending = False
+                try:
+                    with smtp_pool.connection(self.smtp_server, self.smtp_port, self.email_address, self.password) as server:
+                        sending = True
+                        server.sendmail(self.email_address, recipients, msg.as_string())
+                    break
+                except Exception as e:
+                    call = current_mail_call()
+                    if sending and (_is_timeout(e) or (call is not None and call.aborted)):
+                        raise MailDeliveryUnknownError(f"No response from SMTP server: {str(e)}") from e
+                    if attempt or not is_connection_error(e):
+                        raise
             
             return True
             
+        except MailDeliveryUnknownError:
+            raise
+        except SmtpPoolExhaustedError:
+            # Письмо не передавалось - очередь отправки повторит его без траты попытки
+            raise
+        except smtplib.SMTPResponseException:
+            # Код ответа сервера нужен очереди отправки (повтор или отказ)
+            raise
+        except smtplib.SMTPRecipientsRefused:
+            raise
         except Exception as e:
             raise Exception(f"Failed to send email: {str(e)}")
     
     def delete_email(self, email_id: str, folder: str = "INBOX") -> bool:
         """Удаление письма (перемещение в корзину)"""
-        try:
-            mail = self.connect_imap()
+        def delete(mail: imaplib.IMAP4):
             mail.select(folder)
             
             # Пометка письма как удаленного
-            mail.store(email_id.encode(), '+FLAGS', '\\Deleted')
+            mail.uid('STORE', email_id, '+FLAGS', '\\Deleted')
             
             # Применение изменений
             mail.expunge()
-            
-            mail.logout()
+        
+        try:
+            self._run_imap(delete)
             return True
             
         except Exception as e:
@@ -325,13 +821,12 @@ class EmailService:
     
     def mark_as_read(self, email_id: str, folder: str = "INBOX") -> bool:
         """Пометка письма как прочитанного"""
-        try:
-            mail = self.connect_imap()
+        def mark(mail: imaplib.IMAP4):
             mail.select(folder)
-            
-            mail.store(email_id.encode(), '+FLAGS', '\\Seen')
-            
-            mail.logout()
+            mail.uid('STORE', email_id, '+FLAGS', '\\Seen')
+        
+        try:
+            self._run_imap(mark)
             return True
             
         except Exception as e:
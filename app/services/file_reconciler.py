@@ -0,0 +1,192 @@
+"""
+Фоновая сверка таблицы stored_files с содержимым bucket MinIO
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, or_, select, update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import StoredFile
+from app.services.content_store import content_store
+from app.services.image_derivatives import DERIVATIVES_PREFIX
+from app.services.storage_service import AsyncStorageService, storage_service
+
+
+class StoredFileReconciler:
+    """
+    Периодически проходит bucket постранично и синхронизирует stored_files
+
+    Объекты без строки в таблице добавляются (без владельца), строки
+    найденных объектов получают last_seen_at = начало прохода. Объекты
+    моложе min_age не добавляются: это могут быть прямые загрузки, для
+    которых клиент еще вызовет /direct-upload/complete. После
+    полного прохода удаляются строки, созданные до его начала и не
+    найденные в bucket. В памяти находится не больше одной страницы.
+    """
+
+    def __init__(self, storage: AsyncStorageService, interval: int, page_size: int, min_age: int):
+        self.storage = storage
+        self.interval = interval
+        self.page_size = page_size
+        self.min_age = min_age
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_seen = 0
+        self.last_run_added = 0
+        self.last_run_deferred = 0
+        self.last_run_removed = 0
+        self.last_error: Optional[str] = None
+
+    @staticmethod
+    def _new_row(obj: Dict, seen_at: datetime) -> Dict:
+        """Строка stored_files для объекта, найденного только в bucket"""
+        name = obj["name"]
+        sha256 = name.rsplit("/", 1)[-1] if content_store.is_blob(name) else None
+        return {
+            "object_name": name,
+            "folder": name.split("/", 1)[0] if "/" in name else "",
+            "file_name": name.rsplit("/", 1)[-1],
+            "size": obj["size"] or 0,
+            "etag": obj["etag"],
+            "sha256": sha256,
+            "last_seen_at": seen_at,
+        }
+
+    def _is_settled(self, obj: Dict, run_started: datetime) -> bool:
+        """Объект старше min_age: тикет прямой загрузки для него уже истек"""
+        last_modified = obj.get("last_modified")
+        if last_modified is None:
+            return True
+        if last_modified.tzinfo is not None:
+            last_modified = last_modified.astimezone(timezone.utc).replace(tzinfo=None)
+        return last_modified < run_started - timedelta(seconds=self.min_age)
+
+    async def _reconcile_page(self, objects: List[Dict], run_started: datetime) -> Tuple[int, int]:
+        """Отметить найденные объекты и добавить отсутствующие в таблице: (добавлено, отложено)"""
+        names = [obj["name"] for obj in objects]
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(StoredFile.object_name).where(StoredFile.object_name.in_(names))
+            )
+            known = set(result.scalars().all())
+
+            if known:
+                await session.execute(
+                    update(StoredFile)
+                    .where(StoredFile.object_name.in_(known))
+                    .values(last_seen_at=run_started)
+                    .execution_options(synchronize_session=False)
+                )
+
+            unknown = [obj for obj in objects if obj["name"] not in known]
+            new_rows = [self._new_row(obj, run_started) for obj in unknown if self._is_settled(obj, run_started)]
+            if new_rows:
+                await session.execute(insert(StoredFile), new_rows)
+
+            await session.commit()
+            return len(new_rows), len(unknown) - len(new_rows)
+
+    async def _remove_missing(self, run_started: datetime) -> int:
+        """Удалить строки объектов, которых не было в bucket на момент прохода"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                delete(StoredFile)
+                .where(
+                    or_(StoredFile.last_seen_at.is_(None), StoredFile.last_seen_at < run_started),
+                    StoredFile.created_at < run_started
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount or 0
+
+    async def run_once(self) -> Dict:
+        """Один полный проход по bucket"""
+        run_started = datetime.utcnow()
+        seen = 0
+        added = 0
+        deferred = 0
+        start_after: Optional[str] = None
+        while True:
+            objects = await self.storage.list_files_page("", start_after, self.page_size)
+            if not objects:
+                break
+            start_after = objects[-1]["name"]
+            # Уменьшенные копии изображений учитываются в строке оригинала
+            objects = [obj for obj in objects if not obj["name"].startswith(DERIVATIVES_PREFIX)]
+            if objects:
+                page_added, page_deferred = await self._reconcile_page(objects, run_started)
+                added += page_added
+                deferred += page_deferred
+            seen += len(objects)
+
+        # Удаление только после успешного полного прохода
+        removed = await self._remove_missing(run_started)
+
+        self.runs += 1
+        self.last_run_at = run_started
+        self.last_run_seen = seen
+        self.last_run_added = added
+        self.last_run_deferred = deferred
+        self.last_run_removed = removed
+        if added or removed:
+            print(f"✅ File reconciler: {seen} objects, {added} added, {removed} removed")
+        return {"seen": seen, "added": added, "deferred": deferred, "removed": removed}
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ File reconciler error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Запустить периодическую задачу"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            print(f"✅ File reconciler started (every {self.interval}s)")
+
+    async def stop(self):
+        """Остановить периодическую задачу"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        """Статистика работы"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval,
+            "page_size": self.page_size,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_seen": self.last_run_seen,
+            "last_run_added": self.last_run_added,
+            "last_run_deferred": self.last_run_deferred,
+            "last_run_removed": self.last_run_removed,
+            "last_error": self.last_error,
+        }
+
+
+# Глобальный экземпляр сервиса
+file_reconciler = StoredFileReconciler(
+    storage_service,
+    interval=settings.FILE_RECONCILE_INTERVAL_SECONDS,
+    page_size=settings.FILE_RECONCILE_PAGE_SIZE,
+    # Тикет прямой загрузки действует две длительности ссылки (files.create_direct_upload)
+    min_age=settings.MINIO_DIRECT_UPLOAD_EXPIRE_SECONDS * 2 + settings.FILE_RECONCILE_MARGIN_SECONDS,
+)
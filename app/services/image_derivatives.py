@@ -0,0 +1,221 @@
+"""
+Уменьшенные копии аватаров (WebP/JPEG)
+
+После загрузки аватар ставится в очередь; воркеры скачивают оригинал,
+масштабируют его в пуле процессов (Pillow нагружает CPU и не должен
+выполняться в event loop) и загружают копии по детерминированным ключам:
+
+    derivatives/<путь оригинала>/<размер>.webp
+    derivatives/<путь оригинала>/<размер>.jpg
+
+Список готовых размеров сохраняется в stored_files.derivatives.
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import StoredFile
+from app.services.storage_service import AsyncStorageService, storage_service
+
+
+DERIVATIVES_PREFIX = "derivatives/"
+
+# Формат ответа -> (формат Pillow, расширение, MIME тип)
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+
+def derivative_object_name(object_name: str, size: int, image_format: str) -> str:
+    """Ключ уменьшенной копии"""
+    extension = DERIVATIVE_FORMATS[image_format][1]
+    return f"{DERIVATIVES_PREFIX}{object_name}/{size}.{extension}"
+
+
+def render_derivatives(data: bytes, sizes: List[int], quality: int) -> Dict[Tuple[int, str], bytes]:
+    """
+    Построить квадратные копии изображения (выполняется в отдельном процессе)
+
+    Размеры больше короткой стороны оригинала пропускаются,
+    наименьший размер строится всегда.
+    """
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    shortest_side = min(image.size)
+    sizes = sorted(sizes)
+    targets = [size for size in sizes if size <= shortest_side] or sizes[:1]
+
+    rendered = {}
+    for size in targets:
+        thumbnail = ImageOps.fit(image, (size, size), method=Image.Resampling.LANCZOS)
+        for image_format, (pil_format, _, _) in DERIVATIVE_FORMATS.items():
+            output = BytesIO()
+            if pil_format == "JPEG":
+                thumbnail.convert("RGB").save(output, pil_format, quality=quality, optimize=True, progressive=True)
+            else:
+                thumbnail.save(output, pil_format, quality=quality, method=4)
+            rendered[(size, image_format)] = output.getvalue()
+    return rendered
+
+
+def closest_size(available: List[int], requested: int) -> Optional[int]:
+    """Наименьший готовый размер не меньше запрошенного, иначе наибольший"""
+    if not available:
+        return None
+    larger = [size for size in available if size >= requested]
+    return min(larger) if larger else max(available)
+
+
+class AvatarDerivativePipeline:
+    """Очередь и воркеры построения уменьшенных копий аватаров"""
+
+    def __init__(
+        self,
+        storage: AsyncStorageService,
+        sizes: List[int],
+        quality: int,
+        process_workers: int,
+        concurrency: int,
+        max_queue: int,
+    ):
+        self.storage = storage
+        self.sizes = sizes
+        self.quality = quality
+        self.process_workers = process_workers
+        self.concurrency = concurrency
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._pending: set = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_error: Optional[str] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.process_workers)
+        return self._executor
+
+    def enqueue(self, object_name: str) -> bool:
+        """Поставить аватар в очередь (не блокирует; при переполнении задача отбрасывается)"""
+        if object_name in self._pending:
+            return True
+        try:
+            self._queue.put_nowait(object_name)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self._pending.add(object_name)
+        return True
+
+    async def process(self, object_name: str) -> List[int]:
+        """Построить и загрузить копии одного аватара, вернуть готовые размеры"""
+        data = await self.storage.download_file(object_name)
+        if not data:
+            raise RuntimeError(f"Original not found: {object_name}")
+
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(
+            self._get_executor(), render_derivatives, data, self.sizes, self.quality
+        )
+
+        for (size, image_format), payload in rendered.items():
+            content_type = DERIVATIVE_FORMATS[image_format][2]
+            key = derivative_object_name(object_name, size, image_format)
+            uploaded = await self.storage.upload_stream(
+                BytesIO(payload), key, content_type, object_name=key
+            )
+            if not uploaded:
+                raise RuntimeError(f"Failed to upload derivative {key}")
+
+        sizes = sorted({size for size, _ in rendered})
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(StoredFile)
+                .where(StoredFile.object_name == object_name)
+                .values(derivatives=sizes)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        return sizes
+
+    async def delete_for(self, object_name: str) -> int:
+        """Удалить все копии аватара"""
+        prefix = f"{DERIVATIVES_PREFIX}{object_name}/"
+        objects = await self.storage.list_files_page(prefix, None, len(self.sizes) * len(DERIVATIVE_FORMATS))
+        deleted = 0
+        for obj in objects:
+            if await self.storage.delete_file(obj["name"]):
+                deleted += 1
+        return deleted
+
+    async def _worker(self):
+        while True:
+            object_name = await self._queue.get()
+            try:
+                await self.process(object_name)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                self.last_error = str(e)
+                print(f"❌ Avatar derivatives error for {object_name}: {e}")
+            finally:
+                self._pending.discard(object_name)
+                self._queue.task_done()
+
+    def start(self):
+        """Запустить воркеры"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+            print(f"✅ Avatar derivative pipeline started ({self.concurrency} workers, sizes {self.sizes})")
+
+    async def stop(self):
+        """Остановить воркеры и пул процессов"""
+        for task in self._workers:
+            task.cancel()
+        for task in self._workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict:
+        """Статистика очереди"""
+        return {
+            "running": bool(self._workers),
+            "sizes": self.sizes,
+            "process_workers": self.process_workers,
+            "queued": self._queue.qsize(),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "last_error": self.last_error,
+        }
+
+
+# Глобальный экземпляр сервиса
+avatar_derivatives = AvatarDerivativePipeline(
+    storage_service,
+    sizes=settings.AVATAR_DERIVATIVE_SIZES,
+    quality=settings.AVATAR_DERIVATIVE_QUALITY,
+    process_workers=settings.AVATAR_DERIVATIVE_PROCESS_WORKERS,
+    concurrency=settings.AVATAR_DERIVATIVE_CONCURRENCY,
+    max_queue=settings.AVATAR_DERIVATIVE_MAX_QUEUE,
+)
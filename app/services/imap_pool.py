@@ -0,0 +1,376 @@
+"""
+Пул постоянных IMAP соединений
+
+Открытие IMAP сессии стоит TLS рукопожатия и LOGIN, поэтому соединения
+переиспользуются между запросами. Соединения группируются по
+(сервер, порт, пользователь); число сессий ограничено на пользователя и
+на сервер. Когда лимит сервера занят, место освобождается закрытием
+самого давно простаивающего соединения другого пользователя.
+Простаивающее соединение перед выдачей проверяется NOOP, а
+простаивающие дольше IMAP_POOL_IDLE_TIMEOUT закрываются.
+"""
+
+import asyncio
+import imaplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.mail_call import MailAbortedError, current_mail_call
+
+
+PoolKey = Tuple[str, int, str]
+
+# Ошибки, после которых соединение считается разорванным
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError, EOFError)
+
+
+def is_connection_dropped(error: BaseException) -> bool:
+    """
+    Закрыл ли сервер IMAP сессию
+
+    Таймаут сокета сессию тоже ломает (соединение не возвращается в пул),
+    но команда могла быть выполнена сервером - повторять ее нельзя.
+    imaplib оборачивает ошибки отправки в abort, поэтому проверяется
+    вся цепочка исключений.
+    """
+    cause: Optional[BaseException] = error
+    while cause is not None:
+        if isinstance(cause, TimeoutError):
+            return False
+        cause = cause.__cause__ or cause.__context__
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+class ImapPoolExhaustedError(Exception):
+    """Не удалось получить IMAP соединение за отведенное время"""
+    pass
+
+
+class _PooledConnection:
+    """IMAP соединение и его служебные данные"""
+
+    def __init__(self, key: PoolKey, password: str, connection: imaplib.IMAP4):
+        self.key = key
+        self.password = password
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+
+class ImapConnectionPool:
+    """Потокобезопасный пул IMAP соединений с ограничениями на пользователя и сервер"""
+
+    def __init__(
+        self,
+        max_per_user: int,
+        max_per_server: int,
+        idle_timeout: float,
+        health_check_interval: float,
+        acquire_timeout: float,
+        connect_timeout: float,
+        use_ssl: bool = True,
+    ):
+        self.max_per_user = max_per_user
+        self.max_per_server = max_per_server
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+        self.use_ssl = use_ssl
+        self._condition = threading.Condition()
+        self._idle: Dict[PoolKey, List[_PooledConnection]] = {}
+        self._open_per_user: Dict[PoolKey, int] = {}
+        self._open_per_server: Dict[Tuple[str, int], int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.created = 0
+        self.reused = 0
+        self.health_check_failures = 0
+        self.discarded = 0
+        self.evicted = 0
+        self.waits = 0
+        self.exhausted = 0
+
+    # Открытие и закрытие соединений
+
+    def _open(self, key: PoolKey, password: str) -> _PooledConnection:
+        server, port, user = key
+        imap_class = imaplib.IMAP4_SSL if self.use_ssl else imaplib.IMAP4
+        connection = imap_class(server, port, timeout=self.connect_timeout)
+        try:
+            connection.login(user, password)
+            # После входа сервер объявляет расширенный список возможностей (CONDSTORE и др.)
+            status, data = connection.capability()
+            if status == "OK" and data and data[-1]:
+                connection.capabilities = tuple(data[-1].decode().upper().split())
+        except Exception:
+            self._logout(connection)
+            raise
+        self.created += 1
+        return _PooledConnection(key, password, connection)
+
+    @staticmethod
+    def _logout(connection: imaplib.IMAP4):
+        try:
+            connection.logout()
+        except Exception:
+            pass
+
+    def _unreserve(self, key: PoolKey):
+        """Уменьшить счетчики открытых соединений (под блокировкой)"""
+        server, port, _ = key
+        self._open_per_user[key] -= 1
+        if self._open_per_user[key] <= 0:
+            del self._open_per_user[key]
+        self._open_per_server[(server, port)] -= 1
+        if self._open_per_server[(server, port)] <= 0:
+            del self._open_per_server[(server, port)]
+        self._condition.notify_all()
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        """NOOP для соединения, простаивавшего дольше интервала проверки"""
+        if time.monotonic() - pooled.last_used_at < self.health_check_interval:
+            return True
+        try:
+            status, _ = pooled.connection.noop()
+            return status == "OK"
+        except Exception:
+            return False
+
+    # Выдача и возврат
+
+    def _take_idle(self, key: PoolKey, password: str, stale: List[_PooledConnection]) -> Optional[_PooledConnection]:
+        """Взять простаивающее соединение (под блокировкой)"""
+        idle = self._idle.get(key)
+        while idle:
+            pooled = idle.pop()
+            if pooled.password == password and time.monotonic() - pooled.last_used_at < self.idle_timeout:
+                return pooled
+            # Устаревший пароль или слишком долгий простой - закрыть вне блокировки
+            self._unreserve(pooled.key)
+            stale.append(pooled)
+        return None
+
+    def _evict_idle(self, server: str, port: int, stale: List[_PooledConnection]) -> bool:
+        """Освободить место на сервере: самое давно простаивающее соединение другого пользователя (под блокировкой)"""
+        # Списки простаивающих пополняются в конец, первым стоит самое старое
+        candidates = [idle[0] for key, idle in self._idle.items() if key[:2] == (server, port) and idle]
+        if not candidates:
+            return False
+        pooled = min(candidates, key=lambda candidate: candidate.last_used_at)
+        idle = self._idle[pooled.key]
+        idle.remove(pooled)
+        if not idle:
+            del self._idle[pooled.key]
+        self._unreserve(pooled.key)
+        stale.append(pooled)
+        self.evicted += 1
+        return True
+
+    def acquire(self, server: str, port: int, user: str, password: str) -> _PooledConnection:
+        """Получить соединение: простаивающее, новое или дождаться освобождения"""
+        key = (server, port, user)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            stale: List[_PooledConnection] = []
+            reserved = False
+            with self._condition:
+                pooled = self._take_idle(key, password, stale)
+                if pooled is None:
+                    user_open = self._open_per_user.get(key, 0)
+                    server_open = self._open_per_server.get((server, port), 0)
+                    if (
+                        user_open < self.max_per_user
+                        and server_open >= self.max_per_server
+                        and self._evict_idle(server, port, stale)
+                    ):
+                        server_open = self._open_per_server.get((server, port), 0)
+                    if user_open < self.max_per_user and server_open < self.max_per_server:
+                        # Место резервируется до подключения, чтобы не превысить лимиты
+                        self._open_per_user[key] = user_open + 1
+                        self._open_per_server[(server, port)] = server_open + 1
+                        reserved = True
+                    elif not stale:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.exhausted += 1
+                            raise ImapPoolExhaustedError(
+                                f"No IMAP connection available for {user} within {self.acquire_timeout}s"
+                            )
+                        self.waits += 1
+                        self._condition.wait(remaining)
+                        continue
+
+            for stale_connection in stale:
+                self._logout(stale_connection.connection)
+
+            if pooled is not None:
+                # NOOP выполняется вне блокировки
+                if self._is_healthy(pooled):
+                    self.reused += 1
+                    return pooled
+                self.health_check_failures += 1
+                self._logout(pooled.connection)
+                with self._condition:
+                    self._unreserve(pooled.key)
+                continue
+
+            if not reserved:
+                continue
+
+            try:
+                return self._open(key, password)
+            except Exception:
+                with self._condition:
+                    self._unreserve(key)
+                raise
+
+    def release(self, pooled: _PooledConnection, discard: bool = False):
+        """Вернуть соединение в пул или закрыть его"""
+        if discard:
+            self.discarded += 1
+            self._logout(pooled.connection)
+            with self._condition:
+                self._unreserve(pooled.key)
+            return
+
+        pooled.last_used_at = time.monotonic()
+        with self._condition:
+            self._idle.setdefault(pooled.key, []).append(pooled)
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self, server: str, port: int, user: str, password: str) -> Iterator[imaplib.IMAP4]:
+        """
+        Соединение на время блока with
+
+        При разрыве соединения внутри блока оно закрывается, а не
+        возвращается в пул. Сокет регистрируется в текущей операции
+        пула почты (MailCall), чтобы ее можно было прервать по таймауту;
+        соединение прерванной операции тоже закрывается.
+        """
+        call = current_mail_call()
+        if call is not None and call.aborted:
+            raise MailAbortedError("Mail operation aborted")
+        pooled = self.acquire(server, port, user, password)
+        sock = getattr(pooled.connection, "sock", None)
+        if call is not None:
+            call.attach(sock)
+
+        def detach() -> bool:
+            return call.detach(sock) if call is not None else False
+
+        try:
+            yield pooled.connection
+        except CONNECTION_ERRORS:
+            detach()
+            self.release(pooled, discard=True)
+            raise
+        except BaseException:
+            # Прикладная ошибка (например, NO на SELECT) не ломает сессию
+            self.release(pooled, discard=detach())
+            raise
+        else:
+            self.release(pooled, discard=detach())
+
+    # Обслуживание
+
+    def close_user(self, user: str):
+        """Закрыть простаивающие соединения пользователя (например, после смены пароля)"""
+        with self._condition:
+            to_close = []
+            for key in [key for key in self._idle if key[2] == user]:
+                to_close.extend(self._idle.pop(key))
+            for pooled in to_close:
+                self._unreserve(pooled.key)
+        for pooled in to_close:
+            self._logout(pooled.connection)
+
+    def prune(self) -> int:
+        """Закрыть соединения, простаивающие дольше idle_timeout"""
+        now = time.monotonic()
+        to_close = []
+        with self._condition:
+            for key, idle in list(self._idle.items()):
+                alive = [pooled for pooled in idle if now - pooled.last_used_at < self.idle_timeout]
+                to_close.extend(pooled for pooled in idle if now - pooled.last_used_at >= self.idle_timeout)
+                if alive:
+                    self._idle[key] = alive
+                else:
+                    del self._idle[key]
+            for pooled in to_close:
+                self._unreserve(pooled.key)
+        for pooled in to_close:
+            self._logout(pooled.connection)
+        return len(to_close)
+
+    def close_all(self):
+        """Закрыть все простаивающие соединения"""
+        with self._condition:
+            to_close = [pooled for idle in self._idle.values() for pooled in idle]
+            self._idle.clear()
+            for pooled in to_close:
+                self._unreserve(pooled.key)
+        for pooled in to_close:
+            self._logout(pooled.connection)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            try:
+                await asyncio.to_thread(self.prune)
+            except Exception as e:
+                print(f"❌ IMAP pool prune error: {e}")
+
+    def start(self):
+        """Запустить периодическое закрытие простаивающих соединений"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            print(f"✅ IMAP connection pool started (idle timeout {self.idle_timeout}s)")
+
+    async def stop(self):
+        """Остановить обслуживание и закрыть соединения"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.close_all)
+
+    def stats(self) -> Dict:
+        """Статистика пула"""
+        with self._condition:
+            idle = sum(len(connections) for connections in self._idle.values())
+            open_total = sum(self._open_per_server.values())
+            users = len(self._open_per_user)
+        return {
+            "open": open_total,
+            "idle": idle,
+            "in_use": open_total - idle,
+            "users": users,
+            "max_per_user": self.max_per_user,
+            "max_per_server": self.max_per_server,
+            "created": self.created,
+            "reused": self.reused,
+            "health_check_failures": self.health_check_failures,
+            "discarded": self.discarded,
+            "evicted": self.evicted,
+            "waits": self.waits,
+            "exhausted": self.exhausted,
+        }
+
+
+# Глобальный экземпляр пула
+imap_pool = ImapConnectionPool(
+    max_per_user=settings.IMAP_POOL_MAX_PER_USER,
+    max_per_server=settings.IMAP_POOL_MAX_PER_SERVER,
+    idle_timeout=settings.IMAP_POOL_IDLE_TIMEOUT,
+    health_check_interval=settings.IMAP_POOL_HEALTH_CHECK_INTERVAL,
+    acquire_timeout=settings.IMAP_POOL_ACQUIRE_TIMEOUT,
+    connect_timeout=settings.IMAP_CONNECT_TIMEOUT,
+    use_ssl=settings.MAILCOW_IMAP_SSL,
+)
@@ -0,0 +1,125 @@
+"""
+Фоновая задача, помечающая просроченные приглашения как EXPIRED
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import CompanyInvitation, InvitationStatus
+
+
+class InvitationSweeper:
+    """Периодически переводит просроченные PENDING приглашения в EXPIRED пачками"""
+    
+    def __init__(self, interval: int, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.total_expired = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_run_expired = 0
+        self.last_run_batches = 0
+        self.last_error: Optional[str] = None
+    
+    async def _expire_batch(self, now: datetime) -> int:
+        """Перевести одну пачку просроченных приглашений в EXPIRED"""
+        async with AsyncSessionLocal() as session:
+            # Индекс (status, expires_at) дает диапазонный поиск по PENDING.
+            # SKIP LOCKED позволяет нескольким воркерам работать параллельно
+            expired_ids = (
+                select(CompanyInvitation.id)
+                .where(
+                    CompanyInvitation.status == InvitationStatus.PENDING,
+                    CompanyInvitation.expires_at < now
+                )
+                .order_by(CompanyInvitation.expires_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                update(CompanyInvitation)
+                .where(CompanyInvitation.id.in_(expired_ids))
+                .values(status=InvitationStatus.EXPIRED, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            return result.rowcount or 0
+    
+    async def run_once(self) -> int:
+        """Один проход: обработать все просроченные приглашения пачками"""
+        now = datetime.utcnow()
+        expired = 0
+        batches = 0
+        while True:
+            count = await self._expire_batch(now)
+            expired += count
+            batches += 1
+            if count < self.batch_size:
+                break
+            # Отдаем управление event loop между пачками
+            await asyncio.sleep(0)
+        
+        self.runs += 1
+        self.total_expired += expired
+        self.last_run_at = now
+        self.last_run_expired = expired
+        self.last_run_batches = batches
+        if expired:
+            print(f"✅ Invitation sweeper: {expired} invitations expired in {batches} batches")
+        return expired
+    
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Invitation sweeper error: {e}")
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        """Запустить периодическую задачу"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            print(f"✅ Invitation sweeper started (every {self.interval}s)")
+    
+    async def stop(self):
+        """Остановить периодическую задачу"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    def stats(self) -> Dict:
+        """Статистика работы"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "total_expired": self.total_expired,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_run_expired": self.last_run_expired,
+            "last_run_batches": self.last_run_batches,
+            "last_error": self.last_error,
+        }
+
+
+# Глобальный экземпляр сервиса
+invitation_sweeper = InvitationSweeper(
+    interval=settings.INVITATION_SWEEP_INTERVAL_SECONDS,
+    batch_size=settings.INVITATION_SWEEP_BATCH_SIZE,
+)
@@ -0,0 +1,81 @@
+"""
+Прерываемые операции с почтовым сервером
+
+imaplib/smtplib нельзя отменить из другого потока, поэтому по таймауту
+операция прерывается закрытием ее сокета: пулы IMAP/SMTP регистрируют
+выданное соединение в текущем MailCall, а MailExecutor при таймауте
+вызывает abort(). Блокирующее чтение или запись сразу завершается
+ошибкой, соединение отбрасывается, а повтор операции запрещен.
+"""
+
+import socket
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
+
+
+class MailAbortedError(Exception):
+    """Операция прервана по таймауту"""
+    pass
+
+
+_local = threading.local()
+
+
+def current_mail_call() -> Optional["MailCall"]:
+    """Операция, выполняемая в текущем потоке пула почты"""
+    return getattr(_local, "call", None)
+
+
+def _shutdown(sock: Optional[socket.socket]):
+    if sock is None:
+        return
+    try:
+        # Метод базового класса: у SSLSocket shutdown() сбрасывает TLS состояние,
+        # которым в этот момент пользуется поток операции
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class MailCall:
+    """Операция в пуле потоков почты и сокеты, через которые она работает"""
+
+    def __init__(self):
+        self.aborted = False
+        self.future: Optional[Future] = None
+        self._sockets: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """Выполнить func в текущем потоке от имени этой операции"""
+        _local.call = self
+        try:
+            if self.aborted:
+                raise MailAbortedError("Mail operation aborted")
+            return func(*args)
+        finally:
+            _local.call = None
+
+    def attach(self, sock: Optional[socket.socket]):
+        """Зарегистрировать сокет выданного соединения"""
+        with self._lock:
+            if not self.aborted:
+                self._sockets.append(sock)
+                return
+        _shutdown(sock)
+
+    def detach(self, sock: Optional[socket.socket]) -> bool:
+        """Снять регистрацию перед возвратом соединения; True - операция прервана"""
+        with self._lock:
+            if sock in self._sockets:
+                self._sockets.remove(sock)
+            return self.aborted
+
+    def abort(self):
+        """Прервать операцию: закрыть ее сокеты, новые соединения не выдавать"""
+        with self._lock:
+            self.aborted = True
+            sockets, self._sockets = self._sockets, []
+        for sock in sockets:
+            _shutdown(sock)
@@ -0,0 +1,325 @@
+"""
+Push-уведомления о новой почте через IMAP IDLE
+
+Для ящиков с открытым потоком событий (GET /mailbox/events) держится
+одно IDLE соединение в отдельном потоке. Когда сервер сообщает об
+изменениях (EXISTS, EXPUNGE, FETCH FLAGS), папка инкрементально
+синхронизируется с локальным индексом, а подписчикам уходит событие.
+Пока ящик наблюдается, фоновая синхронизация при открытии списка писем
+не нужна - индекс обновляется по событиям сервера.
+
+Число IDLE соединений ограничено; при нехватке закрывается давно
+неиспользуемое (LRU), в первую очередь без подписчиков.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from imapclient import IMAPClient
+
+from app.core.config import settings
+from app.services.async_email_service import AsyncEmailService
+from app.services.email_service import mailbox_passwords
+from app.services.mail_sync import mailbox_sync
+
+
+WatchKey = Tuple[str, str]
+
+# Ответы IDLE, после которых папку нужно синхронизировать
+CHANGE_RESPONSES = {b"EXISTS", b"EXPUNGE", b"FETCH", b"VANISHED"}
+
+
+class _IdleWatcher:
+    """IDLE соединение одного ящика и подписчики его событий"""
+
+    def __init__(self, user_id: int, email_address: str, folder: str):
+        self.user_id = user_id
+        self.email_address = email_address
+        self.folder = folder
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.stop_event = threading.Event()
+        self.reconnect = False
+        self.thread: Optional[threading.Thread] = None
+        self.connected = False
+        self.idle_since = time.monotonic()
+        self.dirty = False
+        self.sync_task: Optional[asyncio.Task] = None
+
+
+class MailIdleSupervisor:
+    """Пул IDLE соединений с ограничением и вытеснением LRU"""
+
+    def __init__(
+        self,
+        max_connections: int,
+        renew_interval: float,
+        check_interval: float,
+        linger: float,
+        queue_size: int,
+        connect_timeout: float,
+        use_ssl: bool = True,
+    ):
+        self.max_connections = max_connections
+        self.renew_interval = renew_interval
+        self.check_interval = check_interval
+        self.linger = linger
+        self.queue_size = queue_size
+        self.connect_timeout = connect_timeout
+        self.use_ssl = use_ssl
+        self._watchers: "OrderedDict[WatchKey, _IdleWatcher]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self.started = 0
+        self.evicted = 0
+        self.notifications = 0
+        self.events_sent = 0
+        self.events_dropped = 0
+        self.connection_errors = 0
+        self.last_error: Optional[str] = None
+
+    # Подписки
+
+    def subscribe(self, user_id: int, email_address: str, folder: str) -> asyncio.Queue:
+        """Подписаться на события папки (запускает IDLE для ящика при необходимости)"""
+        self._loop = asyncio.get_running_loop()
+        key = (email_address, folder)
+        watcher = self._watchers.get(key)
+        if watcher is None:
+            if len(self._watchers) >= self.max_connections:
+                self._evict()
+            watcher = _IdleWatcher(user_id, email_address, folder)
+            self._watchers[key] = watcher
+            self._start_watcher(watcher)
+        self._watchers.move_to_end(key)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        watcher.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, email_address: str, folder: str, queue: asyncio.Queue):
+        """Отписаться; соединение закрывается после linger секунд без подписчиков"""
+        watcher = self._watchers.get((email_address, folder))
+        if watcher is None:
+            return
+        watcher.subscribers.discard(queue)
+        if not watcher.subscribers:
+            watcher.idle_since = time.monotonic()
+
+    def is_watching(self, email_address: str, folder: str) -> bool:
+        """Обновляется ли индекс папки по событиям IDLE"""
+        watcher = self._watchers.get((email_address, folder))
+        return watcher is not None and watcher.connected
+
+    def reconnect_user(self, email_address: str):
+        """Переподключить IDLE соединения ящика (например, после смены пароля)"""
+        for (address, _), watcher in self._watchers.items():
+            if address == email_address:
+                watcher.reconnect = True
+
+    def _evict(self):
+        """Закрыть давно неиспользуемое соединение, в первую очередь без подписчиков"""
+        victim = next(
+            (key for key, watcher in self._watchers.items() if not watcher.subscribers),
+            next(iter(self._watchers), None),
+        )
+        if victim is not None:
+            self.evicted += 1
+            self._stop_watcher(self._watchers.pop(victim), "evicted")
+
+    def _publish(self, watcher: _IdleWatcher, event: Optional[Dict]):
+        """Отправить событие подписчикам (None завершает их потоки)"""
+        for queue in list(watcher.subscribers):
+            try:
+                queue.put_nowait(event)
+                self.events_sent += 1
+            except asyncio.QueueFull:
+                # Медленный клиент пропускает событие; следующее все равно
+                # сообщит актуальное состояние папки
+                self.events_dropped += 1
+
+    # Поток IDLE
+
+    def _start_watcher(self, watcher: _IdleWatcher):
+        self.started += 1
+        watcher.thread = threading.Thread(
+            target=self._run_watcher,
+            args=(watcher,),
+            name=f"imap-idle-{watcher.email_address}",
+            daemon=True,
+        )
+        watcher.thread.start()
+
+    def _stop_watcher(self, watcher: _IdleWatcher, reason: str):
+        watcher.stop_event.set()
+        if watcher.sync_task is not None:
+            watcher.sync_task.cancel()
+        self._publish(watcher, {"event": "stopped", "folder": watcher.folder, "reason": reason})
+        self._publish(watcher, None)
+        watcher.subscribers.clear()
+
+    def _notify(self, watcher: _IdleWatcher):
+        """Сообщить event loop об изменениях в папке (вызывается из потока IDLE)"""
+        self.notifications += 1
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._schedule_sync, watcher)
+
+    def _run_watcher(self, watcher: _IdleWatcher):
+        """Тело потока: подключение, IDLE, переподключение с паузой при ошибках"""
+        backoff = 1.0
+        while not watcher.stop_event.is_set():
+            password = mailbox_passwords.get(watcher.email_address)
+            if not password:
+                break
+
+            client: Optional[IMAPClient] = None
+            try:
+                client = IMAPClient(
+                    settings.MAILCOW_IMAP_SERVER,
+                    port=settings.MAILCOW_IMAP_PORT,
+                    ssl=self.use_ssl,
+                    timeout=self.connect_timeout,
+                )
+                client.login(watcher.email_address, password)
+                if not client.has_capability("IDLE"):
+                    self.last_error = "IMAP server does not support IDLE"
+                    break
+                client.select_folder(watcher.folder, readonly=True)
+                watcher.connected = True
+                watcher.reconnect = False
+                backoff = 1.0
+
+                # Изменения, пропущенные до (пере)подключения
+                self._notify(watcher)
+                self._idle(client, watcher)
+            except Exception as e:
+                self.connection_errors += 1
+                self.last_error = str(e)
+                watcher.stop_event.wait(backoff)
+                backoff = min(backoff * 2, 300.0)
+            finally:
+                watcher.connected = False
+                if client is not None:
+                    try:
+                        client.logout()
+                    except Exception:
+                        pass
+
+    def _idle(self, client: IMAPClient, watcher: _IdleWatcher):
+        """IDLE с периодическим продлением (серверы обрывают IDLE через ~30 минут)"""
+        while not watcher.stop_event.is_set() and not watcher.reconnect:
+            client.idle()
+            renew_at = time.monotonic() + self.renew_interval
+            try:
+                while (
+                    not watcher.stop_event.is_set()
+                    and not watcher.reconnect
+                    and time.monotonic() < renew_at
+                ):
+                    responses = client.idle_check(timeout=self.check_interval)
+                    if any(
+                        isinstance(response, tuple) and len(response) > 1 and response[1] in CHANGE_RESPONSES
+                        for response in responses
+                    ):
+                        self._notify(watcher)
+            finally:
+                client.idle_done()
+
+    # Синхронизация по событиям
+
+    def _schedule_sync(self, watcher: _IdleWatcher):
+        """Синхронизировать папку; события во время синхронизации объединяются"""
+        watcher.dirty = True
+        if watcher.sync_task is None or watcher.sync_task.done():
+            watcher.sync_task = asyncio.create_task(self._sync(watcher))
+
+    async def _sync(self, watcher: _IdleWatcher):
+        while watcher.dirty and not watcher.stop_event.is_set():
+            watcher.dirty = False
+            password = mailbox_passwords.get(watcher.email_address)
+            if not password:
+                return
+            try:
+                result = await mailbox_sync.sync_folder(
+                    watcher.user_id, AsyncEmailService(watcher.email_address, password), watcher.folder
+                )
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ IMAP IDLE sync error for {watcher.email_address}: {e}")
+                return
+            if result["added"] or result["removed"] or result["flags_updated"] or result["reset"]:
+                self._publish(watcher, {"event": "mailbox", **result})
+
+    # Обслуживание
+
+    async def _loop_prune(self):
+        while True:
+            await asyncio.sleep(min(self.linger, 60))
+            now = time.monotonic()
+            for key, watcher in list(self._watchers.items()):
+                if not watcher.subscribers and now - watcher.idle_since >= self.linger:
+                    self._stop_watcher(self._watchers.pop(key), "inactive")
+                elif not watcher.thread.is_alive():
+                    # Поток завершился сам (нет пароля, сервер без IDLE)
+                    self._stop_watcher(self._watchers.pop(key), "unavailable")
+
+    def start(self):
+        """Запустить закрытие неактивных IDLE соединений"""
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._loop_prune())
+            print(f"✅ IMAP IDLE supervisor started (max {self.max_connections} connections)")
+
+    async def stop(self):
+        """Остановить все IDLE соединения"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        watchers = list(self._watchers.values())
+        self._watchers.clear()
+        for watcher in watchers:
+            self._stop_watcher(watcher, "shutdown")
+        threads = [watcher.thread for watcher in watchers if watcher.thread is not None]
+        await asyncio.to_thread(self._join, threads, self.check_interval + 5)
+
+    @staticmethod
+    def _join(threads: List[threading.Thread], timeout: float):
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def stats(self) -> Dict:
+        """Статистика IDLE соединений"""
+        watchers = list(self._watchers.values())
+        return {
+            "watchers": len(watchers),
+            "connected": sum(1 for watcher in watchers if watcher.connected),
+            "subscribers": sum(len(watcher.subscribers) for watcher in watchers),
+            "max_connections": self.max_connections,
+            "started": self.started,
+            "evicted": self.evicted,
+            "notifications": self.notifications,
+            "events_sent": self.events_sent,
+            "events_dropped": self.events_dropped,
+            "connection_errors": self.connection_errors,
+            "last_error": self.last_error,
+        }
+
+
+# Глобальный экземпляр сервиса
+mail_idle = MailIdleSupervisor(
+    max_connections=settings.IMAP_IDLE_MAX_CONNECTIONS,
+    renew_interval=settings.IMAP_IDLE_RENEW_SECONDS,
+    check_interval=settings.IMAP_IDLE_CHECK_INTERVAL,
+    linger=settings.IMAP_IDLE_LINGER_SECONDS,
+    queue_size=settings.MAIL_EVENTS_QUEUE_SIZE,
+    connect_timeout=settings.IMAP_CONNECT_TIMEOUT,
+    use_ssl=settings.MAILCOW_IMAP_SSL,
+)
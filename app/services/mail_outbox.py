@@ -0,0 +1,369 @@
+"""
+Очередь исходящих писем
+
+POST /mailbox/emails/send сохраняет письмо в таблицу outbound_emails и
+сразу отвечает; фоновая задача забирает готовые письма пачками
+(FOR UPDATE SKIP LOCKED) и отправляет их через пул SMTP соединений.
+Временные ошибки повторяются с экспоненциальной паузой, отказ сервера
+по письму (5xx, неверные получатели) завершает отправку статусом failed.
+
+Пароль ящика берется из хранилища паролей процесса; пока он не задан
+(например, после перезапуска), письмо ждет в очереди, не расходуя
+попыток; так же ждет письмо, для которого не нашлось свободного
+соединения в пуле SMTP. Если ответ сервера на саму отправку не получен
+(таймаут), письмо могло быть принято - оно не повторяется, а
+завершается статусом failed с пояснением, чтобы не отправить его дважды.
+"""
+
+import asyncio
+import smtplib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import OutboundEmail, OutboundEmailStatus
+from app.services.async_email_service import AsyncEmailService, MailTimeoutError
+from app.services.email_service import MailDeliveryUnknownError, mailbox_passwords
+from app.services.smtp_pool import SmtpPoolExhaustedError
+
+
+class MailOutbox:
+    """Сохранение писем в очередь и фоновая отправка с повторами"""
+
+    def __init__(
+        self,
+        concurrency: int,
+        batch_size: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_base: int,
+        retry_max: int,
+        sending_lease: int,
+    ):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.sending_lease = sending_lease
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.unknown_outcome = 0
+        self.waiting_password = 0
+        self.pool_exhausted = 0
+        self.last_error: Optional[str] = None
+
+    # Постановка в очередь и статус
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        from_addr: str,
+        to: str,
+        subject: str,
+        body: str,
+        cc: Optional[str] = None,
+        bcc: Optional[str] = None,
+        is_html: bool = False
+    ) -> OutboundEmail:
+        """Сохранить письмо в очередь отправки"""
+        message = OutboundEmail(
+            user_id=user_id,
+            from_addr=from_addr,
+            to_addr=to,
+            cc=cc,
+            bcc=bcc,
+            subject=subject,
+            body=body,
+            is_html=is_html,
+            status=OutboundEmailStatus.QUEUED,
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc),
+        )
+        db.add(message)
+        await db.commit()
+        await db.refresh(message)
+
+        self.enqueued += 1
+        if self._wake is not None:
+            self._wake.set()
+        return message
+
+    async def get(self, db: AsyncSession, user_id: int, message_id: int) -> Optional[OutboundEmail]:
+        """Письмо пользователя из очереди"""
+        result = await db.execute(
+            select(OutboundEmail).where(OutboundEmail.id == message_id, OutboundEmail.user_id == user_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def list_for_user(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        limit: int,
+        status: Optional[OutboundEmailStatus] = None
+    ) -> List[OutboundEmail]:
+        """Последние письма пользователя, новые сначала"""
+        query = select(OutboundEmail).where(OutboundEmail.user_id == user_id)
+        if status is not None:
+            query = query.where(OutboundEmail.status == status)
+        query = query.order_by(OutboundEmail.created_at.desc(), OutboundEmail.id.desc()).limit(limit)
+        return (await db.execute(query)).scalars().all()
+
+    @staticmethod
+    def to_item(message: OutboundEmail) -> Dict:
+        """Письмо очереди в формате API"""
+        return {
+            "id": message.id,
+            "to": message.to_addr,
+            "cc": message.cc,
+            "subject": message.subject,
+            "status": message.status.value,
+            "attempts": message.attempts,
+            "last_error": message.last_error,
+            "next_attempt_at": message.next_attempt_at if message.status == OutboundEmailStatus.QUEUED else None,
+            "created_at": message.created_at,
+            "sent_at": message.sent_at,
+        }
+
+    # Отправка
+
+    async def _claim(self) -> List[Dict]:
+        """Забрать пачку готовых писем и продлить им аренду на время отправки"""
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as session:
+            # SENDING с истекшей арендой - письма упавшего воркера
+            claimable = (
+                select(OutboundEmail.id)
+                .where(
+                    OutboundEmail.status.in_([OutboundEmailStatus.QUEUED, OutboundEmailStatus.SENDING]),
+                    OutboundEmail.next_attempt_at <= now
+                )
+                .order_by(OutboundEmail.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            ids = (await session.execute(claimable)).scalars().all()
+            if not ids:
+                return []
+
+            await session.execute(
+                update(OutboundEmail)
+                .where(OutboundEmail.id.in_(ids))
+                .values(
+                    status=OutboundEmailStatus.SENDING,
+                    attempts=OutboundEmail.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=self.sending_lease),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(
+                select(
+                    OutboundEmail.id, OutboundEmail.from_addr, OutboundEmail.to_addr,
+                    OutboundEmail.cc, OutboundEmail.bcc, OutboundEmail.subject,
+                    OutboundEmail.body, OutboundEmail.is_html, OutboundEmail.attempts,
+                ).where(OutboundEmail.id.in_(ids))
+            )
+            rows = [dict(row._mapping) for row in result]
+            await session.commit()
+            return rows
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        """Повтор не поможет: сервер отверг само письмо"""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        if isinstance(error, smtplib.SMTPAuthenticationError):
+            # Пользователь может задать верный пароль - письмо ждет
+            return False
+        return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+    @staticmethod
+    def _is_outcome_unknown(error: Exception) -> bool:
+        """Письмо могло быть принято сервером - повтор может его продублировать"""
+        if isinstance(error, MailTimeoutError):
+            # Не начатая отправка снята с очереди пула; прерванная до передачи
+            # письма завершилась другой ошибкой (__cause__)
+            if not error.started:
+                return False
+            return error.__cause__ is None or isinstance(error.__cause__, MailDeliveryUnknownError)
+        return isinstance(error, MailDeliveryUnknownError)
+
+    @staticmethod
+    def _is_pool_exhausted(error: Exception) -> bool:
+        """Письмо не отправлялось: все соединения пула SMTP заняты"""
+        if isinstance(error, MailTimeoutError):
+            return isinstance(error.__cause__, SmtpPoolExhaustedError)
+        return isinstance(error, SmtpPoolExhaustedError)
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.retry_base * 2 ** max(attempts - 1, 0), self.retry_max))
+
+    async def _deliver(self, row: Dict):
+        """Отправить одно письмо и записать результат"""
+        password = mailbox_passwords.get(row["from_addr"])
+        if not password:
+            # Попытка не засчитывается: письмо ждет, пока пользователь задаст пароль
+            self.waiting_password += 1
+            await self._update(
+                row["id"],
+                status=OutboundEmailStatus.QUEUED,
+                attempts=OutboundEmail.attempts - 1,
+                next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=self.retry_base),
+                last_error="Mailbox password not set",
+            )
+            return
+
+        error: Optional[Exception] = None
+        try:
+            await AsyncEmailService(row["from_addr"], password).send_email(
+                to=row["to_addr"],
+                subject=row["subject"],
+                body=row["body"],
+                cc=row["cc"],
+                bcc=row["bcc"],
+                is_html=bool(row["is_html"]),
+            )
+        except Exception as e:
+            error = e
+
+        now = datetime.now(timezone.utc)
+        if error is None:
+            values = {
+                "status": OutboundEmailStatus.SENT,
+                "sent_at": now,
+                "last_error": None,
+            }
+            self.sent += 1
+        elif self._is_pool_exhausted(error):
+            # Как и без пароля, попытка не засчитывается: письмо не передавалось
+            values = {
+                "status": OutboundEmailStatus.QUEUED,
+                "attempts": OutboundEmail.attempts - 1,
+                "next_attempt_at": now + timedelta(seconds=self.retry_base),
+                "last_error": str(error),
+            }
+            self.pool_exhausted += 1
+        elif self._is_outcome_unknown(error):
+            values = {
+                "status": OutboundEmailStatus.FAILED,
+                "last_error": f"Delivery outcome unknown, not retried to avoid a duplicate: {error}",
+            }
+            self.failed += 1
+            self.unknown_outcome += 1
+            print(f"⚠️ Outbound email {row['id']} may have been delivered, not retrying: {error}")
+        elif self._is_permanent(error) or row["attempts"] >= self.max_attempts:
+            values = {
+                "status": OutboundEmailStatus.FAILED,
+                "last_error": str(error),
+            }
+            self.failed += 1
+            print(f"❌ Outbound email {row['id']} failed after {row['attempts']} attempts: {error}")
+        else:
+            values = {
+                "status": OutboundEmailStatus.QUEUED,
+                "next_attempt_at": now + self._retry_delay(row["attempts"]),
+                "last_error": str(error),
+            }
+            self.retried += 1
+
+        await self._update(row["id"], **values)
+
+    async def _update(self, message_id: int, **values):
+        """Записать результат попытки отправки"""
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(OutboundEmail)
+                .where(OutboundEmail.id == message_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def run_once(self) -> int:
+        """Отправить одну пачку готовых писем"""
+        rows = await self._claim()
+        if rows:
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def deliver(row: Dict):
+                async with semaphore:
+                    await self._deliver(row)
+
+            await asyncio.gather(*(deliver(row) for row in rows))
+        return len(rows)
+
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                claimed = await self.run_once()
+                self.last_error = None
+                if claimed:
+                    # Очередь не пуста - следующая пачка без ожидания
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"❌ Mail outbox error: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Запустить фоновую отправку"""
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+            print(f"✅ Mail outbox started ({self.concurrency} concurrent sends)")
+
+    async def stop(self):
+        """Остановить фоновую отправку (недоотправленные письма вернутся в очередь по аренде)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        """Статистика отправки"""
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "max_attempts": self.max_attempts,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "unknown_outcome": self.unknown_outcome,
+            "waiting_password": self.waiting_password,
+            "pool_exhausted": self.pool_exhausted,
+            "last_error": self.last_error,
+        }
+
+
+# Глобальный экземпляр сервиса
+mail_outbox = MailOutbox(
+    concurrency=settings.MAIL_OUTBOX_CONCURRENCY,
+    batch_size=settings.MAIL_OUTBOX_BATCH_SIZE,
+    poll_interval=settings.MAIL_OUTBOX_POLL_INTERVAL,
+    max_attempts=settings.MAIL_OUTBOX_MAX_ATTEMPTS,
+    retry_base=settings.MAIL_OUTBOX_RETRY_BASE_SECONDS,
+    retry_max=settings.MAIL_OUTBOX_RETRY_MAX_SECONDS,
+    sending_lease=settings.MAIL_OUTBOX_SENDING_LEASE_SECONDS,
+)
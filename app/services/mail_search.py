@@ -0,0 +1,173 @@
+"""
+Полнотекстовый поиск по локальному индексу почты
+
+IMAP SEARCH TEXT на сервере перебирает письма целиком и на больших ящиках
+отвечает секундами. Поиск идет по таблице mail_messages: заголовки и
+начало текста писем уже загружены синхронизацией.
+
+PostgreSQL: взвешенный tsvector (тема, отправитель, получатели, текст)
+в столбце search_vector с GIN индексом, запрос websearch_to_tsquery
+(фразы в кавычках, OR, исключение через -), ранжирование ts_rank_cd.
+Другие СУБД (разработка, тесты): подстрочный поиск каждого слова с
+ранжированием по полю совпадения.
+"""
+
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, func, literal, literal_column, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import LatencyHistogram
+from app.models import MailMessage
+from app.services.mail_sync import mailbox_sync
+
+
+_SEARCH_CONFIG = literal_column("'simple'::regconfig")
+
+
+def _postgres_match(query: str):
+    """Условие и ранг полнотекстового поиска PostgreSQL"""
+    tsquery = func.websearch_to_tsquery(_SEARCH_CONFIG, query)
+    return MailMessage.search_vector.op("@@")(tsquery), func.ts_rank_cd(MailMessage.search_vector, tsquery)
+
+
+def _substring_match(query: str):
+    """Условие и ранг без полнотекстового индекса: все слова запроса, тема весомее текста"""
+    terms = [term for term in (value.strip('"') for value in query.split()) if term]
+    conditions = []
+    rank = literal(0)
+    for term in terms:
+        in_subject = MailMessage.subject.icontains(term, autoescape=True)
+        in_from = MailMessage.from_addr.icontains(term, autoescape=True)
+        in_to = MailMessage.to_addr.icontains(term, autoescape=True)
+        in_body = MailMessage.body_text.icontains(term, autoescape=True)
+        conditions.append(or_(in_subject, in_from, in_to, in_body))
+        rank = rank + case((in_subject, 1.0), else_=0) + case((in_from, 0.4), else_=0) \
+            + case((in_to, 0.2), else_=0) + case((in_body, 0.1), else_=0)
+    return and_(*conditions), rank
+
+
+def _month(dialect_name: str):
+    """Месяц отправки письма (YYYY-MM) для фасета по дате"""
+    # Формат литералом: одно и то же выражение в SELECT и GROUP BY
+    if dialect_name == "postgresql":
+        return func.to_char(MailMessage.sent_at, literal_column("'YYYY-MM'"))
+    if dialect_name == "sqlite":
+        return func.strftime(literal_column("'%Y-%m'"), MailMessage.sent_at)
+    return None
+
+
+class MailSearchService:
+    """Ранжированный поиск по письмам пользователя с фильтрами и фасетами"""
+
+    def __init__(self, facet_size: int):
+        self.facet_size = facet_size
+        self.latency = LatencyHistogram()
+        self.searches = 0
+
+    async def search(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        query: str,
+        folder: Optional[str] = None,
+        sender: Optional[str] = None,
+        subject: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        limit: int = 20,
+        offset: int = 0,
+        with_facets: bool = False
+    ) -> Dict:
+        """
+        Страница результатов, лучшие совпадения сначала
+
+        Фильтры folder/sender/subject/date_from/date_to сужают выборку;
+        фасеты (папки, отправители, темы, месяцы) считаются по всей выборке
+        и только по запросу - это дополнительные агрегирующие запросы.
+        """
+        start = time.perf_counter()
+        dialect_name = db.bind.dialect.name
+
+        if dialect_name == "postgresql":
+            match, rank = _postgres_match(query)
+        else:
+            match, rank = _substring_match(query)
+
+        conditions = [MailMessage.user_id == user_id, match]
+        if folder:
+            conditions.append(MailMessage.folder == folder)
+        if sender:
+            conditions.append(MailMessage.from_addr.icontains(sender, autoescape=True))
+        if subject:
+            conditions.append(MailMessage.subject.icontains(subject, autoescape=True))
+        if date_from is not None:
+            conditions.append(MailMessage.sent_at >= date_from)
+        if date_to is not None:
+            conditions.append(MailMessage.sent_at < date_to)
+
+        rows = (await db.execute(
+            select(MailMessage, rank.label("rank"))
+            .where(*conditions)
+            .order_by(rank.desc(), MailMessage.sent_at.desc().nullslast(), MailMessage.id.desc())
+            .offset(offset)
+            .limit(limit + 1)
+        )).all()
+
+        results = [
+            {**mailbox_sync.to_email_item(message), "folder": message.folder, "score": round(float(score), 4)}
+            for message, score in rows[:limit]
+        ]
+
+        facets = None
+        if with_facets:
+            facets = await self._facets(db, conditions, dialect_name)
+
+        elapsed = time.perf_counter() - start
+        self.latency.observe(elapsed)
+        self.searches += 1
+
+        return {
+            "query": query,
+            "results": results,
+            "limit": limit,
+            "offset": offset,
+            "has_more": len(rows) > limit,
+            "facets": facets,
+            "took_ms": round(elapsed * 1000, 2),
+        }
+
+    async def _facets(self, db: AsyncSession, conditions: List, dialect_name: str) -> Dict[str, List[Dict]]:
+        """Число найденных писем по папкам, отправителям, темам и месяцам"""
+        columns = {"folder": MailMessage.folder, "from": MailMessage.from_addr, "subject": MailMessage.subject}
+        month = _month(dialect_name)
+        if month is not None:
+            columns["month"] = month
+
+        facets = {}
+        for name, column in columns.items():
+            count = func.count(MailMessage.id)
+            result = await db.execute(
+                select(column.label("value"), count.label("count"))
+                .where(*conditions)
+                .group_by(column)
+                .order_by(count.desc())
+                .limit(self.facet_size)
+            )
+            facets[name] = [
+                {"value": value, "count": value_count}
+                for value, value_count in result
+                if value is not None
+            ]
+        return facets
+
+    def stats(self) -> Dict:
+        """Статистика поисковых запросов"""
+        return {"searches": self.searches, "facet_size": self.facet_size, **self.latency.snapshot()}
+
+
+# Глобальный экземпляр сервиса
+mail_search = MailSearchService(facet_size=settings.MAIL_SEARCH_FACET_SIZE)
@@ -0,0 +1,389 @@
+"""
+Инкрементальная синхронизация почтовых папок с локальным индексом
+
+Для каждой папки хранится UIDVALIDITY, наибольший загруженный UID и
+HIGHESTMODSEQ; с сервера забираются только новые письма и изменения
+флагов, пачками по MAIL_SYNC_FETCH_BATCH_SIZE писем. Списки писем и
+пагинация обслуживаются из таблицы mail_messages, поэтому их задержка
+не зависит от IMAP сервера.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, literal_column, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import MailFolderState, MailMessage
+from app.models.mail import MAIL_SEARCH_DOCUMENT
+from app.services.async_email_service import AsyncEmailService
+
+
+# Размер пачки для IN (...) при удалении и обновлении строк
+_STATEMENT_CHUNK = 1000
+
+# Сколько раз подряд пачка запрашивается заново, если состояние папки
+# успел изменить другой процесс
+_MAX_CONFLICTS = 3
+
+
+def _chunks(values: List[int], size: int = _STATEMENT_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class MailboxSyncService:
+    """Синхронизация папок IMAP и чтение локального индекса"""
+
+    def __init__(self, min_interval: int, batch_size: int):
+        self.min_interval = min_interval
+        self.batch_size = batch_size
+        self._locks: Dict[Tuple[int, str], asyncio.Lock] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.syncs = 0
+        self.resets = 0
+        self.messages_added = 0
+        self.messages_removed = 0
+        self.flags_updated = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    # Синхронизация
+
+    async def sync_folder(
+        self,
+        user_id: int,
+        email_service: AsyncEmailService,
+        folder: str,
+        rounds: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ) -> Dict:
+        """
+        Синхронизировать папку пачками (параллельные вызовы для папки выполняются по очереди)
+
+        Каждая пачка - отдельный вызов IMAP и отдельная транзакция, поэтому
+        прерванная синхронизация продолжается с сохраненного состояния.
+        Соединение с базой не удерживается на время обмена с IMAP: состояние
+        читается короткой сессией, а перед записью пачки перечитывается -
+        если папку тем временем синхронизировал другой процесс (или сменился
+        UIDVALIDITY), пачка не записывается и запрашивается заново.
+        rounds - не больше стольких пачек; complete=False - остаток
+        догружается следующим вызовом.
+        """
+        total = {
+            "folder": folder,
+            "reset": False,
+            "added": 0,
+            "removed": 0,
+            "flags_updated": 0,
+            "messages": 0,
+            "complete": False,
+        }
+        lock = self._locks.setdefault((user_id, folder), asyncio.Lock())
+        async with lock:
+            done = 0
+            conflicts = 0
+            while rounds is None or done < rounds:
+                state = await self.load_state(user_id, folder)
+                changes = await email_service.sync_folder_changes(
+                    folder,
+                    state.uidvalidity if state else None,
+                    state.highest_uid if state else 0,
+                    state.highest_modseq if state else None,
+                    state.message_count if state else 0,
+                    batch_size or self.batch_size,
+                    state.backfill_uid if state else None,
+                    done == 0,
+                )
+
+                async with AsyncSessionLocal() as session:
+                    current = await self.get_state(session, user_id, folder, for_update=True)
+                    if self._position(current) != self._position(state):
+                        await session.rollback()
+                        conflicts += 1
+                        if conflicts >= _MAX_CONFLICTS:
+                            break
+                        continue
+                    result = await self._apply_changes(session, user_id, folder, current, changes)
+                    await session.commit()
+
+                done += 1
+                total["reset"] = total["reset"] or result["reset"]
+                for key in ("added", "removed", "flags_updated"):
+                    total[key] += result[key]
+                total["messages"] = result["messages"]
+                if not changes["more"]:
+                    total["complete"] = True
+                    break
+
+        self.syncs += 1
+        return total
+
+    async def sync_first_batch(
+        self,
+        user_id: int,
+        email_service: AsyncEmailService,
+        folder: str,
+        batch_size: Optional[int] = None
+    ) -> Dict:
+        """Одна пачка синхронизации сразу, остаток - в фоне"""
+        result = await self.sync_folder(user_id, email_service, folder, rounds=1, batch_size=batch_size)
+        if not result["complete"]:
+            self.schedule(user_id, email_service, folder)
+        return result
+
+    @staticmethod
+    def _position(state: Optional[MailFolderState]) -> Optional[Tuple]:
+        """То, относительно чего запрошена пачка изменений"""
+        if state is None:
+            return None
+        return state.uidvalidity, state.highest_uid, state.backfill_uid
+
+    async def _apply_changes(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        folder: str,
+        state: Optional[MailFolderState],
+        changes: Dict
+    ) -> Dict:
+        """Записать изменения с сервера в индекс"""
+        in_folder = (MailMessage.user_id == user_id, MailMessage.folder == folder)
+
+        if changes["reset"]:
+            self.resets += 1
+            await session.execute(delete(MailMessage).where(*in_folder))
+
+        # Новые письма (UID, уже попавшие в индекс параллельно, пропускаются)
+        new_rows = []
+        if changes["new"]:
+            new_uids = [int(item["id"]) for item in changes["new"]]
+            existing = set()
+            for chunk in _chunks(new_uids):
+                result = await session.execute(
+                    select(MailMessage.uid).where(*in_folder, MailMessage.uid.in_(chunk))
+                )
+                existing.update(result.scalars().all())
+            new_rows = [
+                {
+                    "user_id": user_id,
+                    "folder": folder,
+                    "uid": int(item["id"]),
+                    "subject": item["subject"],
+                    "from_addr": item["from"],
+                    "to_addr": item["to"],
+                    "date": item["date"],
+                    "sent_at": item["sent_at"],
+                    "preview": item["preview"],
+                    "body_text": item.get("body_text"),
+                    "has_attachments": item["has_attachments"],
+                    "is_read": item["is_read"],
+                    "flags": item["flags"],
+                    "size": item["size"],
+                }
+                for item in changes["new"]
+                if int(item["id"]) not in existing
+            ]
+            if new_rows:
+                await session.execute(insert(MailMessage), new_rows)
+                if session.bind.dialect.name == "postgresql":
+                    # Поисковый документ строится в базе из только что вставленных строк
+                    for chunk in _chunks([row["uid"] for row in new_rows]):
+                        await session.execute(
+                            update(MailMessage)
+                            .where(*in_folder, MailMessage.uid.in_(chunk))
+                            .values(search_vector=literal_column(MAIL_SEARCH_DOCUMENT))
+                            .execution_options(synchronize_session=False)
+                        )
+
+        # Изменения флагов: одно UPDATE на каждый набор флагов
+        by_flags: Dict[Tuple[str, ...], List[int]] = {}
+        for uid, flags in changes["flags"].items():
+            by_flags.setdefault(tuple(sorted(flags)), []).append(uid)
+        for flags, uids in by_flags.items():
+            for chunk in _chunks(uids):
+                await session.execute(
+                    update(MailMessage)
+                    .where(*in_folder, MailMessage.uid.in_(chunk))
+                    .values(flags=list(flags), is_read="\\Seen" in flags)
+                    .execution_options(synchronize_session=False)
+                )
+
+        # Удаленные на сервере письма
+        removed: List[int] = []
+        if changes["all_uids"] is not None:
+            server_uids = set(changes["all_uids"])
+            local_uids = (await session.execute(select(MailMessage.uid).where(*in_folder))).scalars().all()
+            removed = [uid for uid in local_uids if uid not in server_uids]
+            for chunk in _chunks(removed):
+                await session.execute(delete(MailMessage).where(*in_folder, MailMessage.uid.in_(chunk)))
+
+        highest_uid = max(
+            [0 if changes["reset"] or state is None else state.highest_uid]
+            + [int(item["id"]) for item in changes["new"]]
+        )
+        now = datetime.now(timezone.utc)
+        if state is None:
+            state = MailFolderState(user_id=user_id, folder=folder)
+            session.add(state)
+        state.uidvalidity = changes["uidvalidity"]
+        state.highest_uid = highest_uid
+        state.highest_modseq = changes["highest_modseq"]
+        state.backfill_uid = changes["backfill_uid"]
+        state.message_count = changes["messages"]
+        state.last_synced_at = now
+
+        self.messages_added += len(new_rows)
+        self.messages_removed += len(removed)
+        self.flags_updated += len(changes["flags"])
+        return {
+            "folder": folder,
+            "reset": changes["reset"],
+            "added": len(new_rows),
+            "removed": len(removed),
+            "flags_updated": len(changes["flags"]),
+            "messages": changes["messages"],
+        }
+
+    def is_stale(self, state: MailFolderState) -> bool:
+        """Пора ли синхронизировать папку снова"""
+        if state.last_synced_at is None:
+            return True
+        last_synced_at = state.last_synced_at
+        if last_synced_at.tzinfo is None:
+            last_synced_at = last_synced_at.replace(tzinfo=timezone.utc)
+        return datetime.now(timezone.utc) - last_synced_at >= timedelta(seconds=self.min_interval)
+
+    def schedule(self, user_id: int, email_service: AsyncEmailService, folder: str) -> bool:
+        """Запустить синхронизацию папки в фоне (если она еще не идет)"""
+        key = (user_id, folder)
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            return False
+        self._tasks[key] = asyncio.create_task(self._background_sync(user_id, email_service, folder))
+        return True
+
+    async def _background_sync(self, user_id: int, email_service: AsyncEmailService, folder: str):
+        try:
+            await self.sync_folder(user_id, email_service, folder)
+            self.last_error = None
+        except Exception as e:
+            self.failed += 1
+            self.last_error = str(e)
+            print(f"❌ Mailbox sync error for user {user_id}, folder {folder}: {e}")
+        finally:
+            self._tasks.pop((user_id, folder), None)
+
+    async def stop(self):
+        """Дождаться отмены фоновых синхронизаций"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    # Чтение индекса
+
+    async def get_state(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        folder: str,
+        for_update: bool = False
+    ) -> Optional[MailFolderState]:
+        """Состояние синхронизации папки"""
+        query = select(MailFolderState).where(MailFolderState.user_id == user_id, MailFolderState.folder == folder)
+        if for_update:
+            query = query.with_for_update()
+        return (await db.execute(query)).scalar_one_or_none()
+
+    async def load_state(self, user_id: int, folder: str) -> Optional[MailFolderState]:
+        """Состояние синхронизации папки из отдельной короткой сессии"""
+        async with AsyncSessionLocal() as session:
+            return await self.get_state(session, user_id, folder)
+
+    async def list_messages(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        folder: str,
+        limit: int,
+        before_uid: Optional[int] = None,
+        offset: int = 0
+    ) -> List[MailMessage]:
+        """Страница писем папки, новые сначала (ORDER BY uid DESC)"""
+        query = select(MailMessage).where(MailMessage.user_id == user_id, MailMessage.folder == folder)
+        if before_uid is not None:
+            query = query.where(MailMessage.uid < before_uid)
+        elif offset:
+            query = query.offset(offset)
+        query = query.order_by(MailMessage.uid.desc()).limit(limit)
+        return (await db.execute(query)).scalars().all()
+
+    async def mark_read(self, db: AsyncSession, user_id: int, folder: str, uid: int):
+        """Отметить письмо прочитанным в индексе"""
+        result = await db.execute(
+            select(MailMessage).where(
+                MailMessage.user_id == user_id, MailMessage.folder == folder, MailMessage.uid == uid
+            )
+        )
+        message = result.scalar_one_or_none()
+        if message is not None and not message.is_read:
+            message.is_read = True
+            message.flags = sorted(set(message.flags or []) | {"\\Seen"})
+            await db.commit()
+
+    async def forget_message(self, db: AsyncSession, user_id: int, folder: str, uid: int):
+        """Убрать удаленное письмо из индекса"""
+        result = await db.execute(
+            delete(MailMessage).where(
+                MailMessage.user_id == user_id, MailMessage.folder == folder, MailMessage.uid == uid
+            )
+        )
+        if result.rowcount:
+            await db.execute(
+                update(MailFolderState)
+                .where(MailFolderState.user_id == user_id, MailFolderState.folder == folder)
+                .values(message_count=MailFolderState.message_count - result.rowcount)
+            )
+        await db.commit()
+
+    @staticmethod
+    def to_email_item(message: MailMessage) -> Dict:
+        """Строка индекса в формате списка писем API"""
+        return {
+            "id": str(message.uid),
+            "subject": message.subject or "",
+            "from": message.from_addr or "",
+            "to": message.to_addr or "",
+            "date": message.date or "",
+            "preview": message.preview or "",
+            "has_attachments": bool(message.has_attachments),
+            "is_read": bool(message.is_read),
+            "size": message.size,
+        }
+
+    def stats(self) -> Dict:
+        """Статистика синхронизаций"""
+        return {
+            "min_interval_seconds": self.min_interval,
+            "batch_size": self.batch_size,
+            "running": sum(1 for task in self._tasks.values() if not task.done()),
+            "syncs": self.syncs,
+            "resets": self.resets,
+            "messages_added": self.messages_added,
+            "messages_removed": self.messages_removed,
+            "flags_updated": self.flags_updated,
+            "failed": self.failed,
+            "last_error": self.last_error,
+        }
+
+
+# Глобальный экземпляр сервиса
+mailbox_sync = MailboxSyncService(
+    min_interval=settings.MAIL_SYNC_MIN_INTERVAL_SECONDS,
+    batch_size=settings.MAIL_SYNC_FETCH_BATCH_SIZE,
+)
@@ -3,14 +3,40 @@ MinIO Service для S3-совместимого файлового хранил
 """
 
 from minio import Minio
+from minio.datatypes import PostPolicy
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
-from typing import Optional, BinaryIO
-from datetime import timedelta
+import certifi
+import urllib3
+from typing import Dict, List, Optional, BinaryIO
+from datetime import datetime, timedelta
 from io import BytesIO
 import uuid
+from itertools import islice
 from app.core.config import settings
 
 
+class FileTooLargeError(Exception):
+    """Размер загружаемого файла превышает лимит"""
+    pass
+
+
+class _LimitedReader:
+    """Обертка над потоком, прерывающая чтение при превышении лимита размера"""
+    
+    def __init__(self, stream: BinaryIO, max_size: int):
+        self.stream = stream
+        self.max_size = max_size
+        self.bytes_read = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.max_size:
+            raise FileTooLargeError(f"File exceeds maximum size of {self.max_size} bytes")
+        return data
+
+
 class MinIOService:
     """Сервис для работы с MinIO (S3-compatible storage)"""
     
@@ -18,6 +44,24 @@ class MinIOService:
         self.client: Optional[Minio] = None
         self.bucket_name = settings.MINIO_BUCKET_NAME
     
+    def _create_http_client(self) -> urllib3.PoolManager:
+        """HTTP пул соединений с настраиваемым размером (по умолчанию в minio - 10)"""
+        return urllib3.PoolManager(
+            maxsize=settings.MINIO_HTTP_POOL_SIZE,
+            block=True,
+            timeout=urllib3.Timeout(
+                connect=settings.MINIO_CONNECT_TIMEOUT,
+                read=settings.MINIO_READ_TIMEOUT
+            ),
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=certifi.where(),
+            retries=urllib3.Retry(
+                total=5,
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504]
+            )
+        )
+    
     def connect(self):
         """Подключение к MinIO"""
         try:
@@ -25,7 +69,9 @@ class MinIOService:
                 settings.MINIO_ENDPOINT,
                 access_key=settings.MINIO_ACCESS_KEY,
                 secret_key=settings.MINIO_SECRET_KEY,
-                secure=settings.MINIO_SECURE
+                secure=settings.MINIO_SECURE,
+                region=settings.MINIO_REGION,
+                http_client=self._create_http_client()
             )
             
             # Создать bucket если не существует
@@ -40,6 +86,13 @@ class MinIOService:
             print(f"❌ MinIO connection failed: {e}")
             return False
     
+    @staticmethod
+    def make_object_name(file_name: str, folder: str = "") -> str:
+        """Уникальное имя объекта с сохранением расширения"""
+        file_extension = file_name.split('.')[-1] if '.' in file_name else ''
+        unique_name = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
+        return f"{folder}/{unique_name}" if folder else unique_name
+    
     def upload_file(
         self,
         file_data: BinaryIO,
@@ -64,12 +117,7 @@ class MinIOService:
             return None
         
         try:
-            # Генерируем уникальное имя файла
-            file_extension = file_name.split('.')[-1] if '.' in file_name else ''
-            unique_name = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
-            
-            # Формируем путь с папкой
-            object_name = f"{folder}/{unique_name}" if folder else unique_name
+            object_name = self.make_object_name(file_name, folder)
             
             # Получаем размер файла
             file_data.seek(0, 2)  # Перемещаемся в конец
@@ -91,6 +139,59 @@ class MinIOService:
             print(f"❌ MinIO upload error: {e}")
             return None
     
+    def upload_stream(
+        self,
+        stream: BinaryIO,
+        file_name: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "",
+        max_size: Optional[int] = None,
+        object_name: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Загрузить поток неизвестного размера multipart загрузкой
+        
+        В памяти находится не больше одной части (MINIO_UPLOAD_PART_SIZE).
+        При превышении max_size чтение прерывается, и клиент minio
+        отменяет начатую multipart загрузку.
+        
+        Args:
+            stream: Файловый объект (например, UploadFile.file)
+            file_name: Имя файла
+            content_type: MIME тип файла
+            folder: Папка для организации файлов
+            max_size: Максимальный размер в байтах
+            object_name: Готовый путь объекта (иначе генерируется из file_name и folder)
+        
+        Returns:
+            Путь к файлу или None при ошибке
+        
+        Raises:
+            FileTooLargeError: файл больше max_size
+        """
+        if not self.client:
+            print("❌ MinIO client not connected")
+            return None
+        
+        try:
+            object_name = object_name or self.make_object_name(file_name, folder)
+            data = _LimitedReader(stream, max_size) if max_size is not None else stream
+            
+            self.client.put_object(
+                self.bucket_name,
+                object_name,
+                data,
+                length=-1,
+                part_size=settings.MINIO_UPLOAD_PART_SIZE,
+                content_type=content_type
+            )
+            
+            print(f"✅ File uploaded: {object_name}")
+            return object_name
+        except S3Error as e:
+            print(f"❌ MinIO upload error: {e}")
+            return None
+    
     def download_file(self, object_name: str) -> Optional[bytes]:
         """
         Скачать файл из MinIO
@@ -115,6 +216,30 @@ class MinIOService:
             print(f"❌ MinIO download error: {e}")
             return None
     
+    def open_object(self, object_name: str, request_headers: Optional[Dict[str, str]] = None):
+        """
+        Открыть объект для потокового чтения
+        
+        Args:
+            object_name: Путь к файлу в MinIO
+            request_headers: Заголовки GET запроса (Range, If-Range)
+        
+        Returns:
+            Ответ urllib3 без предзагрузки тела (status 200 или 206).
+            После чтения нужно вызвать close() и release_conn()
+        
+        Raises:
+            S3Error: объект не найден, неверный диапазон и т.д.
+        """
+        if not self.client:
+            raise RuntimeError("MinIO client not connected")
+        
+        return self.client.get_object(
+            self.bucket_name,
+            object_name,
+            request_headers=request_headers
+        )
+    
     def delete_file(self, object_name: str) -> bool:
         """
         Удалить файл из MinIO
@@ -137,10 +262,45 @@ class MinIOService:
             print(f"❌ MinIO delete error: {e}")
             return False
     
+    def delete_files(self, object_names: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Удалить несколько файлов запросами multi-object delete
+        
+        Клиент MinIO отправляет ключи пачками по 1000 в одном
+        POST ?delete запросе. Отсутствующие ключи S3 считает удаленными.
+        
+        Args:
+            object_names: Пути к файлам в MinIO
+        
+        Returns:
+            {путь: None при успехе или текст ошибки}
+        """
+        if not self.client:
+            print("❌ MinIO client not connected")
+            return {object_name: "MinIO client not connected" for object_name in object_names}
+        
+        results: Dict[str, Optional[str]] = {object_name: None for object_name in object_names}
+        try:
+            errors = self.client.remove_objects(
+                self.bucket_name,
+                (DeleteObject(object_name) for object_name in object_names)
+            )
+            # Запросы выполняются лениво, по мере чтения ошибок
+            for error in errors:
+                results[error.name] = f"{error.code}: {error.message}"
+        except S3Error as e:
+            print(f"❌ MinIO batch delete error: {e}")
+            return {object_name: str(e) for object_name in object_names}
+        
+        failed = sum(1 for error in results.values() if error)
+        print(f"✅ Files deleted: {len(results) - failed}, failed: {failed}")
+        return results
+    
     def get_presigned_url(
         self, 
         object_name: str, 
-        expires: timedelta = timedelta(hours=1)
+        expires: timedelta = timedelta(hours=1),
+        request_date: Optional[datetime] = None
     ) -> Optional[str]:
         """
         Получить временную ссылку на файл
@@ -148,6 +308,7 @@ class MinIOService:
         Args:
             object_name: Путь к файлу в MinIO
             expires: Время жизни ссылки
+            request_date: Момент подписи (по умолчанию - текущее время)
         
         Returns:
             URL или None при ошибке
@@ -160,13 +321,116 @@ class MinIOService:
             url = self.client.presigned_get_object(
                 self.bucket_name,
                 object_name,
-                expires=expires
+                expires=expires,
+                request_date=request_date
             )
             return url
         except S3Error as e:
             print(f"❌ MinIO presigned URL error: {e}")
             return None
     
+    def get_presigned_urls(
+        self,
+        object_names: List[str],
+        expires: timedelta = timedelta(hours=1),
+        request_date: Optional[datetime] = None
+    ) -> Dict[str, Optional[str]]:
+        """Подписать ссылки для нескольких файлов (подпись локальная, без запросов к MinIO)"""
+        return {
+            object_name: self.get_presigned_url(object_name, expires, request_date)
+            for object_name in object_names
+        }
+    
+    def get_presigned_put_url(
+        self,
+        object_name: str,
+        expires: timedelta = timedelta(minutes=15)
+    ) -> Optional[str]:
+        """
+        Получить временную ссылку для загрузки файла напрямую в MinIO (PUT)
+        
+        Args:
+            object_name: Путь к файлу в MinIO
+            expires: Время жизни ссылки
+        
+        Returns:
+            URL или None при ошибке
+        """
+        if not self.client:
+            print("❌ MinIO client not connected")
+            return None
+        
+        try:
+            return self.client.presigned_put_object(
+                self.bucket_name,
+                object_name,
+                expires=expires
+            )
+        except S3Error as e:
+            print(f"❌ MinIO presigned PUT error: {e}")
+            return None
+    
+    def get_presigned_post_form(
+        self,
+        object_name: str,
+        content_type: str,
+        max_size: int,
+        expires: timedelta = timedelta(minutes=15)
+    ) -> Optional[Dict]:
+        """
+        Получить POST policy для загрузки файла из браузера напрямую в MinIO
+        
+        Политика ограничивает ключ объекта, Content-Type и размер файла.
+        
+        Args:
+            object_name: Путь к файлу в MinIO
+            content_type: Разрешенный MIME тип
+            max_size: Максимальный размер в байтах
+            expires: Время жизни политики
+        
+        Returns:
+            {"url": ..., "fields": {...}} или None при ошибке
+        """
+        if not self.client:
+            print("❌ MinIO client not connected")
+            return None
+        
+        try:
+            policy = PostPolicy(self.bucket_name, datetime.utcnow() + expires)
+            policy.add_equals_condition("key", object_name)
+            policy.add_equals_condition("Content-Type", content_type)
+            policy.add_content_length_range_condition(1, max_size)
+            fields = self.client.presigned_post_policy(policy)
+            fields["key"] = object_name
+            fields["Content-Type"] = content_type
+            
+            scheme = "https" if settings.MINIO_SECURE else "http"
+            return {
+                "url": f"{scheme}://{settings.MINIO_ENDPOINT}/{self.bucket_name}",
+                "fields": fields
+            }
+        except S3Error as e:
+            print(f"❌ MinIO presigned POST error: {e}")
+            return None
+    
+    def stat_file(self, object_name: str):
+        """
+        Метаданные файла (размер, ETag, Content-Type)
+        
+        Args:
+            object_name: Путь к файлу в MinIO
+        
+        Returns:
+            minio.datatypes.Object или None, если файла нет
+        """
+        if not self.client:
+            return None
+        
+        try:
+            return self.client.stat_object(self.bucket_name, object_name)
+        except S3Error:
+            return None
+    
     def list_files(self, prefix: str = "") -> list:
         """
         Список файлов в bucket
@@ -200,6 +464,40 @@ class MinIOService:
             print(f"❌ MinIO list error: {e}")
             return []
     
+    def list_files_page(self, prefix: str = "", start_after: Optional[str] = None, limit: int = 1000) -> list:
+        """
+        Страница списка файлов в bucket (в лексикографическом порядке ключей)
+        
+        Args:
+            prefix: Префикс для фильтрации (папка)
+            start_after: Ключ, после которого начинается страница
+            limit: Максимум объектов на странице
+        
+        Returns:
+            Список объектов (пустой - bucket пройден до конца)
+        
+        Raises:
+            S3Error: ошибка MinIO (страницу нельзя молча считать пустой)
+        """
+        if not self.client:
+            raise RuntimeError("MinIO client not connected")
+        
+        objects = self.client.list_objects(
+            self.bucket_name,
+            prefix=prefix,
+            recursive=True,
+            start_after=start_after
+        )
+        return [
+            {
+                "name": obj.object_name,
+                "size": obj.size,
+                "last_modified": obj.last_modified,
+                "etag": obj.etag
+            }
+            for obj in islice(objects, limit)
+        ]
+    
     def file_exists(self, object_name: str) -> bool:
         """
         Проверить существование файла
@@ -0,0 +1,144 @@
+"""
+Хеширование паролей bcrypt вне event loop
+
+bcrypt.hashpw/checkpw занимают ~200 мс CPU и блокируют event loop.
+Сервис выполняет их в отдельном пуле потоков (bcrypt отпускает GIL)
+с ограничением параллелизма и длины очереди.
+"""
+
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import bcrypt
+
+from app.core.config import settings
+
+
+_BCRYPT_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HashingOverloadedError(Exception):
+    """Очередь хеширования переполнена"""
+    pass
+
+
+class PasswordHasher:
+    """Пул потоков для bcrypt с метриками очереди"""
+
+    def __init__(self, max_workers: int, max_queue: int, rounds: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_queued = 0
+        self._wait_sum = 0.0
+        self._run_sum = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="bcrypt",
+            )
+        return self._executor
+
+    def _instrumented(self, func, enqueued_at: float, *args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_sum += started_at - enqueued_at
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._run_sum += time.perf_counter() - started_at
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise HashingOverloadedError("Password hashing queue is full")
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+
+        future = self._get_executor().submit(self._instrumented, func, time.perf_counter(), *args)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        # Задача отменена до запуска - убрать ее из очереди
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    # Синхронные операции (выполняются в пуле)
+
+    def _hash_sync(self, password: str) -> str:
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+    @staticmethod
+    def _verify_sync(password: str, hashed_password: str) -> bool:
+        try:
+            return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+        except ValueError:
+            return False
+
+    # Публичный API
+
+    async def hash(self, password: str) -> str:
+        """Захешировать пароль"""
+        return await self._submit(self._hash_sync, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Проверить пароль"""
+        return await self._submit(self._verify_sync, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Нужно ли перехешировать пароль (изменился cost factor)"""
+        match = _BCRYPT_COST_RE.match(hashed_password or "")
+        if not match:
+            return True
+        return int(match.group(1)) != self.rounds
+
+    def stats(self) -> Dict:
+        """Метрики очереди хеширования"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "rounds": self.rounds,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(self._wait_sum / self._completed, 6) if self._completed else 0.0,
+                "avg_run_seconds": round(self._run_sum / self._completed, 6) if self._completed else 0.0,
+            }
+
+    def shutdown(self):
+        """Остановить пул потоков"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Глобальный экземпляр сервиса
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    rounds=settings.BCRYPT_ROUNDS,
+)
@@ -0,0 +1,201 @@
+"""
+Кэш временных ссылок на файлы (presigned GET URL)
+
+Ссылки подписываются от начала окна PRESIGNED_URL_BUCKET_SECONDS,
+поэтому в пределах окна подпись детерминирована и одна ссылка
+переиспользуется всеми процессами. Два уровня: LRU в памяти процесса
+и Redis. Ссылка отдается из кэша, пока до ее истечения остается
+больше PRESIGNED_URL_MIN_REMAINING_SECONDS.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.redis_service import redis_service
+from app.services.storage_service import AsyncStorageService, storage_service
+
+
+class PresignedUrlCache:
+    """Двухуровневый кэш presigned GET ссылок"""
+
+    def __init__(
+        self,
+        storage: AsyncStorageService,
+        expires_seconds: int,
+        bucket_seconds: int,
+        min_remaining_seconds: int,
+        max_size: int,
+    ):
+        # Ссылка, подписанная в начале окна, должна оставаться пригодной до его конца,
+        # иначе к концу окна каждый запрос подписывает заново и получает короткую ссылку
+        if bucket_seconds <= 0:
+            raise ValueError(f"PRESIGNED_URL_BUCKET_SECONDS must be positive, got {bucket_seconds}")
+        if bucket_seconds + min_remaining_seconds >= expires_seconds:
+            raise ValueError(
+                "PRESIGNED_URL_BUCKET_SECONDS + PRESIGNED_URL_MIN_REMAINING_SECONDS "
+                f"({bucket_seconds} + {min_remaining_seconds}) must be less than "
+                f"PRESIGNED_URL_EXPIRE_SECONDS ({expires_seconds})"
+            )
+        self.storage = storage
+        self.expires_seconds = expires_seconds
+        self.bucket_seconds = bucket_seconds
+        self.min_remaining_seconds = min_remaining_seconds
+        self.max_size = max_size
+        self._local: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    # Окно подписи
+
+    def _current_bucket(self) -> int:
+        """Начало текущего окна подписи (unix time)"""
+        now = int(time.time())
+        return now - now % self.bucket_seconds
+
+    def _cache_key(self, object_name: str, bucket: int) -> str:
+        return f"presigned:{self.expires_seconds}:{bucket}:{object_name}"
+
+    def _usable_until(self, bucket: int) -> float:
+        """До какого момента ссылку окна можно отдавать клиентам"""
+        return bucket + self.expires_seconds - self.min_remaining_seconds
+
+    # Локальный LRU уровень
+
+    def _local_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            usable_until, url = entry
+            if usable_until <= time.time():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return url
+
+    def _local_set(self, key: str, url: str, usable_until: float):
+        with self._lock:
+            self._local[key] = (usable_until, url)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    # Публичный API
+
+    async def get_url(self, object_name: str, verify_exists: bool = False) -> Optional[str]:
+        """Получить ссылку на файл (из кэша или подписать)"""
+        urls = await self.get_urls([object_name], verify_exists)
+        return urls.get(object_name)
+
+    async def get_urls(self, object_names: List[str], verify_exists: bool = False) -> Dict[str, Optional[str]]:
+        """
+        Получить ссылки на несколько файлов
+
+        Промахи локального уровня читаются из Redis одним MGET,
+        оставшиеся подписываются одним вызовом в пуле хранилища.
+
+        Args:
+            object_names: Пути к файлам в MinIO
+            verify_exists: Перед подписью проверить существование файлов
+                (только для промахов кэша). Для отсутствующих файлов - None
+        """
+        bucket = self._current_bucket()
+        usable_until = self._usable_until(bucket)
+        result: Dict[str, Optional[str]] = {}
+
+        missing: List[str] = []
+        for object_name in dict.fromkeys(object_names):
+            url = self._local_get(self._cache_key(object_name, bucket))
+            if url is not None:
+                self.hits_local += 1
+                result[object_name] = url
+            else:
+                missing.append(object_name)
+
+        if not missing:
+            return result
+
+        cached = await redis_service.get_many([self._cache_key(name, bucket) for name in missing])
+        to_sign: List[str] = []
+        for object_name, url in zip(missing, cached):
+            if url is not None:
+                self.hits_redis += 1
+                self._local_set(self._cache_key(object_name, bucket), url, usable_until)
+                result[object_name] = url
+            else:
+                to_sign.append(object_name)
+
+        if not to_sign:
+            return result
+
+        self.misses += len(to_sign)
+        if verify_exists:
+            exists = await asyncio.gather(*(self.storage.file_exists(name) for name in to_sign))
+            for object_name, found in zip(to_sign, exists):
+                if not found:
+                    result[object_name] = None
+            to_sign = [name for name, found in zip(to_sign, exists) if found]
+            if not to_sign:
+                return result
+
+        signed = await self.storage.get_presigned_urls(
+            to_sign,
+            expires=timedelta(seconds=self.expires_seconds),
+            request_date=datetime.fromtimestamp(bucket, tz=timezone.utc),
+        )
+
+        to_cache = {}
+        for object_name, url in signed.items():
+            result[object_name] = url
+            if url is not None:
+                key = self._cache_key(object_name, bucket)
+                self._local_set(key, url, usable_until)
+                to_cache[key] = url
+
+        ttl = int(usable_until - time.time())
+        if to_cache and ttl > 0:
+            await redis_service.set_many(to_cache, ttl)
+
+        return result
+
+    async def invalidate(self, object_name: str):
+        """Сбросить ссылку текущего окна (например, после удаления файла)"""
+        key = self._cache_key(object_name, self._current_bucket())
+        with self._lock:
+            self._local.pop(key, None)
+        await redis_service.delete(key)
+
+    async def invalidate_many(self, object_names: List[str]):
+        """Сбросить ссылки текущего окна для нескольких файлов"""
+        bucket = self._current_bucket()
+        keys = [self._cache_key(object_name, bucket) for object_name in object_names]
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        await redis_service.delete_many(keys)
+
+    def stats(self) -> Dict:
+        """Статистика попаданий кэша"""
+        return {
+            "local_size": len(self._local),
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+        }
+
+
+# Глобальный экземпляр кэша
+presigned_url_cache = PresignedUrlCache(
+    storage_service,
+    expires_seconds=settings.PRESIGNED_URL_EXPIRE_SECONDS,
+    bucket_seconds=settings.PRESIGNED_URL_BUCKET_SECONDS,
+    min_remaining_seconds=settings.PRESIGNED_URL_MIN_REMAINING_SECONDS,
+    max_size=settings.PRESIGNED_URL_CACHE_MAX_SIZE,
+)
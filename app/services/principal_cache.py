@@ -0,0 +1,282 @@
+"""
+Кэш аутентифицированных пользователей (principal cache)
+
+Два уровня: LRU в памяти процесса и Redis (redis_service.cache_user).
+Ключ - user_id из claims JWT токена. Кэш сбрасывается при изменении
+role, is_active или hashed_password пользователя.
+
+Сброс рассылается всем процессам через Redis pub/sub: каждый воркер
+удаляет пользователя из своего LRU. После переподключения подписки
+локальный уровень очищается целиком (сообщения могли быть пропущены).
+Без Redis другие воркеры видят старые данные не дольше
+PRINCIPAL_CACHE_LOCAL_TTL.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.models import User, UserRole
+from app.services.redis_service import redis_service
+
+
+# Поля, изменение которых делает кэш пользователя недействительным
+INVALIDATING_FIELDS = ("role", "is_active", "hashed_password")
+
+# Поля пользователя, которые хранятся в кэше (без хеша пароля)
+CACHED_FIELDS = ("id", "email", "username", "role", "is_active", "is_verified", "created_at")
+
+# Канал Redis для рассылки сброса кэша между воркерами
+INVALIDATION_CHANNEL = "principal_cache:invalidate"
+
+
+class PrincipalCache:
+    """Двухуровневый кэш пользователей для зависимостей аутентификации"""
+
+    def __init__(self, max_size: int, local_ttl: int, redis_ttl: int):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self._local: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_tasks: Set[asyncio.Task] = set()
+        self._listener: Optional[asyncio.Task] = None
+        self.subscribed = False
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.invalidations_received = 0
+
+    # Сериализация
+
+    def _serialize(self, user: User) -> Dict:
+        data = {field: getattr(user, field) for field in CACHED_FIELDS}
+        if isinstance(data["role"], UserRole):
+            data["role"] = data["role"].value
+        if isinstance(data["created_at"], datetime):
+            data["created_at"] = data["created_at"].isoformat()
+        return data
+
+    def _deserialize(self, data: Dict) -> User:
+        """Собрать отсоединенный от сессии объект User из кэша"""
+        values = dict(data)
+        if values.get("role") is not None:
+            values["role"] = UserRole(values["role"])
+        if isinstance(values.get("created_at"), str):
+            values["created_at"] = datetime.fromisoformat(values["created_at"])
+        return User(**values)
+
+    # Локальный LRU уровень
+
+    def _local_get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return data
+
+    def _local_set(self, user_id: int, data: Dict):
+        with self._lock:
+            self._local[user_id] = (time.monotonic() + self.local_ttl, data)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def invalidate_local(self, user_id: int):
+        """Удалить пользователя из локального уровня"""
+        with self._lock:
+            self._local.pop(user_id, None)
+
+    def clear_local(self):
+        """Очистить локальный уровень целиком"""
+        with self._lock:
+            self._local.clear()
+
+    # Публичный API
+
+    async def get(self, user_id: int) -> Optional[User]:
+        """Получить пользователя из кэша (сначала память процесса, затем Redis)"""
+        data = self._local_get(user_id)
+        if data is not None:
+            self.hits_local += 1
+            return self._deserialize(data)
+
+        data = await redis_service.get_cached_user(user_id)
+        if data is not None:
+            self.hits_redis += 1
+            self._local_set(user_id, data)
+            return self._deserialize(data)
+
+        self.misses += 1
+        return None
+
+    async def set(self, user: User):
+        """Положить пользователя в оба уровня кэша"""
+        data = self._serialize(user)
+        self._local_set(user.id, data)
+        await redis_service.cache_user(user.id, data, self.redis_ttl)
+
+    async def invalidate(self, user_id: int):
+        """Сбросить пользователя во всех уровнях кэша и в других воркерах"""
+        self.invalidate_local(user_id)
+        await redis_service.invalidate_user_cache(user_id)
+        await redis_service.publish(INVALIDATION_CHANNEL, str(user_id))
+
+    async def get_user(self, db: AsyncSession, email: str, user_id: Optional[int] = None) -> Optional[User]:
+        """
+        Получить пользователя по claims токена
+
+        Args:
+            db: Сессия базы данных (используется только при промахе кэша)
+            email: Claim "sub" токена
+            user_id: Claim "user_id" токена (у старых токенов может отсутствовать)
+
+        Returns:
+            Пользователь или None
+        """
+        if user_id is not None:
+            user = await self.get(user_id)
+            if user is not None and user.email == email:
+                return user
+
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalar_one_or_none()
+        if user is not None:
+            await self.set(user)
+        return user
+
+    def stats(self) -> Dict:
+        """Статистика попаданий кэша"""
+        return {
+            "local_size": len(self._local),
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "subscribed": self.subscribed,
+            "invalidations_received": self.invalidations_received,
+            "pending_invalidations": len(self._pending_tasks),
+        }
+
+    # Сброс из синхронного контекста ORM
+
+    def _schedule_invalidation(self, user_id: int):
+        """Запланировать сброс Redis уровня и рассылку из синхронного контекста ORM"""
+        self.invalidate_local(user_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.invalidate(user_id))
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def wait_pending(self, timeout: float = 1.0):
+        """Дождаться запланированных сбросов (middleware - до ответа клиенту)"""
+        if self._pending_tasks:
+            await asyncio.wait(list(self._pending_tasks), timeout=timeout)
+
+    # Подписка на сбросы других воркеров
+
+    async def _listen(self):
+        while True:
+            client = redis_service.redis_client
+            if client is None:
+                await asyncio.sleep(5)
+                continue
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Сбросы до подписки могли быть пропущены
+                self.clear_local()
+                self.subscribed = True
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        self.invalidate_local(int(message["data"]))
+                        self.invalidations_received += 1
+                    except (TypeError, ValueError):
+                        continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Principal cache subscription error: {e}")
+            finally:
+                self.subscribed = False
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(1)
+
+    def start(self):
+        """Подписаться на сбросы кэша от других воркеров"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Остановить подписку"""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+# Глобальный экземпляр кэша
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    local_ttl=settings.PRINCIPAL_CACHE_LOCAL_TTL,
+    redis_ttl=settings.PRINCIPAL_CACHE_TTL,
+)
+
+
+# Инвалидация при изменении значимых полей пользователя.
+# События ORM срабатывают только для изменений через объекты сессии:
+# массовые update(User)/delete(User) и SQL в обход ORM их не вызывают -
+# после таких запросов нужно явно вызвать principal_cache.invalidate(user_id).
+
+@event.listens_for(User, "after_update")
+def _collect_user_changes(mapper, connection, target: User):
+    state = inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in INVALIDATING_FIELDS):
+        return
+
+    principal_cache.invalidate_local(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("principal_invalidations", set()).add(target.id)
+
+
+@event.listens_for(User, "after_delete")
+def _collect_user_deletes(mapper, connection, target: User):
+    principal_cache.invalidate_local(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("principal_invalidations", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_invalidations(session: Session):
+    for user_id in session.info.pop("principal_invalidations", ()):
+        principal_cache._schedule_invalidation(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session: Session):
+    session.info.pop("principal_invalidations", None)
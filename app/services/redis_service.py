@@ -4,7 +4,7 @@ Redis Service для кэширования и управления сессия
 
 import json
 import redis.asyncio as aioredis
-from typing import Optional, Any
+from typing import Dict, List, Optional, Any
 from datetime import timedelta
 from app.core.config import settings
 
@@ -75,6 +75,34 @@ class RedisService:
             print(f"❌ Redis SET error: {e}")
             return False
     
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Получить несколько значений за один запрос (MGET)"""
+        if not self.redis_client or not keys:
+            return [None] * len(keys)
+        
+        try:
+            values = await self.redis_client.mget(keys)
+            return [json.loads(value) if value else None for value in values]
+        except Exception as e:
+            print(f"❌ Redis MGET error: {e}")
+            return [None] * len(keys)
+    
+    async def set_many(self, values: Dict[str, Any], ttl: Optional[int] = None) -> bool:
+        """Сохранить несколько значений с одним TTL (pipeline)"""
+        if not self.redis_client or not values:
+            return False
+        
+        try:
+            ttl = ttl or settings.REDIS_CACHE_TTL
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.setex(key, timedelta(seconds=ttl), json.dumps(value, default=str))
+                await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"❌ Redis MSET error: {e}")
+            return False
+    
     async def delete(self, key: str) -> bool:
         """Удалить значение из кэша"""
         if not self.redis_client:
@@ -87,6 +115,30 @@ class RedisService:
             print(f"❌ Redis DELETE error: {e}")
             return False
     
+    async def delete_many(self, keys: List[str]) -> bool:
+        """Удалить несколько значений одной командой DEL"""
+        if not self.redis_client or not keys:
+            return False
+        
+        try:
+            await self.redis_client.delete(*keys)
+            return True
+        except Exception as e:
+            print(f"❌ Redis DELETE error: {e}")
+            return False
+    
+    async def publish(self, channel: str, message: str) -> bool:
+        """Опубликовать сообщение в канал pub/sub"""
+        if not self.redis_client:
+            return False
+        
+        try:
+            await self.redis_client.publish(channel, message)
+            return True
+        except Exception as e:
+            print(f"❌ Redis PUBLISH error: {e}")
+            return False
+    
     async def exists(self, key: str) -> bool:
         """Проверить существование ключа"""
         if not self.redis_client:
@@ -0,0 +1,362 @@
+"""
+Пул аутентифицированных SMTP соединений
+
+Каждое письмо раньше стоило отдельного подключения, STARTTLS и AUTH.
+Соединения переиспользуются между отправками: группируются по
+(сервер, порт, пользователь), число сессий ограничено на пользователя
+и на сервер. Когда лимит сервера занят, место освобождается закрытием
+самого давно простаивающего соединения другого пользователя.
+Простаивающее соединение перед выдачей проверяется NOOP, а
+простаивающие дольше SMTP_POOL_IDLE_TIMEOUT закрываются.
+"""
+
+import asyncio
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.mail_call import MailAbortedError, current_mail_call
+
+
+PoolKey = Tuple[str, int, str]
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """
+    Разорвана ли SMTP сессия
+
+    SMTPException наследует OSError, но отказ по конкретному письму
+    сессию не ломает; 421 - сервер закрывает соединение.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SmtpPoolExhaustedError(Exception):
+    """Не удалось получить SMTP соединение за отведенное время"""
+    pass
+
+
+class _PooledSmtp:
+    """SMTP соединение и его служебные данные"""
+
+    def __init__(self, key: PoolKey, password: str, connection: smtplib.SMTP):
+        self.key = key
+        self.password = password
+        self.connection = connection
+        self.last_used_at = time.monotonic()
+        self.messages_sent = 0
+
+
+class SmtpConnectionPool:
+    """Потокобезопасный пул SMTP соединений с ограничениями на пользователя и сервер"""
+
+    def __init__(
+        self,
+        max_per_user: int,
+        max_per_server: int,
+        idle_timeout: float,
+        health_check_interval: float,
+        acquire_timeout: float,
+        max_messages_per_connection: int,
+        timeout: float,
+        starttls: bool = True,
+    ):
+        self.max_per_user = max_per_user
+        self.max_per_server = max_per_server
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.timeout = timeout
+        self.starttls = starttls
+        self._condition = threading.Condition()
+        self._idle: Dict[PoolKey, List[_PooledSmtp]] = {}
+        self._open_per_user: Dict[PoolKey, int] = {}
+        self._open_per_server: Dict[Tuple[str, int], int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.created = 0
+        self.reused = 0
+        self.health_check_failures = 0
+        self.discarded = 0
+        self.exhausted = 0
+        self.evicted = 0
+
+    # Открытие и закрытие соединений
+
+    def _open(self, key: PoolKey, password: str) -> _PooledSmtp:
+        server, port, user = key
+        connection = smtplib.SMTP(server, port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                connection.starttls()
+            connection.login(user, password)
+        except Exception:
+            self._quit(connection)
+            raise
+        self.created += 1
+        return _PooledSmtp(key, password, connection)
+
+    @staticmethod
+    def _quit(connection: smtplib.SMTP):
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _unreserve(self, key: PoolKey):
+        """Уменьшить счетчики открытых соединений (под блокировкой)"""
+        server, port, _ = key
+        self._open_per_user[key] -= 1
+        if self._open_per_user[key] <= 0:
+            del self._open_per_user[key]
+        self._open_per_server[(server, port)] -= 1
+        if self._open_per_server[(server, port)] <= 0:
+            del self._open_per_server[(server, port)]
+        self._condition.notify_all()
+
+    def _is_healthy(self, pooled: _PooledSmtp) -> bool:
+        """NOOP для соединения, простаивавшего дольше интервала проверки"""
+        if time.monotonic() - pooled.last_used_at < self.health_check_interval:
+            return True
+        try:
+            code, _ = pooled.connection.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    # Выдача и возврат
+
+    def _evict_idle(self, server: str, port: int, stale: List[_PooledSmtp]) -> bool:
+        """Освободить место на сервере: самое давно простаивающее соединение другого пользователя (под блокировкой)"""
+        # Списки простаивающих пополняются в конец, первым стоит самое старое
+        candidates = [idle[0] for key, idle in self._idle.items() if key[:2] == (server, port) and idle]
+        if not candidates:
+            return False
+        pooled = min(candidates, key=lambda candidate: candidate.last_used_at)
+        idle = self._idle[pooled.key]
+        idle.remove(pooled)
+        if not idle:
+            del self._idle[pooled.key]
+        self._unreserve(pooled.key)
+        stale.append(pooled)
+        self.evicted += 1
+        return True
+
+    def acquire(self, server: str, port: int, user: str, password: str) -> _PooledSmtp:
+        """Получить соединение: простаивающее, новое или дождаться освобождения"""
+        key = (server, port, user)
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            stale: List[_PooledSmtp] = []
+            pooled: Optional[_PooledSmtp] = None
+            reserved = False
+            with self._condition:
+                idle = self._idle.get(key)
+                while idle:
+                    candidate = idle.pop()
+                    if candidate.password == password and time.monotonic() - candidate.last_used_at < self.idle_timeout:
+                        pooled = candidate
+                        break
+                    self._unreserve(candidate.key)
+                    stale.append(candidate)
+                if pooled is None:
+                    user_open = self._open_per_user.get(key, 0)
+                    server_open = self._open_per_server.get((server, port), 0)
+                    if (
+                        user_open < self.max_per_user
+                        and server_open >= self.max_per_server
+                        and self._evict_idle(server, port, stale)
+                    ):
+                        server_open = self._open_per_server.get((server, port), 0)
+                    if user_open < self.max_per_user and server_open < self.max_per_server:
+                        self._open_per_user[key] = user_open + 1
+                        self._open_per_server[(server, port)] = server_open + 1
+                        reserved = True
+                    elif not stale:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.exhausted += 1
+                            raise SmtpPoolExhaustedError(
+                                f"No SMTP connection available for {user} within {self.acquire_timeout}s"
+                            )
+                        self._condition.wait(remaining)
+                        continue
+
+            for stale_connection in stale:
+                self._quit(stale_connection.connection)
+
+            if pooled is not None:
+                if self._is_healthy(pooled):
+                    self.reused += 1
+                    return pooled
+                self.health_check_failures += 1
+                self._quit(pooled.connection)
+                with self._condition:
+                    self._unreserve(pooled.key)
+                continue
+
+            if not reserved:
+                continue
+
+            try:
+                return self._open(key, password)
+            except Exception:
+                with self._condition:
+                    self._unreserve(key)
+                raise
+
+    def release(self, pooled: _PooledSmtp, discard: bool = False):
+        """Вернуть соединение в пул или закрыть его"""
+        if discard or pooled.messages_sent >= self.max_messages_per_connection:
+            if discard:
+                self.discarded += 1
+            self._quit(pooled.connection)
+            with self._condition:
+                self._unreserve(pooled.key)
+            return
+
+        pooled.last_used_at = time.monotonic()
+        with self._condition:
+            self._idle.setdefault(pooled.key, []).append(pooled)
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self, server: str, port: int, user: str, password: str) -> Iterator[smtplib.SMTP]:
+        """
+        Соединение на время блока with
+
+        Разорванное соединение закрывается, а не возвращается в пул.
+        Отказ сервера по конкретному письму (получатель, размер) сессию
+        не ломает - smtplib сам выполняет RSET. Соединение операции,
+        прерванной по таймауту (MailCall), закрывается.
+        """
+        call = current_mail_call()
+        if call is not None and call.aborted:
+            raise MailAbortedError("Mail operation aborted")
+        pooled = self.acquire(server, port, user, password)
+        sock = getattr(pooled.connection, "sock", None)
+        if call is not None:
+            call.attach(sock)
+
+        def detach() -> bool:
+            return call.detach(sock) if call is not None else False
+
+        try:
+            yield pooled.connection
+        except BaseException as e:
+            aborted = detach()
+            self.release(pooled, discard=aborted or is_connection_error(e))
+            raise
+        else:
+            pooled.messages_sent += 1
+            self.release(pooled, discard=detach())
+
+    # Обслуживание
+
+    def close_user(self, user: str):
+        """Закрыть простаивающие соединения пользователя (например, после смены пароля)"""
+        with self._condition:
+            to_close = []
+            for key in [key for key in self._idle if key[2] == user]:
+                to_close.extend(self._idle.pop(key))
+            for pooled in to_close:
+                self._unreserve(pooled.key)
+        for pooled in to_close:
+            self._quit(pooled.connection)
+
+    def prune(self) -> int:
+        """Закрыть соединения, простаивающие дольше idle_timeout"""
+        now = time.monotonic()
+        to_close = []
+        with self._condition:
+            for key, idle in list(self._idle.items()):
+                alive = [pooled for pooled in idle if now - pooled.last_used_at < self.idle_timeout]
+                to_close.extend(pooled for pooled in idle if now - pooled.last_used_at >= self.idle_timeout)
+                if alive:
+                    self._idle[key] = alive
+                else:
+                    del self._idle[key]
+            for pooled in to_close:
+                self._unreserve(pooled.key)
+        for pooled in to_close:
+            self._quit(pooled.connection)
+        return len(to_close)
+
+    def close_all(self):
+        """Закрыть все простаивающие соединения"""
+        with self._condition:
+            to_close = [pooled for idle in self._idle.values() for pooled in idle]
+            self._idle.clear()
+            for pooled in to_close:
+                self._unreserve(pooled.key)
+        for pooled in to_close:
+            self._quit(pooled.connection)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            try:
+                await asyncio.to_thread(self.prune)
+            except Exception as e:
+                print(f"❌ SMTP pool prune error: {e}")
+
+    def start(self):
+        """Запустить периодическое закрытие простаивающих соединений"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+            print(f"✅ SMTP connection pool started (idle timeout {self.idle_timeout}s)")
+
+    async def stop(self):
+        """Остановить обслуживание и закрыть соединения"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.close_all)
+
+    def stats(self) -> Dict:
+        """Статистика пула"""
+        with self._condition:
+            idle = sum(len(connections) for connections in self._idle.values())
+            open_total = sum(self._open_per_server.values())
+            users = len(self._open_per_user)
+        return {
+            "open": open_total,
+            "idle": idle,
+            "in_use": open_total - idle,
+            "users": users,
+            "max_per_user": self.max_per_user,
+            "max_per_server": self.max_per_server,
+            "created": self.created,
+            "reused": self.reused,
+            "health_check_failures": self.health_check_failures,
+            "discarded": self.discarded,
+            "exhausted": self.exhausted,
+            "evicted": self.evicted,
+        }
+
+
+# Глобальный экземпляр пула
+smtp_pool = SmtpConnectionPool(
+    max_per_user=settings.SMTP_POOL_MAX_PER_USER,
+    max_per_server=settings.SMTP_POOL_MAX_PER_SERVER,
+    idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+    health_check_interval=settings.SMTP_POOL_HEALTH_CHECK_INTERVAL,
+    acquire_timeout=settings.SMTP_POOL_ACQUIRE_TIMEOUT,
+    max_messages_per_connection=settings.SMTP_POOL_MAX_MESSAGES_PER_CONNECTION,
+    timeout=settings.MAILCOW_SMTP_TIMEOUT,
+    starttls=settings.MAILCOW_SMTP_STARTTLS,
+)
@@ -0,0 +1,244 @@
+"""
+Асинхронный фасад над MinIOService
+
+Клиент minio синхронный, поэтому каждый вызов выполняется в отдельном
+ограниченном пуле потоков и не блокирует event loop. Для каждой операции
+собираются метрики задержки.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import LatencyHistogram
+from app.services.minio_service import MinIOService, minio_service
+
+
+class StorageOperationMetrics:
+    """Метрики одной операции хранилища"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+
+    def snapshot(self) -> Dict:
+        return {"errors": self.errors, **self.latency.snapshot()}
+
+
+class AsyncStorageService:
+    """Асинхронный доступ к MinIO через пул потоков"""
+
+    def __init__(self, service: MinIOService, max_workers: int):
+        self.service = service
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._metrics: Dict[str, StorageOperationMetrics] = {}
+        self._in_flight = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="minio",
+            )
+        return self._executor
+
+    async def run(self, operation: str, func, *args, **kwargs):
+        """
+        Выполнить синхронный вызов в пуле потоков хранилища
+
+        Args:
+            operation: Имя операции для метрик
+            func: Синхронная функция
+        """
+        metrics = self._metrics.setdefault(operation, StorageOperationMetrics())
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self._in_flight += 1
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(),
+                lambda: func(*args, **kwargs)
+            )
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            metrics.latency.observe(time.perf_counter() - start)
+
+    # Операции MinIOService
+
+    def make_object_name(self, file_name: str, folder: str = "") -> str:
+        """Уникальное имя объекта (без обращения к MinIO)"""
+        return self.service.make_object_name(file_name, folder)
+
+    async def upload_file(
+        self,
+        file_data: BinaryIO,
+        file_name: str,
+        content_type: str = "application/octet-stream",
+        folder: str = ""
+    ) -> Optional[str]:
+        """Загрузить файл в MinIO"""
+        return await self.run("upload_file", self.service.upload_file, file_data, file_name, content_type, folder)
+
+    async def download_file(self, object_name: str) -> Optional[bytes]:
+        """Скачать файл из MinIO"""
+        return await self.run("download_file", self.service.download_file, object_name)
+
+    async def open_object(self, object_name: str, request_headers: Optional[Dict[str, str]] = None):
+        """Открыть объект для потокового чтения (см. MinIOService.open_object)"""
+        return await self.run("open_object", self.service.open_object, object_name, request_headers)
+
+    async def iter_object(self, response, chunk_size: int = settings.MINIO_STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """
+        Читать тело объекта блоками в пуле потоков хранилища
+
+        Соединение возвращается в пул и при обрыве клиентом.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, response.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close_object(response)
+
+    @staticmethod
+    def close_object(response) -> None:
+        """Закрыть ответ open_object и вернуть соединение в пул"""
+        response.close()
+        response.release_conn()
+
+    async def delete_file(self, object_name: str) -> bool:
+        """Удалить файл из MinIO"""
+        return await self.run("delete_file", self.service.delete_file, object_name)
+
+    async def delete_files(self, object_names: List[str]) -> Dict[str, Optional[str]]:
+        """Удалить несколько файлов (multi-object delete), вернуть ошибки по ключам"""
+        return await self.run("delete_files", self.service.delete_files, object_names)
+
+    async def get_presigned_url(
+        self,
+        object_name: str,
+        expires: timedelta = timedelta(hours=1),
+        request_date: Optional[datetime] = None
+    ) -> Optional[str]:
+        """Получить временную ссылку на файл"""
+        return await self.run("get_presigned_url", self.service.get_presigned_url, object_name, expires, request_date)
+
+    async def get_presigned_urls(
+        self,
+        object_names: List[str],
+        expires: timedelta = timedelta(hours=1),
+        request_date: Optional[datetime] = None
+    ) -> Dict[str, Optional[str]]:
+        """Подписать ссылки для нескольких файлов одним вызовом в пуле"""
+        return await self.run("get_presigned_urls", self.service.get_presigned_urls, object_names, expires, request_date)
+
+    async def get_presigned_put_url(self, object_name: str, expires: timedelta) -> Optional[str]:
+        """Получить временную ссылку для прямой загрузки (PUT)"""
+        return await self.run("get_presigned_put_url", self.service.get_presigned_put_url, object_name, expires)
+
+    async def get_presigned_post_form(
+        self,
+        object_name: str,
+        content_type: str,
+        max_size: int,
+        expires: timedelta
+    ) -> Optional[Dict]:
+        """Получить POST policy для прямой загрузки из браузера"""
+        return await self.run(
+            "get_presigned_post_form",
+            self.service.get_presigned_post_form,
+            object_name, content_type, max_size, expires
+        )
+
+    async def stat_file(self, object_name: str):
+        """Метаданные файла или None, если файла нет"""
+        return await self.run("stat_file", self.service.stat_file, object_name)
+
+    async def stat_files(self, object_names: List[str], concurrency: int) -> Dict[str, object]:
+        """
+        Метаданные нескольких файлов параллельными HEAD запросами
+
+        Одновременно выполняется не больше concurrency запросов, чтобы
+        большой пакет не занимал весь пул потоков.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def stat(object_name: str):
+            async with semaphore:
+                return await self.stat_file(object_name)
+
+        stats = await asyncio.gather(*(stat(object_name) for object_name in object_names))
+        return dict(zip(object_names, stats))
+
+    async def list_files(self, prefix: str = "") -> list:
+        """Список файлов в bucket"""
+        return await self.run("list_files", self.service.list_files, prefix)
+
+    async def list_files_page(self, prefix: str = "", start_after: Optional[str] = None, limit: int = 1000) -> list:
+        """Страница списка файлов в bucket"""
+        return await self.run("list_files_page", self.service.list_files_page, prefix, start_after, limit)
+
+    async def file_exists(self, object_name: str) -> bool:
+        """Проверить существование файла"""
+        return await self.run("file_exists", self.service.file_exists, object_name)
+
+    async def upload_stream(
+        self,
+        stream: BinaryIO,
+        file_name: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "",
+        max_size: Optional[int] = None,
+        object_name: Optional[str] = None
+    ) -> Optional[str]:
+        """Загрузить поток multipart загрузкой (см. MinIOService.upload_stream)"""
+        return await self.run(
+            "upload_stream",
+            self.service.upload_stream,
+            stream, file_name, content_type, folder, max_size, object_name
+        )
+
+    async def upload_avatar(self, file_data: BinaryIO, file_name: str) -> Optional[str]:
+        """Загрузить аватар пользователя"""
+        return await self.upload_stream(file_data, file_name, "image/jpeg", "avatars", settings.MAX_FILE_SIZE)
+
+    async def upload_document(self, file_data: BinaryIO, file_name: str, content_type: str) -> Optional[str]:
+        """Загрузить документ"""
+        return await self.upload_stream(file_data, file_name, content_type, "documents", settings.MAX_FILE_SIZE)
+
+    async def upload_attachment(self, file_data: BinaryIO, file_name: str, content_type: str) -> Optional[str]:
+        """Загрузить вложение к задаче/письму"""
+        return await self.upload_stream(file_data, file_name, content_type, "attachments", settings.MAX_FILE_SIZE)
+
+    def stats(self) -> Dict:
+        """Метрики пула потоков и задержек операций"""
+        return {
+            "max_workers": self.max_workers,
+            "http_pool_size": settings.MINIO_HTTP_POOL_SIZE,
+            "in_flight": self._in_flight,
+            "operations": {
+                operation: metrics.snapshot()
+                for operation, metrics in self._metrics.items()
+            },
+        }
+
+    def shutdown(self):
+        """Остановить пул потоков"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Глобальный экземпляр сервиса
+storage_service = AsyncStorageService(minio_service, max_workers=settings.MINIO_MAX_WORKERS)
@@ -0,0 +1,69 @@
+"""
+Общие fixtures тестов
+
+Тесты работают с временной SQLite базой (aiosqlite) вместо PostgreSQL;
+переменные окружения задаются до импорта приложения.
+"""
+
+import os
+import tempfile
+
+_TEST_DB = os.path.join(tempfile.mkdtemp(prefix="bp-tests-"), "test.db")
+os.environ["DATABASE_URL_ASYNC"] = f"sqlite+aiosqlite:///{_TEST_DB}"
+os.environ["DATABASE_URL_REPLICA"] = ""
+os.environ["DEBUG"] = "false"
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.dependencies import get_current_user_from_token
+from app.core.database import AsyncSessionLocal, Base, engine
+from app.models import User, UserRole
+
+
+@pytest.fixture(autouse=True)
+async def database():
+    """Новая пустая база на каждый тест"""
+    await engine.dispose()
+    if os.path.exists(_TEST_DB):
+        os.remove(_TEST_DB)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user() -> User:
+    """Пользователь, от имени которого выполняются запросы"""
+    async with AsyncSessionLocal() as session:
+        user = User(
+            email="user@example.com",
+            username="user",
+            hashed_password="x",
+            role=UserRole.EMPLOYEE,
+            is_active=True,
+        )
+        session.add(user)
+        await session.commit()
+        return user
+
+
+@pytest.fixture
+def make_client():
+    """TestClient для роутера с подставленным текущим пользователем"""
+    clients = []
+
+    def factory(router: APIRouter, prefix: str = "", current_user: User = None) -> TestClient:
+        app = FastAPI()
+        app.include_router(router, prefix=prefix)
+        if current_user is not None:
+            app.dependency_overrides[get_current_user_from_token] = lambda: current_user
+        client = TestClient(app)
+        clients.append(client)
+        return client
+
+    yield factory
+    for client in clients:
+        client.close()
@@ -0,0 +1,394 @@
+"""
+IMAP и SMTP серверы-заглушки для тестов почты
+
+Серверы работают в потоках процесса теста на 127.0.0.1 без TLS и
+поддерживают команды, которые использует EmailService. delays задает
+паузу перед ответом на команду (проверка таймаутов).
+"""
+
+import email
+import email.policy
+import re
+import socketserver
+import threading
+import time
+from email.utils import getaddresses
+from typing import Dict, List, Optional
+
+
+def _quote(value: Optional[str]) -> str:
+    if value is None:
+        return "NIL"
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _params(params: Dict[str, str]) -> str:
+    if not params:
+        return "NIL"
+    return "(" + " ".join(f"{_quote(key.upper())} {_quote(value)}" for key, value in params.items()) + ")"
+
+
+def _address_list(value: Optional[str]) -> str:
+    if not value:
+        return "NIL"
+    addresses = []
+    for name, address in getaddresses([value]):
+        mailbox, _, host = address.partition("@")
+        addresses.append(f"({_quote(name or None)} NIL {_quote(mailbox)} {_quote(host)})")
+    return "(" + "".join(addresses) + ")"
+
+
+def _split(raw: bytes):
+    """Заголовки и тело (без разделяющей пустой строки)"""
+    header, _, body = raw.partition(b"\r\n\r\n")
+    return header + b"\r\n\r\n", body
+
+
+class StubMessage:
+    """Письмо в ящике заглушки"""
+
+    def __init__(self, uid: int, raw: bytes, flags=()):
+        self.uid = uid
+        self.raw = raw.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+        self.flags = set(flags)
+        self.message = email.message_from_bytes(self.raw, policy=email.policy.compat32)
+
+    def envelope(self) -> str:
+        msg = self.message
+        return "(" + " ".join([
+            _quote(msg.get("Date")),
+            _quote(msg.get("Subject")),
+            _address_list(msg.get("From")),
+            _address_list(msg.get("From")),
+            _address_list(msg.get("From")),
+            _address_list(msg.get("To")),
+            _address_list(msg.get("Cc")),
+            "NIL",
+            "NIL",
+            _quote(msg.get("Message-ID")),
+        ]) + ")"
+
+    def _structure(self, part) -> str:
+        if part.is_multipart():
+            children = "".join(self._structure(child) for child in part.get_payload())
+            params = _params({"boundary": part.get_boundary()})
+            return f"({children} {_quote(part.get_content_subtype().upper())} {params} NIL NIL NIL)"
+        _, body = _split(part.as_bytes().replace(b"\n", b"\r\n").replace(b"\r\r\n", b"\r\n"))
+        params = dict((key, value) for key, value in part.get_params()[1:]) if part.get_params() else {}
+        fields = [
+            _quote(part.get_content_maintype().upper()),
+            _quote(part.get_content_subtype().upper()),
+            _params(params),
+            "NIL",
+            "NIL",
+            _quote((part.get("Content-Transfer-Encoding") or "7bit").upper()),
+            str(len(body)),
+        ]
+        if part.get_content_maintype() == "text":
+            fields.append(str(body.count(b"\r\n")))
+        disposition = part.get("Content-Disposition")
+        if disposition:
+            kind = disposition.split(";")[0].strip().upper()
+            disposition_params = {"filename": part.get_filename()} if part.get_filename() else {}
+            fields += ["NIL", f"({_quote(kind)} {_params(disposition_params)})", "NIL", "NIL"]
+        return "(" + " ".join(fields) + ")"
+
+    def bodystructure(self) -> str:
+        return self._structure(self.message)
+
+    def section(self, name: str) -> bytes:
+        header, body = _split(self.raw)
+        if name == "":
+            return self.raw
+        if name == "HEADER":
+            return header
+        if name == "TEXT":
+            return body
+        part = self.message
+        for index in name.split("."):
+            if part.is_multipart():
+                part = part.get_payload()[int(index) - 1]
+            elif index != "1":
+                return b""
+        if part is self.message:
+            return body
+        return _split(part.as_bytes().replace(b"\n", b"\r\n").replace(b"\r\r\n", b"\r\n"))[1]
+
+
+_FETCH_ITEM_RE = re.compile(r"BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?|[A-Z0-9.]+")
+_TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\([^)]*\))|(\S+)')
+
+
+def _tokens(value: str) -> List[str]:
+    return [group or plain or quoted for quoted, group, plain in _TOKEN_RE.findall(value)]
+
+
+def _uid_set(value: str, uids: List[int]) -> List[int]:
+    """UID из набора 1:5,7,9:* (только существующие)"""
+    result = set()
+    top = max(uids) if uids else 0
+    for item in value.split(","):
+        start, _, end = item.partition(":")
+        low = top if start == "*" else int(start)
+        high = low if not end else (top if end == "*" else int(end))
+        low, high = min(low, high), max(low, high)
+        result.update(uid for uid in uids if low <= uid <= high)
+    return sorted(result)
+
+
+class _ImapHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server: "ImapStubServer" = self.server.stub
+        self.selected: Optional[str] = None
+        self.wfile.write(b"* OK [CAPABILITY IMAP4rev1 UIDPLUS] stub ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            if command == "UID":
+                sub, _, args = args.partition(" ")
+                command = f"UID {sub.upper()}"
+            server.commands.append(command)
+            delay = server.delays.get(command.split()[-1])
+            if delay:
+                time.sleep(delay)
+            try:
+                if not self.dispatch(server, tag, command, args):
+                    return
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    def reply(self, data: bytes):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def dispatch(self, server: "ImapStubServer", tag: str, command: str, args: str) -> bool:
+        ok = f"{tag} OK {command} completed\r\n".encode()
+        if command == "CAPABILITY":
+            self.reply(b"* CAPABILITY IMAP4rev1 UIDPLUS\r\n" + ok)
+        elif command == "LOGIN":
+            user, password = _tokens(args)[:2]
+            if server.passwords.get(user) != password:
+                self.reply(f"{tag} NO [AUTHENTICATIONFAILED] invalid credentials\r\n".encode())
+            else:
+                self.reply(ok)
+        elif command == "NOOP":
+            self.reply(ok)
+        elif command == "LOGOUT":
+            self.reply(b"* BYE logging out\r\n" + ok)
+            return False
+        elif command == "LIST":
+            lines = b"".join(f'* LIST (\\HasNoChildren) "." "{name}"\r\n'.encode() for name in server.folders)
+            self.reply(lines + ok)
+        elif command == "STATUS":
+            name = _tokens(args)[0]
+            messages = server.folders.get(name, [])
+            uidnext = max((message.uid for message in messages), default=0) + 1
+            self.reply(
+                f'* STATUS "{name}" (MESSAGES {len(messages)} UIDNEXT {uidnext} UIDVALIDITY {server.uidvalidity})\r\n'.encode()
+                + ok
+            )
+        elif command in ("SELECT", "EXAMINE"):
+            name = _tokens(args)[0]
+            if name not in server.folders:
+                self.reply(f"{tag} NO no such folder\r\n".encode())
+            else:
+                self.selected = name
+                access = "READ-ONLY" if command == "EXAMINE" else "READ-WRITE"
+                self.reply(
+                    f"* {len(server.folders[name])} EXISTS\r\n* OK [UIDVALIDITY {server.uidvalidity}]\r\n"
+                    f"{tag} OK [{access}] {command} completed\r\n".encode()
+                )
+        elif command == "UID SEARCH":
+            uids = [message.uid for message in server.folders[self.selected]]
+            criteria = args.split()
+            if criteria[-2:-1] == ["UID"]:
+                uids = _uid_set(criteria[-1], uids)
+            self.reply(("* SEARCH " + " ".join(map(str, uids))).rstrip().encode() + b"\r\n" + ok)
+        elif command == "UID FETCH":
+            uid_set, _, items = args.partition(" ")
+            self.reply(self.fetch(server, uid_set, items) + ok)
+        elif command == "UID STORE":
+            uid_set, mode, flags = args.split(" ", 2)
+            flags = set(flags.strip("()").split())
+            response = b""
+            messages = server.folders[self.selected]
+            for message in messages:
+                if message.uid in _uid_set(uid_set, [item.uid for item in messages]):
+                    if mode.upper().startswith("+"):
+                        message.flags |= flags
+                    else:
+                        message.flags -= flags
+                    seq = messages.index(message) + 1
+                    response += f"* {seq} FETCH (UID {message.uid} FLAGS ({' '.join(sorted(message.flags))}))\r\n".encode()
+            self.reply(response + ok)
+        elif command == "EXPUNGE":
+            messages = server.folders[self.selected]
+            response = b""
+            for seq in range(len(messages), 0, -1):
+                if "\\Deleted" in messages[seq - 1].flags:
+                    del messages[seq - 1]
+                    response += f"* {seq} EXPUNGE\r\n".encode()
+            self.reply(response + ok)
+        elif command == "CLOSE":
+            self.selected = None
+            self.reply(ok)
+        else:
+            self.reply(f"{tag} BAD unknown command {command}\r\n".encode())
+        return True
+
+    def fetch(self, server: "ImapStubServer", uid_set: str, items: str) -> bytes:
+        messages = server.folders[self.selected]
+        wanted = _uid_set(uid_set, [message.uid for message in messages])
+        # (UID FLAGS) (CHANGEDSINCE n) - модификаторы заглушка не поддерживает
+        items = items.split(")")[0]
+        response = b""
+        for seq, message in enumerate(messages, 1):
+            if message.uid not in wanted:
+                continue
+            parts = [f"UID {message.uid}".encode()]
+            for match in _FETCH_ITEM_RE.finditer(items):
+                name = match.group(0)
+                if name == "UID":
+                    continue
+                if name == "FLAGS":
+                    parts.append(f"FLAGS ({' '.join(sorted(message.flags))})".encode())
+                elif name == "RFC822.SIZE":
+                    parts.append(f"RFC822.SIZE {len(message.raw)}".encode())
+                elif name == "ENVELOPE":
+                    parts.append(f"ENVELOPE {message.envelope()}".encode())
+                elif name == "BODYSTRUCTURE":
+                    parts.append(f"BODYSTRUCTURE {message.bodystructure()}".encode())
+                elif name.startswith("BODY"):
+                    section, offset, size = match.group(1), match.group(2), match.group(3)
+                    data = message.section(section)
+                    label = f"BODY[{section}]"
+                    if offset is not None:
+                        data = data[int(offset):int(offset) + int(size)]
+                        label += f"<{offset}>"
+                    parts.append(f"{label} {{{len(data)}}}\r\n".encode() + data)
+            response += f"* {seq} FETCH (".encode() + b" ".join(parts) + b")\r\n"
+        return response
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        server: "SmtpStubServer" = self.server.stub
+        self.reply("220 stub ESMTP")
+        envelope = {"from": None, "to": []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, args = line.decode().rstrip("\r\n").partition(" ")
+            command = command.upper()
+            server.commands.append(command)
+            delay = server.delays.get(command)
+            if delay:
+                time.sleep(delay)
+            try:
+                if command in ("EHLO", "HELO"):
+                    self.reply("250-stub\r\n250-AUTH PLAIN\r\n250 8BITMIME")
+                elif command == "AUTH":
+                    self.reply("235 2.7.0 Authentication successful")
+                elif command == "MAIL":
+                    envelope = {"from": args, "to": []}
+                    self.reply("250 OK")
+                elif command == "RCPT":
+                    address = args.split(":", 1)[1].strip("<> ")
+                    if address in server.rejected:
+                        self.reply("550 5.1.1 Recipient rejected")
+                    else:
+                        envelope["to"].append(address)
+                        self.reply("250 OK")
+                elif command == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = b""
+                    while not data.endswith(b"\r\n.\r\n"):
+                        chunk = self.rfile.readline()
+                        if not chunk:
+                            return
+                        data += chunk
+                    delay = server.delays.get("DATA_END")
+                    if delay:
+                        time.sleep(delay)
+                    reply = server.replies.get("DATA_END")
+                    if reply:
+                        self.reply(reply)
+                        continue
+                    server.messages.append({"to": envelope["to"], "data": data[:-5]})
+                    self.reply("250 OK queued")
+                elif command in ("RSET", "NOOP"):
+                    self.reply("250 OK")
+                elif command == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Command not implemented")
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _StubServer:
+    handler = None
+
+    def __init__(self):
+        self.commands: List[str] = []
+        self.delays: Dict[str, float] = {}
+        self._server = _ThreadingServer(("127.0.0.1", 0), self.handler)
+        self._server.stub = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ImapStubServer(_StubServer):
+    """IMAP сервер: папки с письмами и пароли ящиков"""
+
+    handler = _ImapHandler
+
+    def __init__(self):
+        super().__init__()
+        self.uidvalidity = 1
+        self.passwords: Dict[str, str] = {}
+        self.folders: Dict[str, List[StubMessage]] = {"INBOX": []}
+
+    def add_message(self, raw: bytes, folder: str = "INBOX", flags=()) -> StubMessage:
+        messages = self.folders.setdefault(folder, [])
+        uid = max((message.uid for message in messages), default=0) + 1
+        message = StubMessage(uid, raw, flags)
+        messages.append(message)
+        return message
+
+
+class SmtpStubServer(_StubServer):
+    """SMTP сервер: принятые письма, отвергаемые получатели и ответы вместо 250"""
+
+    handler = _SmtpHandler
+
+    def __init__(self):
+        super().__init__()
+        self.messages: List[Dict] = []
+        self.rejected: set = set()
+        self.replies: Dict[str, str] = {}
@@ -0,0 +1,100 @@
+"""
+Счетчик ссылок хранилища по содержимому (app.services.content_store)
+"""
+
+import io
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models import FileBlob
+from app.services.content_store import ContentAddressedStore
+
+
+class _Storage:
+    """Объекты bucket в памяти, как у AsyncStorageService"""
+
+    def __init__(self):
+        self.objects = {}
+        self.fail_upload = False
+
+    async def run(self, operation, func, *args):
+        return func(*args)
+
+    async def file_exists(self, object_name):
+        return object_name in self.objects
+
+    async def upload_stream(self, stream, file_name, content_type, max_size=None, object_name=None):
+        if self.fail_upload:
+            raise ConnectionError("storage unavailable")
+        self.objects[object_name] = stream.read()
+        return True
+
+    async def delete_file(self, object_name):
+        return self.objects.pop(object_name, None) is not None
+
+
+@pytest.fixture
+def storage():
+    return _Storage()
+
+
+@pytest.fixture
+def store(storage):
+    return ContentAddressedStore(storage)
+
+
+async def _store(store, content=b"same content"):
+    async with AsyncSessionLocal() as session:
+        return await store.store(session, io.BytesIO(content), "file.txt", "text/plain")
+
+
+async def _ref_count(sha256):
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(FileBlob.ref_count).where(FileBlob.sha256 == sha256))).scalar_one_or_none()
+
+
+async def _release(store, object_name):
+    async with AsyncSessionLocal() as session:
+        return await store.release(session, object_name)
+
+
+async def test_same_content_is_stored_once(store, storage):
+    first = await _store(store)
+    second = await _store(store)
+
+    assert first["deduplicated"] is False
+    assert second["deduplicated"] is True
+    assert second["object_name"] == first["object_name"]
+    assert await _ref_count(first["sha256"]) == 2
+    assert list(storage.objects) == [first["object_name"]]
+
+
+async def test_blob_is_deleted_with_last_reference(store, storage):
+    stored = await _store(store)
+    await _store(store)
+
+    assert await _release(store, stored["object_name"]) is False
+    assert stored["object_name"] in storage.objects
+    assert await _ref_count(stored["sha256"]) == 1
+
+    assert await _release(store, stored["object_name"]) is True
+    assert storage.objects == {}
+    assert await _ref_count(stored["sha256"]) is None
+
+
+async def test_failed_upload_rolls_back_reference(store, storage):
+    storage.fail_upload = True
+    with pytest.raises(ConnectionError):
+        await _store(store)
+    storage.fail_upload = False
+
+    stored = await _store(store)
+    # Ссылка неудачной загрузки не учитывается: объект загружается заново
+    assert stored["deduplicated"] is False
+    assert await _ref_count(stored["sha256"]) == 1
+
+
+async def test_release_of_unknown_object(store):
+    assert await _release(store, "sha256/ab/" + "ab" * 32) is None
@@ -0,0 +1,89 @@
+"""
+Завершение прямой загрузки в MinIO (app.api.v1.endpoints.files)
+"""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from sqlalchemy import select
+
+from app.api.v1.endpoints import files
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import StoredFile
+from app.services.presigned_url_cache import presigned_url_cache
+from app.services.storage_service import storage_service
+
+OBJECT_NAME = "documents/20261018_abc_report.pdf"
+
+
+@pytest.fixture(autouse=True)
+def storage(monkeypatch):
+    stats = []
+
+    async def stat_file(object_name):
+        stats.append(object_name)
+        return SimpleNamespace(size=1024, content_type="application/pdf", etag="etag-1")
+
+    async def get_url(object_name, verify_exists=False):
+        return f"https://storage.example.com/{object_name}"
+
+    monkeypatch.setattr(storage_service, "stat_file", stat_file)
+    monkeypatch.setattr(presigned_url_cache, "get_url", get_url)
+    return stats
+
+
+def _upload_token(user) -> str:
+    return jwt.encode(
+        {
+            "type": files.UPLOAD_TOKEN_TYPE,
+            "user_id": user.id,
+            "object_name": OBJECT_NAME,
+            "file_name": "report.pdf",
+            "content_type": "application/pdf",
+            "max_size": settings.MAX_FILE_SIZE,
+            "exp": datetime.utcnow() + timedelta(minutes=5),
+        },
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM
+    )
+
+
+async def _rows():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(StoredFile).where(StoredFile.object_name == OBJECT_NAME))
+        return result.scalars().all()
+
+
+async def test_complete_is_idempotent(make_client, user, storage):
+    client = make_client(files.router, prefix="/files", current_user=user)
+    token = _upload_token(user)
+
+    first = client.post("/files/direct-upload/complete", json={"upload_token": token})
+    second = client.post("/files/direct-upload/complete", json={"upload_token": token})
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    # Повтор отвечает по записанной строке, без обращения к MinIO
+    assert storage == [OBJECT_NAME]
+
+    rows = await _rows()
+    assert len(rows) == 1
+    assert rows[0].owner_id == user.id
+
+
+async def test_complete_claims_row_added_by_reconciler(make_client, user):
+    async with AsyncSessionLocal() as session:
+        session.add(StoredFile(object_name=OBJECT_NAME, folder="documents", file_name="20261018_abc_report.pdf"))
+        await session.commit()
+
+    client = make_client(files.router, prefix="/files", current_user=user)
+    response = client.post("/files/direct-upload/complete", json={"upload_token": _upload_token(user)})
+    assert response.status_code == 200
+
+    rows = await _rows()
+    assert len(rows) == 1
+    assert rows[0].owner_id == user.id
+    assert rows[0].file_name == "report.pdf"
+    assert rows[0].size == 1024
@@ -0,0 +1,66 @@
+"""
+Сверка stored_files с bucket (app.services.file_reconciler)
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models import StoredFile
+from app.services.file_reconciler import StoredFileReconciler
+
+
+class _Bucket:
+    """Постраничный листинг bucket, как у AsyncStorageService.list_files_page"""
+
+    def __init__(self, objects):
+        self.objects = sorted(objects, key=lambda obj: obj["name"])
+
+    async def list_files_page(self, prefix, start_after, limit):
+        names = [obj for obj in self.objects if start_after is None or obj["name"] > start_after]
+        return names[:limit]
+
+
+def _object(name, age: timedelta):
+    return {
+        "name": name,
+        "size": 10,
+        "etag": "etag",
+        "last_modified": datetime.now(timezone.utc) - age,
+    }
+
+
+async def _object_names():
+    async with AsyncSessionLocal() as session:
+        return set((await session.execute(select(StoredFile.object_name))).scalars())
+
+
+async def test_recent_objects_are_not_added_until_upload_ticket_expires():
+    bucket = _Bucket([
+        _object("documents/old.pdf", timedelta(hours=2)),
+        _object("documents/uploading.pdf", timedelta(minutes=1)),
+        _object("documents/no-date.pdf", timedelta(0)) | {"last_modified": None},
+    ])
+    reconciler = StoredFileReconciler(bucket, interval=60, page_size=2, min_age=1800)
+
+    result = await reconciler.run_once()
+    assert result == {"seen": 3, "added": 2, "deferred": 1, "removed": 0}
+    assert await _object_names() == {"documents/old.pdf", "documents/no-date.pdf"}
+
+    # Объект старше срока тикета добавляется на следующем проходе
+    bucket.objects[2]["last_modified"] -= timedelta(hours=1)
+    result = await reconciler.run_once()
+    assert result["added"] == 1
+    assert "documents/uploading.pdf" in await _object_names()
+
+
+async def test_rows_of_missing_objects_are_removed():
+    async with AsyncSessionLocal() as session:
+        session.add(StoredFile(object_name="documents/gone.pdf", folder="documents"))
+        await session.commit()
+
+    reconciler = StoredFileReconciler(_Bucket([]), interval=60, page_size=10, min_age=1800)
+    result = await reconciler.run_once()
+    assert result["removed"] == 1
+    assert await _object_names() == set()
@@ -0,0 +1,63 @@
+"""
+Потоковое скачивание файлов из MinIO (app.api.v1.endpoints.files)
+"""
+
+import io
+
+import pytest
+
+from app.api.v1.endpoints import files
+from app.services.storage_service import storage_service
+
+
+class _ObjectResponse:
+    """Ответ urllib3 на GET объекта"""
+
+    def __init__(self, body: bytes):
+        self.status = 200
+        self.headers = {"Content-Type": "text/plain", "Content-Length": str(len(body))}
+        self.body = io.BytesIO(body)
+        self.closed = False
+        self.released = False
+
+    def read(self, size):
+        return self.body.read(size)
+
+    def close(self):
+        self.closed = True
+
+    def release_conn(self):
+        self.released = True
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    responses = []
+
+    async def open_object(object_name, request_headers=None):
+        response = _ObjectResponse(b"hello world")
+        responses.append(response)
+        return response
+
+    monkeypatch.setattr(storage_service, "open_object", open_object)
+    return responses
+
+
+def test_download_streams_body_and_releases_connection(make_client, user, opened):
+    client = make_client(files.router, prefix="/files", current_user=user)
+    response = client.get("/files/download/documents/a.txt")
+    assert response.status_code == 200
+    assert response.content == b"hello world"
+    assert opened[0].closed and opened[0].released
+
+
+def test_download_releases_connection_when_response_setup_fails(make_client, user, opened, monkeypatch):
+    def broken_response(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(files, "StreamingResponse", broken_response)
+    client = make_client(files.router, prefix="/files", current_user=user)
+
+    response = client.get("/files/download/documents/a.txt")
+    assert response.status_code == 500
+    assert opened[0].closed and opened[0].released
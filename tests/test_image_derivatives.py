@@ -0,0 +1,132 @@
+"""
+Уменьшенные копии аватаров (app.services.image_derivatives) и их выдача
+"""
+
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from sqlalchemy import select
+
+from app.api.v1.endpoints import files
+from app.core.database import AsyncSessionLocal
+from app.models import StoredFile
+from app.services.image_derivatives import AvatarDerivativePipeline, closest_size, derivative_object_name
+
+
+def _image(mode: str, size=(640, 640)) -> bytes:
+    output = BytesIO()
+    if mode == "P":
+        Image.new("RGB", size, (200, 30, 30)).convert("P", palette=Image.Palette.ADAPTIVE).save(output, "PNG")
+    else:
+        Image.new(mode, size, (30, 200, 30, 128)).save(output, "PNG")
+    return output.getvalue()
+
+
+class _Storage:
+    """Объекты bucket в памяти"""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    async def download_file(self, object_name):
+        return self.objects.get(object_name)
+
+    async def upload_stream(self, stream, file_name, content_type, object_name=None):
+        self.objects[object_name] = stream.read()
+        return True
+
+
+@pytest.fixture
+async def pipeline():
+    pipeline = AvatarDerivativePipeline(
+        _Storage({}), sizes=[64, 128, 512], quality=80, process_workers=1, concurrency=1, max_queue=10
+    )
+    yield pipeline
+    await pipeline.stop()
+
+
+@pytest.mark.parametrize("mode", ["P", "RGBA"])
+async def test_render_and_save_derivatives(pipeline, mode):
+    original = f"avatars/{mode.lower()}.png"
+    pipeline.storage.objects[original] = _image(mode)
+    async with AsyncSessionLocal() as session:
+        session.add(StoredFile(object_name=original, folder="avatars"))
+        await session.commit()
+
+    assert await pipeline.process(original) == [64, 128, 512]
+
+    for size in (64, 128, 512):
+        for image_format, pil_format in (("webp", "WEBP"), ("jpeg", "JPEG")):
+            with Image.open(BytesIO(pipeline.storage.objects[derivative_object_name(original, size, image_format)])) as image:
+                assert image.format == pil_format
+                assert image.size == (size, size)
+
+    async with AsyncSessionLocal() as session:
+        saved = (await session.execute(select(StoredFile.derivatives).where(StoredFile.object_name == original))).scalar_one()
+    assert saved == [64, 128, 512]
+
+
+async def test_sizes_above_shortest_side_are_skipped(pipeline):
+    pipeline.storage.objects["avatars/wide.png"] = _image("RGBA", (640, 480))
+    assert await pipeline.process("avatars/wide.png") == [64, 128]
+    assert derivative_object_name("avatars/wide.png", 512, "webp") not in pipeline.storage.objects
+
+
+async def test_small_image_gets_smallest_size(pipeline):
+    pipeline.storage.objects["avatars/tiny.png"] = _image("RGBA", (32, 32))
+    assert await pipeline.process("avatars/tiny.png") == [64]
+
+
+@pytest.mark.parametrize("available, requested, expected", [
+    ([64, 128, 512], 100, 128),
+    ([64, 128, 512], 128, 128),
+    ([64, 128], 300, 128),
+    ([], 128, None),
+])
+def test_closest_size(available, requested, expected):
+    assert closest_size(available, requested) == expected
+
+
+@pytest.fixture
+def avatar_client(make_client, user, monkeypatch):
+    queued = []
+
+    async def get_url(object_name, verify_exists=False):
+        return f"https://storage.example.com/{object_name}"
+
+    monkeypatch.setattr(files.presigned_url_cache, "get_url", get_url)
+    monkeypatch.setattr(files.avatar_derivatives, "enqueue", queued.append)
+    monkeypatch.setattr(files.settings, "AVATAR_DERIVATIVES_ENABLED", True)
+    client = make_client(files.router, prefix="/files", current_user=user)
+    client.queued = queued
+    return client
+
+
+async def _add_avatar(object_name, derivatives):
+    async with AsyncSessionLocal() as session:
+        session.add(StoredFile(object_name=object_name, folder="avatars", derivatives=derivatives))
+        await session.commit()
+
+
+async def test_avatar_url_picks_closest_size(avatar_client):
+    await _add_avatar("avatars/a.png", [64, 128, 512])
+
+    body = avatar_client.get("/files/avatar/avatars/a.png", params={"size": 100, "format": "jpeg"}).json()
+    assert body["size"] == 128
+    assert body["file_path"] == "derivatives/avatars/a.png/128.jpg"
+    assert body["original"] is False
+    assert avatar_client.queued == []
+
+
+async def test_avatar_without_derivatives_is_requeued(avatar_client):
+    await _add_avatar("avatars/b.png", None)
+
+    body = avatar_client.get("/files/avatar/avatars/b.png").json()
+    assert body["original"] is True
+    assert body["url"] == "https://storage.example.com/avatars/b.png"
+    assert avatar_client.queued == ["avatars/b.png"]
+
+
+def test_unknown_avatar(avatar_client):
+    assert avatar_client.get("/files/avatar/avatars/missing.png").status_code == 404
@@ -0,0 +1,139 @@
+"""
+Пул IMAP соединений и повтор операций (app.services.imap_pool)
+"""
+
+import imaplib
+from contextlib import contextmanager
+
+import pytest
+
+from app.services import email_service as email_service_module
+from app.services.email_service import EmailService
+from app.services.imap_pool import (
+    ImapConnectionPool,
+    ImapPoolExhaustedError,
+    _PooledConnection,
+    is_connection_dropped,
+)
+
+
+class _Connection:
+    def __init__(self, user):
+        self.user = user
+        self.logged_out = False
+
+    def noop(self):
+        return "OK", [b""]
+
+    def logout(self):
+        self.logged_out = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = ImapConnectionPool(
+        max_per_user=2,
+        max_per_server=2,
+        idle_timeout=300,
+        health_check_interval=60,
+        acquire_timeout=0.05,
+        connect_timeout=5,
+    )
+    monkeypatch.setattr(pool, "_open", lambda key, password: _PooledConnection(key, password, _Connection(key[2])))
+    return pool
+
+
+def test_full_server_evicts_least_recently_used_idle_connection(pool):
+    first = pool.acquire("imap", 993, "a", "pw")
+    second = pool.acquire("imap", 993, "b", "pw")
+    pool.release(first)
+    pool.release(second)
+
+    third = pool.acquire("imap", 993, "c", "pw")
+    assert third.key == ("imap", 993, "c")
+    assert first.connection.logged_out
+    assert not second.connection.logged_out
+    stats = pool.stats()
+    assert stats["evicted"] == 1
+    assert stats["open"] == 2
+
+
+def test_full_server_without_idle_connections_waits(pool):
+    pool.acquire("imap", 993, "a", "pw")
+    pool.acquire("imap", 993, "b", "pw")
+    with pytest.raises(ImapPoolExhaustedError):
+        pool.acquire("imap", 993, "c", "pw")
+    assert pool.stats()["evicted"] == 0
+
+
+def test_other_servers_are_not_evicted(pool):
+    other = pool.acquire("imap2", 993, "a", "pw")
+    pool.release(other)
+    pool.acquire("imap", 993, "b", "pw")
+    pool.acquire("imap", 993, "c", "pw")
+    with pytest.raises(ImapPoolExhaustedError):
+        pool.acquire("imap", 993, "d", "pw")
+    assert not other.connection.logged_out
+
+
+def _wrapped(error: BaseException) -> imaplib.IMAP4.abort:
+    """Как imaplib оборачивает ошибку сокета при отправке команды"""
+    try:
+        raise error
+    except OSError as val:
+        try:
+            raise imaplib.IMAP4.abort(f"socket error: {val}")
+        except imaplib.IMAP4.abort as abort:
+            return abort
+
+
+@pytest.mark.parametrize("error, dropped", [
+    (imaplib.IMAP4.abort("socket error: EOF"), True),
+    (ConnectionResetError(), True),
+    (EOFError(), True),
+    (_wrapped(BrokenPipeError()), True),
+    (TimeoutError("timed out"), False),
+    (_wrapped(TimeoutError("timed out")), False),
+    (ValueError(), False),
+])
+def test_is_connection_dropped(error, dropped):
+    assert is_connection_dropped(error) is dropped
+
+
+class _FailingPool:
+    """Пул, операции на соединениях которого падают заданными ошибками"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    @contextmanager
+    def connection(self, server, port, user, password):
+        self.attempts += 1
+        yield None
+
+
+def _run(monkeypatch, errors):
+    pool = _FailingPool(errors)
+    monkeypatch.setattr(email_service_module, "imap_pool", pool)
+    service = EmailService("user@example.com", "pw")
+
+    def operation(mail):
+        if pool.errors:
+            raise pool.errors.pop(0)
+        return "done"
+
+    return pool, lambda: service._run_imap(operation)
+
+
+def test_dropped_connection_is_retried_once(monkeypatch):
+    pool, run = _run(monkeypatch, [imaplib.IMAP4.abort("socket error: EOF")])
+    assert run() == "done"
+    assert pool.attempts == 2
+
+
+def test_timeout_is_not_retried(monkeypatch):
+    pool, run = _run(monkeypatch, [TimeoutError("timed out")])
+    with pytest.raises(TimeoutError):
+        run()
+    assert pool.attempts == 1
@@ -0,0 +1,166 @@
+"""
+Создание приглашений: одиночное и массовое (app.api.v1.endpoints.invitations)
+"""
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.api.v1.endpoints import invitations
+from app.core.database import AsyncSessionLocal
+from app.models import Company
+
+
+@pytest.fixture
+async def company(user) -> Company:
+    """Компания, владельцем которой является текущий пользователь"""
+    async with AsyncSessionLocal() as session:
+        company = Company(name="Acme", owner_id=user.id)
+        session.add(company)
+        await session.commit()
+        return company
+
+
+@pytest.fixture
+def client(make_client, user):
+    return make_client(invitations.router, prefix="/invitations", current_user=user)
+
+
+def _invite(client, company, email="new@example.com"):
+    return client.post("/invitations/create", json={"email": email, "company_id": company.id})
+
+
+def test_create_invitation(client, company):
+    response = _invite(client, company)
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+
+
+def test_concurrent_duplicate_is_reported_as_existing_invitation(client, company, monkeypatch):
+    assert _invite(client, company).status_code == 200
+    # Проверки прошли до вставки параллельного приглашения - дубликат отсекает индекс
+    monkeypatch.setattr(invitations, "_invitation_rejections", lambda check, data: [])
+
+    response = _invite(client, company)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Active invitation already exists for this email"
+
+
+def test_other_integrity_errors_are_not_reported_as_duplicates(client, company, monkeypatch):
+    monkeypatch.setattr(invitations.secrets, "token_urlsafe", lambda size: "same-token")
+    assert _invite(client, company, "first@example.com").status_code == 200
+
+    response = _invite(client, company, "second@example.com")
+    assert response.status_code == 500
+    assert "already exists" not in response.json()["detail"]
+
+
+def test_bulk_attributes_integrity_errors_to_rows(client, company, monkeypatch):
+    monkeypatch.setattr(invitations.secrets, "token_urlsafe", lambda size: "same-token")
+    assert _invite(client, company, "taken@example.com").status_code == 200
+
+    response = client.post("/invitations/bulk", json={"invitations": [
+        {"email": "a@example.com", "company_id": company.id},
+        {"email": "b@example.com", "company_id": company.id},
+    ]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    # Токены обеих строк совпадают с уже выданным
+    assert [item["status"] for item in results] == ["error", "error"]
+    assert all(item["error"].startswith("Could not create invitation") for item in results)
+
+
+class _ConstraintError(Exception):
+    """Ошибка драйвера с именем ограничения, как у asyncpg"""
+
+    def __init__(self, constraint_name):
+        super().__init__("duplicate key value violates unique constraint")
+        self.constraint_name = constraint_name
+
+
+@pytest.mark.parametrize("orig, expected", [
+    (_ConstraintError(invitations.PENDING_INVITATION_INDEX), True),
+    (_ConstraintError("company_invitations_invitation_token_key"), False),
+    (Exception("UNIQUE constraint failed: company_invitations.email, company_invitations.company_id"), True),
+    (Exception("UNIQUE constraint failed: company_invitations.invitation_token"), False),
+    (Exception("FOREIGN KEY constraint failed"), False),
+])
+def test_pending_invitation_conflict_detection(orig, expected):
+    error = IntegrityError("INSERT", {}, orig)
+    assert invitations._is_pending_invitation_conflict(error) is expected
+
+
+def _bulk_csv(client, body):
+    return client.post("/invitations/bulk/csv", content=body, headers={"Content-Type": "text/csv"})
+
+
+def test_bulk_over_limit_is_rejected_before_processing(client, company, monkeypatch):
+    monkeypatch.setattr(invitations.settings, "INVITATION_BULK_MAX_ROWS", 2)
+    monkeypatch.setattr(invitations.settings, "INVITATION_BULK_BATCH_SIZE", 1)
+
+    response = client.post("/invitations/bulk", json={"invitations": [
+        {"email": f"user{index}@example.com", "company_id": company.id} for index in range(3)
+    ]})
+    assert response.status_code == 413
+    assert client.get(f"/invitations/company/{company.id}/invitations").json() == []
+
+
+def test_bulk_csv_stops_at_limit_and_returns_processed_rows(client, company, monkeypatch):
+    monkeypatch.setattr(invitations.settings, "INVITATION_BULK_MAX_ROWS", 2)
+    monkeypatch.setattr(invitations.settings, "INVITATION_BULK_BATCH_SIZE", 1)
+    body = "email,company_id\n" + "".join(f"user{index}@example.com,{company.id}\n" for index in range(3))
+
+    response = _bulk_csv(client, body)
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["truncated"] is True
+    assert summary["created"] == 2
+    assert [item["row"] for item in summary["results"]] == [1, 2]
+
+
+def test_bulk_failure_keeps_results_of_committed_batches(client, company, monkeypatch):
+    monkeypatch.setattr(invitations.settings, "INVITATION_BULK_BATCH_SIZE", 1)
+    process_batch = invitations._process_invitation_batch
+    calls = []
+
+    async def failing_second_batch(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        return await process_batch(*args)
+
+    monkeypatch.setattr(invitations, "_process_invitation_batch", failing_second_batch)
+
+    response = client.post("/invitations/bulk", json={"invitations": [
+        {"email": f"user{index}@example.com", "company_id": company.id} for index in range(3)
+    ]})
+    assert response.status_code == 500
+    summary = response.json()
+    assert summary["success"] is False
+    assert "connection lost" in summary["detail"]
+    # Третья строка после сбоя не обрабатывается
+    assert [(item["row"], item["status"]) for item in summary["results"]] == [(1, "created"), (2, "error")]
+    assert len(client.get(f"/invitations/company/{company.id}/invitations").json()) == 1
+
+
+def test_bulk_csv_quoted_multiline_field_across_chunks(client, company):
+    body = f'email,company_id,position\na@example.com,{company.id},"Senior\nEngineer, ""Core"""\nb@example.com,{company.id},\n'
+    middle = body.index("Engineer")
+
+    def chunks():
+        yield body[:middle].encode()
+        yield body[middle:].encode()
+
+    response = _bulk_csv(client, chunks())
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["created"] == 2
+    positions = {item["email"]: item["position"] for item in client.get(f"/invitations/company/{company.id}/invitations").json()}
+    assert positions == {"a@example.com": 'Senior\nEngineer, "Core"', "b@example.com": None}
+
+
+def test_csv_record_splitter_keeps_quoted_newlines():
+    splitter = invitations._CsvRecordSplitter()
+    assert splitter.feed('a,"x\n') == []
+    assert splitter.feed('y"\nb,') == ['a,"x\ny"\n']
+    assert splitter.feed("c") == []
+    assert splitter.close() == ["b,c"]
@@ -0,0 +1,193 @@
+"""
+Таймауты операций пула потоков почты (app.services.async_email_service)
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from app.services.async_email_service import AsyncEmailService, MailExecutor, MailTimeoutError
+from app.services.mail_call import current_mail_call
+
+
+@pytest.fixture
+def executor():
+    executor = MailExecutor(max_workers=1, timeout=0.2, abort_grace=1.0)
+    yield executor
+    executor.shutdown()
+
+
+async def test_queued_operation_is_cancelled_on_timeout(executor):
+    release = threading.Event()
+    started = []
+    blocker = asyncio.create_task(executor.run("block", release.wait, 5, timeout=5))
+    await asyncio.sleep(0)
+
+    try:
+        with pytest.raises(MailTimeoutError):
+            # Единственный поток пула занят - операция не начнется до таймаута
+            await executor.run("queued", started.append, "queued")
+    finally:
+        release.set()
+        await blocker
+    time.sleep(0.1)
+    assert started == []
+    assert executor.stats()["operations"]["queued"]["timeouts"] == 1
+
+
+async def test_operation_finishing_within_grace_returns_result(executor):
+    def slow():
+        time.sleep(0.4)
+        return "done"
+
+    assert await executor.run("slow", slow) == "done"
+    metrics = executor.stats()["operations"]["slow"]
+    assert metrics["timeouts"] == 0
+    assert metrics["completed_after_timeout"] == 1
+
+
+def _blocking_read():
+    """Чтение из сокета, зарегистрированного в текущей операции, без ответа сервера"""
+    client, server = socket.socketpair()
+    call = current_mail_call()
+    call.attach(client)
+    try:
+        if not client.recv(1):
+            raise ConnectionResetError("connection closed")
+    finally:
+        call.detach(client)
+        client.close()
+        server.close()
+
+
+async def test_abort_closes_socket_of_running_operation(executor):
+    start = time.monotonic()
+    with pytest.raises(MailTimeoutError):
+        await executor.run("read", _blocking_read)
+    assert time.monotonic() - start < 1.0
+
+
+class _PartService:
+    """EmailService, у которого второй блок вложения не приходит"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def iter_part(self, email_id, part, folder):
+        try:
+            yield b"first"
+            _blocking_read()
+            yield b"second"
+        finally:
+            self.closed.set()
+
+
+async def test_iter_part_timeout_closes_stream(executor):
+    service = AsyncEmailService("user@example.com", "secret", executor=executor)
+    service.service = _PartService()
+
+    received = []
+    with pytest.raises(MailTimeoutError):
+        async for chunk in service.iter_part("1", {"section": "2"}):
+            received.append(chunk)
+    assert received == [b"first"]
+    assert service.service.closed.is_set()
+
+
+async def test_iter_part_closed_while_chunk_is_read(executor):
+    service = AsyncEmailService("user@example.com", "secret", executor=executor)
+    service.service = _PartService()
+
+    async def consume():
+        async for chunk in service.iter_part("1", {"section": "2"}):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    # Клиент отключился, пока поток ждет следующий блок: чтение прерывается,
+    # и только потом генератор закрывается
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert service.service.closed.is_set()
+    assert executor.stats()["operations"]["iter_part_close"]["errors"] == 0
+
+
+class _SlowServer:
+    """Почтовый сервер, отвечающий через delay секунд; учитывает занятые потоки"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.served = []
+
+    def read(self, mailbox: str):
+        client, server = socket.socketpair()
+        call = current_mail_call()
+        call.attach(client)
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        timer = threading.Timer(self.delay, self._reply, (server,))
+        timer.start()
+        try:
+            if not client.recv(1):
+                raise ConnectionResetError("connection closed")
+            self.served.append(mailbox)
+        finally:
+            timer.cancel()
+            with self.lock:
+                self.running -= 1
+            call.detach(client)
+            client.close()
+            server.close()
+
+    @staticmethod
+    def _reply(server: socket.socket):
+        try:
+            server.send(b"*")
+        except OSError:
+            pass
+
+
+async def test_concurrency_is_capped_at_max_workers():
+    # Ограничение фасада над блокирующими imaplib/smtplib: одновременно
+    # выполняется не больше max_workers операций на процесс, остальные ящики ждут
+    executor = MailExecutor(max_workers=2, timeout=5, abort_grace=1.0)
+    server = _SlowServer(delay=0.2)
+    try:
+        start = time.monotonic()
+        await asyncio.gather(*(executor.run("read", server.read, f"box{i}") for i in range(5)))
+        elapsed = time.monotonic() - start
+    finally:
+        executor.shutdown()
+
+    assert len(server.served) == 5
+    assert server.peak == 2
+    # Три волны по два ящика, а не одна
+    assert elapsed >= 0.55
+
+
+async def test_slow_mailboxes_time_out_operations_of_other_mailboxes():
+    # Все ящики на одном сервере Mailcow: пока он медленно отвечает на
+    # длинные операции двух ящиков (например, пачки синхронизации), операция
+    # третьего ждет свободный поток и снимается по таймауту, так и не начавшись
+    executor = MailExecutor(max_workers=2, timeout=0.3, abort_grace=1.0)
+    server = _SlowServer(delay=0.6)
+    try:
+        slow = [asyncio.create_task(executor.run("read", server.read, f"slow{i}", timeout=5)) for i in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(MailTimeoutError) as error:
+            await executor.run("read", server.read, "other")
+        await asyncio.gather(*slow)
+    finally:
+        executor.shutdown()
+
+    assert error.value.started is False
+    assert server.peak == 2
+    assert sorted(server.served) == ["slow0", "slow1"]
@@ -0,0 +1,171 @@
+"""
+Классификация результатов отправки очереди писем (app.services.mail_outbox)
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import OutboundEmail, OutboundEmailStatus
+from app.services.async_email_service import MailTimeoutError, mail_executor
+from app.services.email_service import MailDeliveryUnknownError, mailbox_passwords
+from app.services.mail_call import MailAbortedError
+from app.services.mail_outbox import mail_outbox
+from app.services.smtp_pool import SmtpPoolExhaustedError, smtp_pool
+from mail_stub import SmtpStubServer
+
+
+@pytest.fixture
+def smtp_server(user, monkeypatch):
+    monkeypatch.setitem(mailbox_passwords, user.email, "secret")
+    with SmtpStubServer() as server:
+        monkeypatch.setattr(settings, "MAILCOW_SMTP_SERVER", "127.0.0.1")
+        monkeypatch.setattr(settings, "MAILCOW_SMTP_PORT", server.port)
+        monkeypatch.setattr(smtp_pool, "starttls", False)
+        yield server
+        smtp_pool.close_all()
+
+
+async def _enqueue(user) -> int:
+    async with AsyncSessionLocal() as session:
+        message = await mail_outbox.enqueue(
+            session, user_id=user.id, from_addr=user.email, to="bob@example.com", subject="Hello", body="Hi"
+        )
+        return message.id
+
+
+async def _message(message_id: int) -> OutboundEmail:
+    async with AsyncSessionLocal() as session:
+        return await session.get(OutboundEmail, message_id)
+
+
+async def _make_due(message_id: int):
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(OutboundEmail)
+            .where(OutboundEmail.id == message_id)
+            .values(next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+        )
+        await session.commit()
+
+
+async def test_missing_password_does_not_use_attempts(user, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "max_attempts", 1)
+    message_id = await _enqueue(user)
+
+    for _ in range(3):
+        assert await mail_outbox.run_once() == 1
+        message = await _message(message_id)
+        assert message.status == OutboundEmailStatus.QUEUED
+        assert message.attempts == 0
+        assert message.last_error == "Mailbox password not set"
+        await _make_due(message_id)
+
+
+async def test_exhausted_pool_does_not_use_attempts(user, smtp_server, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "max_attempts", 1)
+    monkeypatch.setattr(smtp_pool, "max_per_server", 0)
+    monkeypatch.setattr(smtp_pool, "acquire_timeout", 0.05)
+    message_id = await _enqueue(user)
+
+    for _ in range(2):
+        assert await mail_outbox.run_once() == 1
+        message = await _message(message_id)
+        assert message.status == OutboundEmailStatus.QUEUED
+        assert message.attempts == 0
+        assert message.last_error.startswith("No SMTP connection available")
+        await _make_due(message_id)
+    assert smtp_server.commands.count("MAIL") == 0
+
+    # Соединение освободилось - письмо отправлено с первой попытки
+    monkeypatch.setattr(smtp_pool, "max_per_server", 1)
+    await mail_outbox.run_once()
+    message = await _message(message_id)
+    assert message.status == OutboundEmailStatus.SENT
+    assert message.attempts == 1
+
+
+async def test_temporary_error_is_retried_until_max_attempts(user, smtp_server, monkeypatch):
+    monkeypatch.setattr(mail_outbox, "max_attempts", 2)
+    smtp_server.replies["DATA_END"] = "451 4.3.0 Try again later"
+    message_id = await _enqueue(user)
+
+    await mail_outbox.run_once()
+    message = await _message(message_id)
+    assert message.status == OutboundEmailStatus.QUEUED
+    assert message.attempts == 1
+    assert "Try again later" in message.last_error
+
+    await _make_due(message_id)
+    await mail_outbox.run_once()
+    message = await _message(message_id)
+    assert message.status == OutboundEmailStatus.FAILED
+    assert message.attempts == 2
+
+
+async def test_permanent_error_fails_immediately(user, smtp_server):
+    smtp_server.replies["DATA_END"] = "554 5.7.1 Message rejected"
+    message_id = await _enqueue(user)
+
+    await mail_outbox.run_once()
+    message = await _message(message_id)
+    assert message.status == OutboundEmailStatus.FAILED
+    assert message.attempts == 1
+
+
+async def test_timeout_after_data_is_not_retried(user, smtp_server, monkeypatch):
+    monkeypatch.setattr(mail_executor, "timeout", 0.3)
+    smtp_server.delays["DATA_END"] = 2.0
+    message_id = await _enqueue(user)
+
+    await mail_outbox.run_once()
+    message = await _message(message_id)
+    assert message.status == OutboundEmailStatus.FAILED
+    assert message.last_error.startswith("Delivery outcome unknown")
+    # Письмо передано один раз: ни повтора на новом соединении, ни новой попытки
+    assert smtp_server.commands.count("MAIL") == 1
+
+
+async def test_socket_timeout_during_send_is_not_retried(user, smtp_server, monkeypatch):
+    monkeypatch.setattr(smtp_pool, "timeout", 0.3)
+    smtp_server.delays["DATA_END"] = 1.0
+    message_id = await _enqueue(user)
+
+    await mail_outbox.run_once()
+    message = await _message(message_id)
+    assert message.status == OutboundEmailStatus.FAILED
+    assert message.last_error.startswith("Delivery outcome unknown")
+    assert smtp_server.commands.count("MAIL") == 1
+
+
+def _timeout(started: bool, cause: Exception = None) -> MailTimeoutError:
+    error = MailTimeoutError("timed out", started=started)
+    error.__cause__ = cause
+    return error
+
+
+@pytest.mark.parametrize("error, unknown", [
+    (_timeout(started=False), False),
+    (_timeout(started=True), True),
+    (_timeout(started=True, cause=MailDeliveryUnknownError("no response")), True),
+    (_timeout(started=True, cause=MailAbortedError("aborted")), False),
+    (_timeout(started=True, cause=Exception("Failed to send email: connection refused")), False),
+    (MailDeliveryUnknownError("no response"), True),
+    (SmtpPoolExhaustedError("no connection"), False),
+    (Exception("Failed to send email: connection refused"), False),
+])
+def test_outcome_classification(error, unknown):
+    assert mail_outbox._is_outcome_unknown(error) is unknown
+
+
+@pytest.mark.parametrize("error, exhausted", [
+    (SmtpPoolExhaustedError("no connection"), True),
+    (_timeout(started=True, cause=SmtpPoolExhaustedError("no connection")), True),
+    (_timeout(started=False), False),
+    (Exception("Failed to send email: connection refused"), False),
+])
+def test_pool_exhausted_classification(error, exhausted):
+    assert mail_outbox._is_pool_exhausted(error) is exhausted
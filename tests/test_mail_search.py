@@ -0,0 +1,103 @@
+"""
+Поиск по локальному индексу почты без PostgreSQL (app.services.mail_search)
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app.api.v1.endpoints import mailbox
+from app.core.database import AsyncSessionLocal
+from app.models import MailMessage, User, UserRole
+
+
+def _message(user_id, uid, subject, from_addr, body, sent_at, folder="INBOX"):
+    return MailMessage(
+        user_id=user_id,
+        folder=folder,
+        uid=uid,
+        subject=subject,
+        from_addr=from_addr,
+        to_addr="user@example.com",
+        sent_at=sent_at,
+        preview=body[:200],
+        body_text=body,
+        flags=[],
+    )
+
+
+@pytest.fixture
+async def messages(user):
+    async with AsyncSessionLocal() as session:
+        other = User(email="other@example.com", username="other", hashed_password="x", role=UserRole.EMPLOYEE, is_active=True)
+        session.add(other)
+        await session.flush()
+        session.add_all([
+            _message(user.id, 1, "Quarterly report", "Alice <alice@example.com>", "Numbers for Q3",
+                     datetime(2026, 9, 30, tzinfo=timezone.utc)),
+            _message(user.id, 2, "Lunch", "Bob <bob@example.com>", "The quarterly report is late",
+                     datetime(2026, 10, 1, tzinfo=timezone.utc)),
+            _message(user.id, 3, "Quarterly report", "Alice <alice@example.com>", "Final version",
+                     datetime(2026, 10, 2, tzinfo=timezone.utc), folder="Archive"),
+            _message(user.id, 4, "Discount 100% off", "Shop <shop@example.com>", "Sale",
+                     datetime(2026, 10, 3, tzinfo=timezone.utc)),
+            _message(other.id, 1, "Quarterly report", "Alice <alice@example.com>", "Not yours",
+                     datetime(2026, 10, 2, tzinfo=timezone.utc)),
+        ])
+        await session.commit()
+
+
+@pytest.fixture
+def client(make_client, user):
+    return make_client(mailbox.router, prefix="/mailbox", current_user=user)
+
+
+def _search(client, **params):
+    response = client.get("/mailbox/search", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_subject_matches_rank_above_body_matches(client, messages):
+    result = _search(client, q="quarterly report")
+    # Совпадение в теме весомее совпадения в тексте; при равном ранге - новые сначала
+    assert [(item["folder"], item["id"]) for item in result["results"]] == [("Archive", "3"), ("INBOX", "1"), ("INBOX", "2")]
+    assert result["results"][0]["score"] > result["results"][2]["score"]
+
+
+def test_all_terms_must_match(client, messages):
+    assert [item["id"] for item in _search(client, q="report final")["results"]] == ["3"]
+    assert _search(client, q="report missing")["results"] == []
+
+
+def test_like_wildcards_are_literal(client, messages):
+    assert [item["id"] for item in _search(client, q="100%")["results"]] == ["4"]
+    assert _search(client, q="10_%")["results"] == []
+
+
+def test_filters(client, messages):
+    assert [item["id"] for item in _search(client, q="report", folder="INBOX")["results"]] == ["1", "2"]
+    assert [item["id"] for item in _search(client, q="report", **{"from": "bob"})["results"]] == ["2"]
+    assert [item["id"] for item in _search(client, q="report", subject="lunch")["results"]] == ["2"]
+    dated = _search(client, q="report", date_from="2026-10-01T00:00:00+00:00", date_to="2026-10-02T00:00:00+00:00")
+    assert [item["id"] for item in dated["results"]] == ["2"]
+
+
+def test_pagination(client, messages):
+    first = _search(client, q="report", limit=2)
+    assert first["has_more"] is True
+    second = _search(client, q="report", limit=2, offset=2)
+    assert second["has_more"] is False
+    assert [item["id"] for item in first["results"] + second["results"]] == ["3", "1", "2"]
+
+
+def test_facets(client, messages):
+    facets = _search(client, q="report", facets=True)["facets"]
+    assert facets["folder"] == [{"value": "INBOX", "count": 2}, {"value": "Archive", "count": 1}]
+    assert facets["from"][0] == {"value": "Alice <alice@example.com>", "count": 2}
+    assert facets["subject"] == [{"value": "Quarterly report", "count": 2}, {"value": "Lunch", "count": 1}]
+    assert sorted((item["value"], item["count"]) for item in facets["month"]) == [("2026-09", 1), ("2026-10", 2)]
+
+
+def test_facets_only_on_request(client, messages):
+    assert _search(client, q="report")["facets"] is None
@@ -0,0 +1,381 @@
+"""
+Почтовые endpoints (app.api.v1.endpoints.mailbox) с IMAP/SMTP серверами-заглушками
+"""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import select, update
+
+from app.api.v1.endpoints import mailbox
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import MailFolderState, MailMessage, OutboundEmail, OutboundEmailStatus
+from app.services.async_email_service import AsyncEmailService, mail_executor
+from app.services.email_service import mailbox_passwords
+from app.services.imap_pool import imap_pool
+from app.services.mail_outbox import mail_outbox
+from app.services.mail_sync import mailbox_sync
+from app.services.smtp_pool import smtp_pool
+from mail_stub import ImapStubServer, SmtpStubServer
+
+PASSWORD = "secret"
+
+PLAIN_MESSAGE = b"""\
+From: Alice <alice@example.com>
+To: user@example.com
+Subject: Quarterly report
+Date: Sun, 18 Oct 2026 10:00:00 +0000
+Message-ID: <report@example.com>
+Content-Type: text/plain; charset="utf-8"
+
+Numbers are attached below.
+"""
+
+ATTACHMENT_MESSAGE = b"""\
+From: Bob <bob@example.com>
+To: user@example.com
+Subject: Invoice
+Date: Sun, 18 Oct 2026 11:00:00 +0000
+Message-ID: <invoice@example.com>
+MIME-Version: 1.0
+Content-Type: multipart/mixed; boundary="b1"
+
+--b1
+Content-Type: text/plain; charset="utf-8"
+
+Invoice in the attachment.
+--b1
+Content-Type: application/pdf; name="invoice.pdf"
+Content-Disposition: attachment; filename="invoice.pdf"
+Content-Transfer-Encoding: base64
+
+JVBERi0xLjQK
+--b1--
+"""
+
+
+@pytest.fixture
+def imap_server(user, monkeypatch):
+    with ImapStubServer() as server:
+        server.passwords[user.email] = PASSWORD
+        server.folders["Sent"] = []
+        monkeypatch.setattr(settings, "MAILCOW_IMAP_SERVER", "127.0.0.1")
+        monkeypatch.setattr(settings, "MAILCOW_IMAP_PORT", server.port)
+        monkeypatch.setattr(imap_pool, "use_ssl", False)
+        yield server
+        imap_pool.close_all()
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    with SmtpStubServer() as server:
+        monkeypatch.setattr(settings, "MAILCOW_SMTP_SERVER", "127.0.0.1")
+        monkeypatch.setattr(settings, "MAILCOW_SMTP_PORT", server.port)
+        monkeypatch.setattr(smtp_pool, "starttls", False)
+        yield server
+        smtp_pool.close_all()
+
+
+@pytest.fixture
+def client(make_client, user, monkeypatch):
+    monkeypatch.setitem(mailbox_passwords, user.email, PASSWORD)
+    return make_client(mailbox.router, prefix="/mailbox", current_user=user)
+
+
+def test_password_required(make_client, user):
+    client = make_client(mailbox.router, prefix="/mailbox", current_user=user)
+    assert client.get("/mailbox/folders").status_code == 401
+
+
+def test_folders(client, imap_server):
+    response = client.get("/mailbox/folders")
+    assert response.status_code == 200
+    assert [folder["name"] for folder in response.json()["folders"]] == ["INBOX", "Sent"]
+
+
+async def test_list_emails_syncs_folder(client, imap_server, user):
+    imap_server.add_message(PLAIN_MESSAGE, flags=["\\Seen"])
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+
+    response = client.get("/mailbox/emails")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["folder_total"] == 2
+    emails = body["emails"]
+    assert [item["subject"] for item in emails] == ["Invoice", "Quarterly report"]
+    assert [item["is_read"] for item in emails] == [False, True]
+    assert [item["has_attachments"] for item in emails] == [True, False]
+    assert emails[0]["from"] == "Bob <bob@example.com>"
+
+    async with AsyncSessionLocal() as session:
+        indexed = (await session.execute(select(MailMessage.uid).where(MailMessage.user_id == user.id))).scalars().all()
+    assert sorted(indexed) == [1, 2]
+
+
+async def test_get_email_marks_it_read(client, imap_server, user):
+    message = imap_server.add_message(ATTACHMENT_MESSAGE)
+    assert client.get("/mailbox/emails").status_code == 200
+
+    response = client.get(f"/mailbox/emails/{message.uid}")
+    assert response.status_code == 200
+    email = response.json()["email"]
+    assert email["subject"] == "Invoice"
+    assert email["body_plain"].strip() == "Invoice in the attachment."
+    assert [(item["section"], item["filename"]) for item in email["attachments"]] == [("2", "invoice.pdf")]
+
+    assert "\\Seen" in message.flags
+    async with AsyncSessionLocal() as session:
+        stored = (await session.execute(select(MailMessage).where(MailMessage.uid == message.uid))).scalar_one()
+    assert stored.is_read is True
+
+
+def _sync(client) -> dict:
+    response = client.post("/mailbox/sync")
+    assert response.status_code == 200
+    return response.json()
+
+
+async def _indexed(user) -> dict:
+    """UID -> (тема, прочитано) писем в индексе"""
+    async with AsyncSessionLocal() as session:
+        rows = (await session.execute(
+            select(MailMessage.uid, MailMessage.subject, MailMessage.is_read)
+            .where(MailMessage.user_id == user.id)
+            .order_by(MailMessage.uid)
+        )).all()
+    return {uid: (subject, is_read) for uid, subject, is_read in rows}
+
+
+async def test_sync_adds_only_new_messages(client, imap_server, user):
+    imap_server.add_message(PLAIN_MESSAGE)
+    assert _sync(client)["added"] == 1
+
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+    result = _sync(client)
+    assert (result["added"], result["removed"], result["reset"], result["complete"]) == (1, 0, False, True)
+    assert await _indexed(user) == {1: ("Quarterly report", False), 2: ("Invoice", False)}
+
+    # Без изменений на сервере новые письма не ищутся (без CONDSTORE
+    # проверяются только флаги)
+    imap_server.commands.clear()
+    assert _sync(client)["added"] == 0
+    assert "UID SEARCH" not in imap_server.commands
+
+
+async def test_sync_updates_flags_changed_on_server(client, imap_server, user):
+    first = imap_server.add_message(PLAIN_MESSAGE)
+    imap_server.add_message(ATTACHMENT_MESSAGE, flags=["\\Seen"])
+    _sync(client)
+
+    first.flags.add("\\Seen")
+    imap_server.folders["INBOX"][1].flags.clear()
+    result = _sync(client)
+    assert result["added"] == 0
+    assert await _indexed(user) == {1: ("Quarterly report", True), 2: ("Invoice", False)}
+
+
+async def test_sync_detects_expunge_by_message_count(client, imap_server, user):
+    imap_server.add_message(PLAIN_MESSAGE)
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+    _sync(client)
+
+    del imap_server.folders["INBOX"][0]
+    imap_server.commands.clear()
+    result = _sync(client)
+    assert (result["removed"], result["messages"]) == (1, 1)
+    # Число писем не сошлось - запрошен полный список UID
+    assert "UID SEARCH" in imap_server.commands
+    assert await _indexed(user) == {2: ("Invoice", False)}
+
+
+async def test_sync_rebuilds_index_on_uidvalidity_reset(client, imap_server, user):
+    imap_server.add_message(PLAIN_MESSAGE)
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+    _sync(client)
+
+    imap_server.uidvalidity = 2
+    imap_server.folders["INBOX"] = []
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+    result = _sync(client)
+    assert (result["reset"], result["added"]) == (True, 1)
+    assert await _indexed(user) == {1: ("Invoice", False)}
+    async with AsyncSessionLocal() as session:
+        state = await mailbox_sync.get_state(session, user.id, "INBOX")
+    assert (state.uidvalidity, state.highest_uid) == (2, 1)
+
+
+async def test_first_page_is_synced_and_rest_is_backfilled(client, imap_server, user, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(mailbox_sync, "schedule", lambda user_id, service, folder: scheduled.append(folder))
+    monkeypatch.setattr(mailbox_sync, "batch_size", 2)
+    for _ in range(5):
+        imap_server.add_message(PLAIN_MESSAGE)
+
+    # Первое открытие: сразу только самая новая страница, остальное - в фоне
+    response = client.get("/mailbox/emails", params={"limit": 2})
+    assert [item["id"] for item in response.json()["emails"]] == ["5", "4"]
+    assert response.json()["folder_total"] == 5
+    assert scheduled == ["INBOX"]
+    assert list(await _indexed(user)) == [4, 5]
+
+    # Каждая пачка записана отдельно; новые письма загружаются раньше старых
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+    assert (_sync(client)["added"], list(await _indexed(user))) == (1, [4, 5, 6])
+    assert (_sync(client)["added"], list(await _indexed(user))) == (2, [2, 3, 4, 5, 6])
+    result = _sync(client)
+    assert (result["added"], result["complete"]) == (1, True)
+    assert list(await _indexed(user)) == [1, 2, 3, 4, 5, 6]
+    async with AsyncSessionLocal() as session:
+        assert (await mailbox_sync.get_state(session, user.id, "INBOX")).backfill_uid is None
+
+
+async def test_batch_is_refetched_if_state_changed_meanwhile(client, imap_server, user, monkeypatch):
+    imap_server.add_message(PLAIN_MESSAGE)
+    _sync(client)
+    imap_server.add_message(ATTACHMENT_MESSAGE)
+
+    original = AsyncEmailService.sync_folder_changes
+    calls = []
+
+    async def sync_folder_changes(self, *args):
+        changes = await original(self, *args)
+        if not calls:
+            # Пока шел обмен с IMAP, другой процесс успел записать папку
+            async with AsyncSessionLocal() as session:
+                await session.execute(update(MailFolderState).values(uidvalidity=99))
+                await session.commit()
+        calls.append(changes)
+        return changes
+
+    monkeypatch.setattr(AsyncEmailService, "sync_folder_changes", sync_folder_changes)
+    result = _sync(client)
+    # Устаревшая пачка не записана, повтор увидел смену UIDVALIDITY
+    assert len(calls) == 2
+    assert (result["reset"], result["added"]) == (True, 2)
+    assert list(await _indexed(user)) == [1, 2]
+
+
+def test_get_missing_email(client, imap_server):
+    assert client.get("/mailbox/emails/42").status_code == 404
+
+
+def test_download_attachment(client, imap_server):
+    message = imap_server.add_message(ATTACHMENT_MESSAGE)
+
+    response = client.get(f"/mailbox/emails/{message.uid}/attachments/2")
+    assert response.status_code == 200
+    assert response.content == b"%PDF-1.4\n"
+    assert "invoice.pdf" in response.headers["content-disposition"]
+    # Соединение после чтения вложения возвращено в пул
+    assert imap_pool.stats()["in_use"] == 0
+
+
+async def test_delete_email(client, imap_server, user):
+    imap_server.add_message(PLAIN_MESSAGE)
+    kept = imap_server.add_message(ATTACHMENT_MESSAGE)
+    assert client.get("/mailbox/emails").status_code == 200
+
+    response = client.delete("/mailbox/emails/1")
+    assert response.status_code == 200
+    assert [message.uid for message in imap_server.folders["INBOX"]] == [kept.uid]
+
+    async with AsyncSessionLocal() as session:
+        indexed = (await session.execute(select(MailMessage.uid).where(MailMessage.user_id == user.id))).scalars().all()
+    assert indexed == [kept.uid]
+
+
+async def test_send_email_is_delivered_by_outbox(client, smtp_server):
+    response = client.post("/mailbox/emails/send", json={
+        "to": "bob@example.com",
+        "subject": "Hello",
+        "body": "Hi Bob",
+        "cc": "carol@example.com",
+    })
+    assert response.status_code == 202
+    message_id = response.json()["id"]
+    assert smtp_server.messages == []
+
+    assert await mail_outbox.run_once() == 1
+
+    assert len(smtp_server.messages) == 1
+    delivered = smtp_server.messages[0]
+    assert delivered["to"] == ["bob@example.com", "carol@example.com"]
+    assert b"Subject: Hello" in delivered["data"]
+    status = client.get(f"/mailbox/outbox/{message_id}").json()["email"]
+    assert status["status"] == "sent"
+    assert status["attempts"] == 1
+
+
+async def test_rejected_recipient_fails_without_retry(client, smtp_server):
+    smtp_server.rejected.add("nobody@example.com")
+    message_id = client.post("/mailbox/emails/send", json={
+        "to": "nobody@example.com", "subject": "Hello", "body": "Hi"
+    }).json()["id"]
+
+    await mail_outbox.run_once()
+
+    async with AsyncSessionLocal() as session:
+        message = await session.get(OutboundEmail, message_id)
+    assert message.status == OutboundEmailStatus.FAILED
+    assert smtp_server.messages == []
+
+
+def test_timeout_aborts_operation_and_discards_connection(client, imap_server, monkeypatch):
+    imap_server.add_message(PLAIN_MESSAGE)
+    monkeypatch.setattr(mail_executor, "timeout", 0.3)
+    monkeypatch.setattr(mail_executor, "abort_grace", 1.0)
+    imap_server.delays["STORE"] = 3.0
+    discarded = imap_pool.discarded
+
+    start = time.monotonic()
+    response = client.delete("/mailbox/emails/1")
+    elapsed = time.monotonic() - start
+
+    assert response.status_code == 504
+    assert "aborted" in response.json()["detail"]
+    # Ответ не ждет сервер, а операция не продолжается после 504
+    assert elapsed < 2.0
+    assert imap_pool.discarded == discarded + 1
+    assert imap_pool.stats()["open"] == 0
+    time.sleep(3.0)
+    assert "EXPUNGE" not in imap_server.commands
+    assert [message.uid for message in imap_server.folders["INBOX"]] == [1]
+
+
+class _ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+class _Subscriptions:
+    """mail_idle без IDLE соединений: только учет подписок"""
+
+    def __init__(self):
+        self.queues = []
+
+    def subscribe(self, user_id, email_address, folder):
+        queue = asyncio.Queue()
+        self.queues.append(queue)
+        return queue
+
+    def unsubscribe(self, email_address, folder, queue):
+        self.queues.remove(queue)
+
+
+async def test_events_subscribe_only_while_streaming(user, monkeypatch):
+    monkeypatch.setitem(mailbox_passwords, user.email, PASSWORD)
+    subscriptions = _Subscriptions()
+    monkeypatch.setattr(mailbox.mail_idle, "subscribe", subscriptions.subscribe)
+    monkeypatch.setattr(mailbox.mail_idle, "unsubscribe", subscriptions.unsubscribe)
+
+    response = await mailbox.mailbox_events(_ConnectedRequest(), "INBOX", user)
+    # Ответ создан, но поток не начат - подписки нет
+    assert subscriptions.queues == []
+
+    body = response.body_iterator
+    assert await body.__anext__() == "retry: 5000\n\n"
+    assert len(subscriptions.queues) == 1
+    await body.aclose()
+    assert subscriptions.queues == []
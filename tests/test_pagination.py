@@ -0,0 +1,96 @@
+"""
+Keyset-пагинация: курсоры и обход страниц (app.core.pagination)
+"""
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints import invitations
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    decode_datetime_id_cursor,
+    encode_cursor,
+    encode_datetime_id_cursor,
+)
+from app.core.database import AsyncSessionLocal
+from app.models import Company, CompanyInvitation, InvitationStatus
+
+
+def test_datetime_id_cursor_roundtrip():
+    created_at = datetime(2026, 10, 18, 12, 30, 15, 123456)
+    cursor = encode_datetime_id_cursor(created_at, 42)
+    assert "=" not in cursor
+    assert decode_datetime_id_cursor(cursor) == (created_at, 42)
+
+
+def test_empty_cursor_means_first_page():
+    assert decode_datetime_id_cursor(None) is None
+    assert decode_datetime_id_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    encode_cursor({"c": "yesterday", "i": 1}),
+    encode_cursor({"i": 1}),
+    "WzEsMl0",  # [1,2] - не объект
+    "_w",  # не UTF-8
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_datetime_id_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_cursor_payload_is_opaque_json():
+    assert decode_cursor(encode_cursor({"a": 1, "b": "x"})) == {"a": 1, "b": "x"}
+
+
+@pytest.fixture
+async def company(user) -> Company:
+    """Компания с пятью приглашениями, созданными в один момент"""
+    created_at = datetime(2026, 10, 18, 12, 0, 0)
+    async with AsyncSessionLocal() as session:
+        company = Company(name="Acme", owner_id=user.id)
+        session.add(company)
+        await session.flush()
+        session.add_all([
+            CompanyInvitation(
+                email=f"u{index}@example.com",
+                company_id=company.id,
+                invited_by_id=user.id,
+                invitation_token=f"token-{index}",
+                expires_at=datetime(2026, 10, 25),
+                status=InvitationStatus.PENDING,
+                created_at=created_at,
+            )
+            for index in range(5)
+        ])
+        await session.commit()
+        return company
+
+
+def test_pages_cover_all_rows_once_with_equal_timestamps(make_client, user, company):
+    client = make_client(invitations.router, prefix="/invitations", current_user=user)
+
+    seen, cursor = [], None
+    for _ in range(10):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get(f"/invitations/company/{company.id}/invitations", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+
+    # Одинаковый created_at - порядок и граница страницы по id
+    assert cursor is None
+    assert seen == [5, 4, 3, 2, 1]
+
+
+def test_invalid_cursor_returns_400(make_client, user, company):
+    client = make_client(invitations.router, prefix="/invitations", current_user=user)
+    response = client.get(f"/invitations/company/{company.id}/invitations", params={"cursor": "garbage!"})
+    assert response.status_code == 400
@@ -0,0 +1,105 @@
+"""
+Кэш presigned GET ссылок (app.services.presigned_url_cache)
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app.services import presigned_url_cache as cache_module
+from app.services.presigned_url_cache import PresignedUrlCache
+
+
+class _Storage:
+    """Подпись ссылок с учетом времени подписи"""
+
+    def __init__(self):
+        self.signed = []
+
+    async def get_presigned_urls(self, object_names, expires, request_date):
+        self.signed.append((list(object_names), request_date))
+        stamp = int(request_date.timestamp())
+        return {name: f"https://storage.example.com/{name}?date={stamp}" for name in object_names}
+
+    async def file_exists(self, object_name):
+        return not object_name.startswith("missing/")
+
+
+class _Redis:
+    """Общий для всех процессов уровень кэша"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get_many(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def set_many(self, values, ttl=None):
+        self.values.update(values)
+        return True
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+        return True
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = _Redis()
+    monkeypatch.setattr(cache_module, "redis_service", fake)
+    return fake
+
+
+def _cache(storage, **overrides):
+    options = {"expires_seconds": 3600, "bucket_seconds": 600, "min_remaining_seconds": 300, "max_size": 100}
+    options.update(overrides)
+    return PresignedUrlCache(storage, **options)
+
+
+@pytest.mark.parametrize("bucket_seconds, min_remaining_seconds", [(600, 3000), (3300, 300), (0, 300)])
+def test_window_that_outlives_the_link_is_rejected(bucket_seconds, min_remaining_seconds):
+    with pytest.raises(ValueError):
+        _cache(_Storage(), bucket_seconds=bucket_seconds, min_remaining_seconds=min_remaining_seconds)
+
+
+async def test_links_are_signed_from_window_start_and_reused(redis):
+    storage = _Storage()
+    cache = _cache(storage)
+
+    first = await cache.get_url("documents/a.pdf")
+    second = await cache.get_url("documents/a.pdf")
+    assert first == second
+    assert len(storage.signed) == 1
+    signed_at = storage.signed[0][1]
+    assert signed_at == datetime.fromtimestamp(cache._current_bucket(), tz=timezone.utc)
+    assert cache.stats()["hits_local"] == 1
+
+
+async def test_other_process_reuses_link_from_redis(redis):
+    storage = _Storage()
+    url = await _cache(storage).get_url("documents/a.pdf")
+
+    other = _cache(storage)
+    assert await other.get_url("documents/a.pdf") == url
+    assert len(storage.signed) == 1
+    assert other.stats()["hits_redis"] == 1
+
+
+async def test_batch_signs_only_misses_and_skips_missing_files(redis):
+    storage = _Storage()
+    cache = _cache(storage)
+    await cache.get_url("documents/a.pdf")
+
+    urls = await cache.get_urls(["documents/a.pdf", "documents/b.pdf", "missing/c.pdf"], verify_exists=True)
+    assert urls["missing/c.pdf"] is None
+    assert urls["documents/b.pdf"] is not None
+    assert storage.signed[-1][0] == ["documents/b.pdf"]
+
+
+async def test_invalidate_forces_new_signature(redis):
+    storage = _Storage()
+    cache = _cache(storage)
+    await cache.get_url("documents/a.pdf")
+    await cache.invalidate("documents/a.pdf")
+    await cache.get_url("documents/a.pdf")
+    assert len(storage.signed) == 2
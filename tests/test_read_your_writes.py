@@ -0,0 +1,109 @@
+"""
+Маршрутизация чтений в реплику и read-your-writes (app.core.database)
+"""
+
+import os
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import database
+from app.core.database import (
+    READ_YOUR_WRITES_COOKIE,
+    READ_YOUR_WRITES_HEADER,
+    get_db,
+    get_read_db,
+    read_your_writes_middleware,
+)
+
+
+@pytest.fixture
+async def replica(monkeypatch, tmp_path):
+    """Отдельная SQLite база в роли реплики"""
+    replica_engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_path, 'replica.db')}")
+    monkeypatch.setattr(database, "read_engine", replica_engine)
+    monkeypatch.setattr(
+        database, "ReadSessionLocal", async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+    monkeypatch.setattr(database, "_primary_pins", {})
+    yield replica_engine
+    await replica_engine.dispose()
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.middleware("http")(read_your_writes_middleware)
+
+    @app.post("/write")
+    async def write(db: AsyncSession = Depends(get_db)):
+        await db.execute(text("SELECT 1"))
+        await db.commit()
+        return {"ok": True}
+
+    @app.post("/write-response")
+    async def write_own_response(db: AsyncSession = Depends(get_db)):
+        await db.execute(text("SELECT 1"))
+        await db.commit()
+        return JSONResponse({"ok": True})
+
+    @app.get("/read")
+    async def read(db: AsyncSession = Depends(get_read_db)):
+        return {"primary": db.bind is database.engine}
+
+    return app
+
+
+def _reads_primary(client: TestClient, **kwargs) -> bool:
+    response = client.get("/read", **kwargs)
+    assert response.status_code == 200
+    return response.json()["primary"]
+
+
+def test_reads_go_to_replica_without_writes(replica):
+    with TestClient(_app()) as client:
+        assert _reads_primary(client) is False
+
+
+def test_write_then_read_hits_primary_via_cookie(replica):
+    with TestClient(_app()) as client:
+        response = client.post("/write")
+        assert READ_YOUR_WRITES_COOKIE in response.cookies
+        assert response.headers[READ_YOUR_WRITES_HEADER]
+        assert _reads_primary(client) is True
+
+
+def test_cookie_is_set_when_handler_returns_own_response(replica):
+    with TestClient(_app()) as client:
+        response = client.post("/write-response")
+        assert READ_YOUR_WRITES_COOKIE in response.cookies
+        assert _reads_primary(client) is True
+
+
+def test_header_is_honoured_for_clients_without_cookies(replica):
+    app = _app()
+    with TestClient(app) as writer:
+        primary_until = writer.post("/write").headers[READ_YOUR_WRITES_HEADER]
+    with TestClient(app) as reader:
+        assert _reads_primary(reader) is False
+        assert _reads_primary(reader, headers={READ_YOUR_WRITES_HEADER: primary_until}) is True
+        expired = str(int(time.time()) - 1)
+        assert _reads_primary(reader, headers={READ_YOUR_WRITES_HEADER: expired}) is False
+
+
+def test_server_side_pin_by_token(replica):
+    app = _app()
+    with TestClient(app) as writer:
+        writer.post("/write", headers={"Authorization": "Bearer first"})
+    with TestClient(app) as reader:
+        assert _reads_primary(reader, headers={"Authorization": "Bearer first"}) is True
+        assert _reads_primary(reader, headers={"Authorization": "Bearer second"}) is False
+
+
+def test_without_replica_everything_reads_primary():
+    with TestClient(_app()) as client:
+        assert _reads_primary(client) is True
@@ -0,0 +1,67 @@
+"""
+Пул SMTP соединений (app.services.smtp_pool)
+"""
+
+import pytest
+
+from app.services.smtp_pool import SmtpConnectionPool, SmtpPoolExhaustedError, _PooledSmtp
+
+
+class _Connection:
+    def __init__(self, user):
+        self.user = user
+        self.closed = False
+
+    def noop(self):
+        return 250, b"OK"
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = SmtpConnectionPool(
+        max_per_user=2,
+        max_per_server=2,
+        idle_timeout=300,
+        health_check_interval=60,
+        acquire_timeout=0.05,
+        max_messages_per_connection=100,
+        timeout=5,
+    )
+    monkeypatch.setattr(pool, "_open", lambda key, password: _PooledSmtp(key, password, _Connection(key[2])))
+    return pool
+
+
+def test_full_server_evicts_least_recently_used_idle_connection(pool):
+    first = pool.acquire("smtp", 587, "a", "pw")
+    second = pool.acquire("smtp", 587, "b", "pw")
+    pool.release(first)
+    pool.release(second)
+
+    third = pool.acquire("smtp", 587, "c", "pw")
+    assert third.key == ("smtp", 587, "c")
+    assert first.connection.closed
+    assert not second.connection.closed
+    stats = pool.stats()
+    assert stats["evicted"] == 1
+    assert stats["open"] == 2
+
+
+def test_full_server_without_idle_connections_waits(pool):
+    pool.acquire("smtp", 587, "a", "pw")
+    pool.acquire("smtp", 587, "b", "pw")
+    with pytest.raises(SmtpPoolExhaustedError):
+        pool.acquire("smtp", 587, "c", "pw")
+    assert pool.stats()["evicted"] == 0
+
+
+def test_other_servers_are_not_evicted(pool):
+    other = pool.acquire("smtp2", 587, "a", "pw")
+    pool.release(other)
+    pool.acquire("smtp", 587, "b", "pw")
+    pool.acquire("smtp", 587, "c", "pw")
+    with pytest.raises(SmtpPoolExhaustedError):
+        pool.acquire("smtp", 587, "d", "pw")
+    assert not other.connection.closed